@@ -2,6 +2,10 @@
 ASGI config for Store2 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSockets (notifications, live auction feeds) go
+through JWT authentication to the Channels consumers. Run several workers
+behind a load balancer with a shared channel layer (see CHANNEL_LAYERS) so
+group sends reach sockets held by any worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +17,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Store2.settings")
 
-application = get_asgi_application()
+# Initialize Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from accounts.channels_auth import JWTAuthMiddleware  # noqa: E402
+from auctions.routing import websocket_urlpatterns as auction_urlpatterns  # noqa: E402
+from notifications.routing import websocket_urlpatterns as notification_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(
+        JWTAuthMiddleware(URLRouter(notification_urlpatterns + auction_urlpatterns))
+    ),
+})
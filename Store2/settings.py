@@ -58,6 +58,8 @@ INSTALLED_APPS = [
     'reviews',
     'delivery',
     'corsheaders',
+    'benchmarks',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -114,6 +116,9 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Seconds a validated JWT session is cached by accounts.authentication
+JWT_SESSION_CACHE_TTL = int(os.environ.get('JWT_SESSION_CACHE_TTL', 60))
+
 # Database Configuration for Render
 DATABASES = {
     'default': dj_database_url.config(
@@ -162,10 +167,21 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 PLATFORM_WALLET_USER_ID = 18
+# Fee credits to the platform wallet are spread over this many shard rows
+# (rolled up by `manage.py roll_up_wallet_shards`); 0 disables sharding
+PLATFORM_WALLET_SHARDS = 8
 PLATFORM_FEE_RATE = '0.04'
 PLATFORM_MIN_FEE = '0.00'
 PLATFORM_MAX_FEE = None
 POINTS_PER_CURRENCY_UNIT = '10.00'
+# Balance checkpoints are written (manage.py checkpoint_wallet_balances) once a
+# wallet has this many new ledger entries; see wallet/statements.py
+WALLET_CHECKPOINT_EVERY = 500
+# Responses stored for Idempotency-Key retries are kept this many seconds
+# (purged by `manage.py purge_idempotency_keys`); see wallet/idempotency.py
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# How long a request holds its key before a retry may take it over
+IDEMPOTENCY_KEY_LEASE = 30
 
 # Internationalization
 LANGUAGE_CODE = "en-us"
@@ -190,12 +206,51 @@ CELERY_TIMEZONE = 'UTC'
 # ASGI Configuration
 ASGI_APPLICATION = 'Store2.asgi.application'
 
-# Channel layers configuration (using InMemory for now)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Shared cache (category tree etc.): Redis when REDIS_URL is set, per-process otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# analytics.response_cache: seconds a dashboard response is fresh, how long a
+# stale copy may still be served while one request recomputes it
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 120))
+ANALYTICS_CACHE_STALE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_STALE_TIMEOUT', 3600))
+ANALYTICS_CACHE_SERVE_STALE = os.environ.get('ANALYTICS_CACHE_SERVE_STALE', 'True') == 'True'
+
+# Channel layers: shared through Redis (channels_redis) when CHANNEL_REDIS_URL or
+# REDIS_URL is set, so group sends reach sockets held by any ASGI worker;
+# per-process otherwise. CHANNEL_LAYER_BACKEND swaps the Redis backend, e.g.
+# channels_redis.pubsub.RedisPubSubChannelLayer. Only the pub/sub backend is
+# covered by the test suite (against notifications/tests/redis_standin.py); the
+# default core backend is untested here unless CHANNEL_LAYERS_TEST_REDIS_URL
+# points the fan-out test at a real Redis server.
+CHANNEL_REDIS_URL = os.environ.get('CHANNEL_REDIS_URL') or os.environ.get('REDIS_URL')
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': os.environ.get('CHANNEL_LAYER_BACKEND', 'channels_redis.core.RedisChannelLayer'),
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL],
+                'prefix': os.environ.get('CHANNEL_LAYER_PREFIX', 'store2'),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 # Security settings for production
 if not DEBUG:
@@ -1,10 +1,46 @@
 # authentication.py
-from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
+"""
+JWT authentication with a session-validation cache.
+
+Only one token per user is valid (User.current_token_user). Instead of
+reading the user row on every request, the validated session is cached per
+user as (token fingerprint, user snapshot) for SESSION_CACHE_TTL seconds, so
+the common case costs no queries. Anything that changes the session —
+login, logout, password reset, or any save of the user — calls
+invalidate_session(), so a revoked token stops working immediately. Bulk
+queryset updates of users bypass save() and must call invalidate_sessions()
+themselves.
+"""
+import hashlib
+
 import jwt
 from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
 from .models import User
 
+SESSION_CACHE_TTL = getattr(settings, 'JWT_SESSION_CACHE_TTL', 60)
+SESSION_KEY = 'accounts:jwt_session:{user_id}'
+
+
+def token_fingerprint(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def cache_session(user, token):
+    cache.set(SESSION_KEY.format(user_id=user.pk), (token_fingerprint(token), user), SESSION_CACHE_TTL)
+
+
+def invalidate_session(user_id):
+    cache.delete(SESSION_KEY.format(user_id=user_id))
+
+
+def invalidate_sessions(user_ids):
+    cache.delete_many([SESSION_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
         auth = request.headers.get('Authorization')
@@ -13,7 +49,10 @@ class JWTAuthentication(BaseAuthentication):
             return None
 
         token = auth.split(' ')[1]
+        return self.authenticate_credentials(token)
 
+    def authenticate_credentials(self, token):
+        """Validate a raw token; shared with the WebSocket middleware (accounts.channels_auth)."""
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
@@ -21,8 +60,13 @@ class JWTAuthentication(BaseAuthentication):
         except jwt.InvalidTokenError:
             raise AuthenticationFailed("Invalid token")
 
+        user_id = payload.get("user_id")
+        cached = cache.get(SESSION_KEY.format(user_id=user_id))
+        if cached is not None and cached[0] == token_fingerprint(token):
+            return (cached[1], token)
+
         try:
-            user = User.objects.get(id=payload["user_id"])
+            user = User.objects.get(id=user_id)
         except User.DoesNotExist:
             raise AuthenticationFailed("User not found")
 
@@ -30,4 +74,5 @@ class JWTAuthentication(BaseAuthentication):
         if user.current_token_user != token:
             raise AuthenticationFailed("Invalid session token")
 
+        cache_session(user, token)
         return (user, token)
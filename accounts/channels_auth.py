@@ -0,0 +1,49 @@
+# accounts/channels_auth.py
+"""
+JWT authentication for WebSocket connections.
+
+Browsers cannot set an Authorization header on a WebSocket handshake, so
+the token is read from the `token` query parameter, falling back to an
+`Authorization: Bearer` header for other clients. Validation goes through
+JWTAuthentication.authenticate_credentials, so sockets get the same
+single-session rule and session cache as the REST API. Connections without
+a valid token get AnonymousUser in scope['user']; consumers decide whether
+that is acceptable.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import JWTAuthentication
+
+
+def token_from_scope(scope):
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            value = value.decode()
+            if value.startswith('Bearer '):
+                return value.split(' ')[1]
+    return None
+
+
+@database_sync_to_async
+def get_user(token):
+    try:
+        user, _ = JWTAuthentication().authenticate_credentials(token)
+    except AuthenticationFailed:
+        return AnonymousUser()
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        token = token_from_scope(scope)
+        scope['user'] = await get_user(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -54,8 +54,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.user_notifications.filter(is_read=False).update(is_read=True)  # Updated
 
     def send_notification(self, notification_type, message_ar, message_en, content_object=None):
-          from notifications.models import Notification
-          return Notification.objects.create(
+          from notifications.outbox import notify
+          return notify(
                 user=self,
                 notification_type=notification_type,
                 message_ar=message_ar,
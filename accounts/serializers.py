@@ -52,7 +52,9 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # only the submitted fields: the instance may be a cached session
+        # snapshot, and a full save would write back its stale points etc.
+        instance.save(update_fields=list(validated_data))
 
         for attr, value in profile_data.items():
             setattr(profile, attr, value)
@@ -1,9 +1,22 @@
 # accounts/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+
+from .authentication import invalidate_session
 from .models import User, Profile
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_session(sender, instance, **kwargs):
+    # Role, is_active or token changes must not be served from a stale snapshot;
+    # drop it now and again after commit so a concurrent request cannot re-cache
+    # the pre-commit row
+    invalidate_session(instance.pk)
+    transaction.on_commit(lambda: invalidate_session(instance.pk))
@@ -0,0 +1,10 @@
+# accounts/testing.py
+"""Test helpers shared by the apps' test suites."""
+from .models import User
+
+
+def make_user(name, password='pass', **extra):
+    """A user whose email and username derive from `name`; `extra` sets role etc."""
+    extra.setdefault('first_name', name.title())
+    extra.setdefault('last_name', 'Test')
+    return User.objects.create_user(email=f'{name}@example.com', password=password, username=name, **extra)
@@ -1,3 +1,150 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.services import SettlementService
+
+from .authentication import JWTAuthentication, invalidate_session
+from .models import EmailVerification, Purpose, User
+from .serializers import UserProfileUpdateSerializer
+from .utils import create_jwt_token, create_monthly_token
+
+
+class JWTSessionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='buyer@example.com', password='old-password', username='buyer',
+            first_name='B', last_name='B',
+        )
+        self.client = APIClient()
+        self.token = self._login()
+
+    def _login(self):
+        response = self.client.post('/api/LoginAPI/', {'email': 'buyer@example.com', 'password': 'old-password'},
+                                    format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data['token']
+
+    def _unread(self, token):
+        return self.client.get('/api/notifications/unread-count/', secure=True,
+                               HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_cached_session_skips_user_query(self):
+        self.assertEqual(self._unread(self.token).status_code, 200)
+        # only the unread-count query itself
+        with self.assertNumQueries(1):
+            self.assertEqual(self._unread(self.token).status_code, 200)
+
+    def test_replaced_token_is_rejected_immediately(self):
+        self.assertEqual(self._unread(self.token).status_code, 200)
+
+        self.user.current_token_user = create_monthly_token({'user_id': self.user.pk, 'device': 'other'})
+        self.user.save(update_fields=['current_token_user'])
+
+        self.assertEqual(self._unread(self.token).status_code, 403)
+        self.assertEqual(self._unread(self.user.current_token_user).status_code, 200)
+
+    def test_logout_revokes_token(self):
+        self.assertEqual(self._unread(self.token).status_code, 200)
+
+        response = self.client.post('/api/LogoutAPI/', secure=True, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self._unread(self.token).status_code, 403)
+
+    def test_password_reset_revokes_token(self):
+        self.assertEqual(self._unread(self.token).status_code, 200)
+        reset_token = create_jwt_token({'email': self.user.email, 'role': 'user', 'purpose': Purpose.PASSWORD_RESET})
+        EmailVerification.objects.create(
+            email=self.user.email, role='user', purpose=Purpose.PASSWORD_RESET, encrypted_code=b'',
+            is_verified=True, current_token=reset_token, expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+        response = self.client.post(
+            '/api/ResetPassword/', {'new_password': 'new-password', 'confirm_password': 'new-password'},
+            format='json', secure=True, HTTP_X_EMAIL_TOKEN=reset_token,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self._unread(self.token).status_code, 403)
+
+    def test_user_changes_are_not_served_stale(self):
+        self.assertEqual(self._unread(self.token).status_code, 200)
+        self.user.role = 'seller'
+        self.user.save(update_fields=['role'])
+
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user, _ = JWTAuthentication().authenticate(request)
+        self.assertEqual(user.role, 'seller')
+
+
+    def test_points_awarded_in_bulk_survive_a_profile_update(self):
+        User.objects.filter(pk=self.user.pk).update(role='seller')
+        invalidate_session(self.user.pk)
+        self.assertEqual(self._unread(self.token).status_code, 200)  # caches the session
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SettlementService._award_points({self.user.pk: 40})
+        response = self.client.put('/api/MyProfile/', {'first_name': 'Renamed'}, format='json', secure=True,
+                                   HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.points, self.user.first_name), (40, 'Renamed'))
+
+        # a stale instance only writes the fields the serializer changed
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(points=90)
+        serializer = UserProfileUpdateSerializer(stale, data={'last_name': 'Stale'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.points, self.user.last_name), (90, 'Stale'))
+
+class WebSocketJWTAuthTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ws@example.com', password='pass', username='ws',
+                                             first_name='W', last_name='S')
+        self.user.current_token_user = create_monthly_token({'user_id': self.user.pk})
+        self.user.save(update_fields=['current_token_user'])
+
+    def _connect(self, path, headers=()):
+        from Store2.asgi import application
+
+        async def scenario():
+            communicator = WebsocketCommunicator(application, path,
+                                                 headers=[(b'origin', b'http://localhost'), *headers])
+            connected, _ = await communicator.connect()
+            if connected:
+                first = await communicator.receive_json_from()
+                await communicator.disconnect()
+                return first
+            return None
+
+        return async_to_sync(scenario)()
+
+    def test_token_in_query_string_authenticates_socket(self):
+        self.assertEqual(self._connect(f'/ws/notifications/?token={self.user.current_token_user}'),
+                         {'type': 'unread_count', 'count': 0})
+
+    def test_bearer_header_authenticates_socket(self):
+        headers = [(b'authorization', f'Bearer {self.user.current_token_user}'.encode())]
+        self.assertIsNotNone(self._connect('/ws/notifications/', headers))
+
+    def test_missing_or_revoked_token_is_anonymous(self):
+        self.assertIsNone(self._connect('/ws/notifications/'))
+        old_token = self.user.current_token_user
+        self.user.current_token_user = create_monthly_token({'user_id': self.user.pk, 'device': 'other'})
+        self.user.save(update_fields=['current_token_user'])
+        self.assertIsNone(self._connect(f'/ws/notifications/?token={old_token}'))
+
+    def test_auction_feed_is_mounted(self):
+        # reaches the consumer, which closes for an unknown auction; an unmounted route would raise
+        self.assertIsNone(self._connect('/ws/auctions/999999/'))
@@ -4,7 +4,7 @@ from .views import (
     ListUsersView, ListSellersView, ListDeliveryView, ListAdminsView,PublicUserProfileView
 ,ConfirmEmailChangeAPIView,RequestEmailChangeAPIView, VerifyAdminDeliveryCodeAPIView,
  UserProfileView,RequestPasswordResetCodeView,CreateAdminUserView,CreateDeliveryUserView,
- ResetPasswordView,VerifyResetCodeView,SuperAdminLoginAPIView,LoginAPIView,EmailVerificationAPIView,
+ ResetPasswordView,VerifyResetCodeView,SuperAdminLoginAPIView,LoginAPIView,LogoutAPIView,EmailVerificationAPIView,
  VerifyCodeAPIView,ResendVerificationCodeAPIView,CompleteRegistrationAPIView,UpdateMyLocationView,
  UpdateProfileImageView,UserProfileAPIView
 
@@ -22,6 +22,8 @@ urlpatterns = [
     path('CompleteRegistrationAPI/', CompleteRegistrationAPIView.as_view(), name='CompleteRegistrationAPIView'),
     ## تسجيل الدخول ندخل الايميل و كلمة السر
     path('LoginAPI/', LoginAPIView.as_view(), name='LoginAPIView'),
+    ## تسجيل الخروج وإلغاء التوكن الحالي
+    path('LogoutAPI/', LogoutAPIView.as_view(), name='LogoutAPIView'),
     ## طلب اعادة تعيين كلمة السر يدخل الايميل و يتم ارسال رمز تحقق
     path('RequestPasswordResetCode/', RequestPasswordResetCodeView.as_view(), name='RequestPasswordResetCodeView'),
     ## ادخال رمز التحقق لاعادة تعيين كلمة سر
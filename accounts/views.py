@@ -27,6 +27,7 @@ from rest_framework.permissions import IsAuthenticated
 from .serializers import UserProfileDisplaySerializer
 from cryptography.fernet import Fernet
 
+from .authentication import invalidate_session
 from .models import EmailVerification, Purpose, User, Role
 from .utils import (
     decode_jwt_token,
@@ -188,6 +189,7 @@ class SuperAdminLoginAPIView(APIView):
             token = create_monthly_token(payload)
             user.current_token_user = token
             user.save(update_fields=['current_token_user'])
+            invalidate_session(user.pk)
 
             return Response({
                 'message': 'تم تسجيل الدخول بنجاح',
@@ -528,6 +530,8 @@ class LoginAPIView(APIView):
         user.current_token_user=token
         user.last_login = timezone.now()
         user.save(update_fields=['last_login','current_token_user'])
+        # the previous token is no longer valid
+        invalidate_session(user.pk)
 
         
 
@@ -542,6 +546,17 @@ class LoginAPIView(APIView):
             }
         }, status=status.HTTP_200_OK)
 
+
+class LogoutAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        user.current_token_user = None
+        user.save(update_fields=['current_token_user'])
+        invalidate_session(user.pk)
+        return Response({'message': 'تم تسجيل الخروج بنجاح.'}, status=status.HTTP_200_OK)
+
 class VerifyResetCodeView(APIView):
     authentication_classes = []  # إلغاء المصادقة الافتراضية
     permission_classes = []
@@ -743,8 +758,11 @@ class ResetPasswordView(APIView):
             except ObjectDoesNotExist:
                 return Response({'detail': 'المستخدم غير موجود.'}, status=status.HTTP_404_NOT_FOUND)
 
+            # كلمة مرور جديدة تنهي الجلسة الحالية
             user.set_password(new_password)
+            user.current_token_user = None
             user.save()
+            invalidate_session(user.pk)
 
             # 8. تحديث سجل التحقق
             verification.has_user = True
@@ -1056,7 +1074,8 @@ class UserProfileView(APIView):
         return Response(serializer.data)
 
     def put(self, request):
-        user = request.user
+        # request.user can be a cached session snapshot (accounts.authentication)
+        user = User.objects.select_related('profile').get(pk=request.user.pk)
         serializer = UserProfileUpdateSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -0,0 +1,28 @@
+# analytics/management/commands/backfill_daily_sales.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from analytics.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sales rollup from completed orders and approved returns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to rebuild (YYYY-MM-DD); default: everything')
+        parser.add_argument('--to', dest='end', help='Last day to rebuild (YYYY-MM-DD), inclusive')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('start', 'end'):
+            value = options[name]
+            if value:
+                dates[name] = parse_date(value)
+                if dates[name] is None:
+                    raise CommandError(f"Invalid date: {value}")
+
+        report = rebuild_daily_sales(dates.get('start'), dates.get('end'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {report['rows']} fact rows from {report['orders']} orders and "
+            f"{report['refunds']} refunds (replaced {report['deleted']})"
+        ))
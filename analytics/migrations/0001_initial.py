@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0025_product_effective_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('seller_orders', models.PositiveIntegerField(default=0)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_quantity', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'date'], name='analytics_d_seller__32f893_idx'), models.Index(fields=['buyer', 'date'], name='analytics_d_buyer_i_d083a1_idx'), models.Index(fields=['product', 'date'], name='analytics_d_product_190e96_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'seller', 'product', 'buyer'), name='uniq_daily_sales_fact')],
+            },
+        ),
+    ]
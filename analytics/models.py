@@ -1,3 +1,41 @@
+# analytics/models.py
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from products.models import Product
+
+
+class DailySalesFact(models.Model):
+    """
+    Daily sales rollup per (date, seller, product, buyer), maintained by
+    analytics.rollups when orders complete and returns are refunded.
+
+    `orders` is 1 on exactly one row per order and `seller_orders` on one row
+    per (order, seller), so summing them over any grouping gives distinct
+    order counts. Refunds are booked on the day they are processed.
+    """
+    date = models.DateField()
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    seller_orders = models.PositiveIntegerField(default=0)
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_quantity = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'seller', 'product', 'buyer'], name='uniq_daily_sales_fact'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'date']),
+            models.Index(fields=['buyer', 'date']),
+            models.Index(fields=['product', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} seller={self.seller_id} product={self.product_id} buyer={self.buyer_id}"
@@ -0,0 +1,123 @@
+# analytics/response_cache.py
+"""
+Response cache for the analytics dashboards.
+
+Responses are cached per view, user and query string. Each entry records
+the generation of the scope it was computed under: `seller:<id>` for seller
+dashboards, `admin` for the platform dashboards. Domain events (settlement,
+refunds, reviews, moderation; see analytics.signals and analytics.rollups)
+bump those generations after commit through invalidate_dashboards().
+
+An entry is fresh while its generation is current and it is younger than
+ANALYTICS_CACHE_TIMEOUT. Past that it is kept for
+ANALYTICS_CACHE_STALE_TIMEOUT. With ANALYTICS_CACHE_SERVE_STALE on
+(stale-while-revalidate), one request takes a short lock and recomputes
+while concurrent requests keep getting the stale copy. At most one
+recompute per entry runs at a time.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+FRESH_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 120)
+STALE_TIMEOUT = getattr(settings, 'ANALYTICS_CACHE_STALE_TIMEOUT', 60 * 60)
+SERVE_STALE = getattr(settings, 'ANALYTICS_CACHE_SERVE_STALE', True)
+REVALIDATE_LOCK_TIMEOUT = 30
+
+ADMIN_SCOPE = 'admin'
+GENERATION_KEY = 'analytics:generation:{scope}'
+ENTRY_KEY = 'analytics:response:{view}:{user_id}:{params}'
+
+
+def seller_scope(seller_id):
+    return f'seller:{seller_id}'
+
+
+def _generation(scope):
+    key = GENERATION_KEY.format(scope=scope)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so an evicted counter does not revive old entries
+        cache.add(key, int(time.time()), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time()), timeout=None)
+
+
+def invalidate_dashboards(seller_ids=(), admin=True):
+    """Mark the given sellers' (and the admin) dashboards stale once the transaction commits."""
+    scopes = [seller_scope(seller_id) for seller_id in set(seller_ids) if seller_id]
+    if admin:
+        scopes.append(ADMIN_SCOPE)
+    if scopes:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _params_key(request, kwargs):
+    params = sorted((k, sorted(v)) for k, v in request.query_params.lists())
+    raw = repr((params, sorted(kwargs.items())))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_dashboard(scope):
+    """
+    Cache decorator for an APIView.get. `scope` is 'seller' (the requesting
+    seller's scope) or 'admin'. Sets X-Cache to HIT, STALE, REVALIDATED or MISS.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            # exports are streamed and never cached; a cached JSON entry must not
+            # answer them either (the format may come from the Accept header)
+            export_format = getattr(view, 'export_format', None)
+            if export_format is not None and export_format():
+                response = get(view, request, *args, **kwargs)
+                response['X-Cache'] = 'MISS'
+                return response
+
+            user_id = request.user.pk
+            generation = _generation(seller_scope(user_id) if scope == 'seller' else ADMIN_SCOPE)
+            key = ENTRY_KEY.format(view=type(view).__name__, user_id=user_id,
+                                   params=_params_key(request, kwargs))
+            lock_key = f'{key}:lock'
+
+            entry = cache.get(key)
+            locked = False
+            if entry is not None:
+                if entry['generation'] == generation and time.time() - entry['computed_at'] < FRESH_TIMEOUT:
+                    return _cached(entry['data'], 'HIT')
+                locked = cache.add(lock_key, 1, REVALIDATE_LOCK_TIMEOUT)
+                if SERVE_STALE and not locked:
+                    return _cached(entry['data'], 'STALE')
+
+            try:
+                response = get(view, request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, {'data': response.data, 'generation': generation,
+                                    'computed_at': time.time()}, STALE_TIMEOUT)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            response['X-Cache'] = 'MISS' if entry is None else 'REVALIDATED'
+            return response
+        return wrapper
+    return decorator
+
+
+def _cached(data, status):
+    response = Response(data)
+    response['X-Cache'] = status
+    return response
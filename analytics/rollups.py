@@ -0,0 +1,155 @@
+# analytics/rollups.py
+"""
+Incremental maintenance of DailySalesFact.
+
+SettlementService.settle_chunk records completed orders and the returns
+flow records refunds; both add their deltas with one
+INSERT ... ON CONFLICT DO UPDATE per batch (supported by SQLite and
+PostgreSQL), so concurrent writers never lose an increment, and mark the
+affected dashboards stale (see analytics.response_cache).
+rebuild_daily_sales() recomputes a date range from orders and returns.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, OrderStatus
+
+from .models import DailySalesFact
+from .response_cache import invalidate_dashboards
+
+KEY_FIELDS = ('date', 'seller_id', 'product_id', 'buyer_id')
+DELTA_FIELDS = ('revenue', 'quantity', 'orders', 'seller_orders', 'refund_amount', 'refunded_quantity')
+BATCH_SIZE = 500
+
+
+def _empty():
+    return dict.fromkeys(DELTA_FIELDS, 0)
+
+
+def _upsert(facts):
+    """Add {key: deltas} to the fact table."""
+    if not facts:
+        return 0
+    qn = connection.ops.quote_name
+    table = qn(DailySalesFact._meta.db_table)
+    columns = [*KEY_FIELDS, *DELTA_FIELDS, 'updated_at']
+    increments = ', '.join(f'{qn(f)} = {table}.{qn(f)} + excluded.{qn(f)}' for f in DELTA_FIELDS)
+    now = timezone.now()
+
+    rows = list(facts.items())
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(batch))
+        params = []
+        for key, deltas in batch:
+            params.extend(key)
+            params.extend(deltas[f] for f in DELTA_FIELDS)
+            params.append(now)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) VALUES {placeholders} "
+                f"ON CONFLICT ({', '.join(qn(f) for f in KEY_FIELDS)}) DO UPDATE SET "
+                f"{increments}, {qn('updated_at')} = excluded.{qn('updated_at')}",
+                params,
+            )
+    return len(rows)
+
+
+def _add_items(facts, items, day_of):
+    """
+    Fold order items into facts. `items` are (order_id, buyer_id, seller_id,
+    product_id, quantity, total_price) sorted by order, seller and product;
+    day_of(order_id) gives the fact date.
+    """
+    seen_orders, seen_seller_orders = set(), set()
+    for order_id, buyer_id, seller_id, product_id, quantity, total_price in items:
+        deltas = facts.setdefault((day_of(order_id), seller_id, product_id, buyer_id), _empty())
+        deltas['revenue'] += Decimal(str(total_price))
+        deltas['quantity'] += quantity
+        if order_id not in seen_orders:
+            seen_orders.add(order_id)
+            deltas['orders'] += 1
+        if (order_id, seller_id) not in seen_seller_orders:
+            seen_seller_orders.add((order_id, seller_id))
+            deltas['seller_orders'] += 1
+
+
+def _order_items(orders):
+    return (OrderItem.objects.filter(order__in=orders)
+            .order_by('order_id', 'seller_id', 'product_id')
+            .values_list('order_id', 'order__buyer_id', 'seller_id', 'product_id', 'quantity', 'total_price'))
+
+
+def record_completed_orders(orders, completed_at):
+    """Book orders completed at `completed_at` (called by settle_chunk)."""
+    day = timezone.localdate(completed_at)
+    facts = {}
+    _add_items(facts, _order_items(orders), lambda order_id: day)
+    invalidate_dashboards(seller_id for _, seller_id, _, _ in facts)
+    return _upsert(facts)
+
+
+def record_refund(return_request):
+    """Book an approved, refunded return on the day it was processed."""
+    item = return_request.order_item
+    key = (timezone.localdate(return_request.processed_at or timezone.now()),
+           item.seller_id, item.product_id, return_request.buyer_id)
+    deltas = _empty()
+    deltas['refund_amount'] = return_request.refund_amount or Decimal('0.00')
+    deltas['refunded_quantity'] = return_request.quantity
+    invalidate_dashboards([item.seller_id])
+    return _upsert({key: deltas})
+
+
+def _day_bounds(start_date, end_date):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz) if start_date else None
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz) if end_date else None
+    return start, end
+
+
+@transaction.atomic
+def rebuild_daily_sales(start_date=None, end_date=None, chunk_size=2000):
+    """
+    Delete and recompute the facts between start_date and end_date
+    (inclusive, open-ended when None). Returns counts for reporting.
+    """
+    from returns.models import ReturnRequest, ReturnStatus
+
+    start, end = _day_bounds(start_date, end_date)
+    facts_qs = DailySalesFact.objects.all()
+    orders_qs = Order.objects.filter(status=OrderStatus.COMPLETED, completed_at__isnull=False)
+    returns_qs = ReturnRequest.objects.filter(status=ReturnStatus.APPROVED, processed_at__isnull=False)
+    if start_date:
+        facts_qs = facts_qs.filter(date__gte=start_date)
+        orders_qs = orders_qs.filter(completed_at__gte=start)
+        returns_qs = returns_qs.filter(processed_at__gte=start)
+    if end_date:
+        facts_qs = facts_qs.filter(date__lte=end_date)
+        orders_qs = orders_qs.filter(completed_at__lt=end)
+        returns_qs = returns_qs.filter(processed_at__lt=end)
+
+    report = {'deleted': facts_qs.delete()[0], 'orders': 0, 'refunds': 0, 'rows': 0}
+
+    order_days = dict(orders_qs.order_by('pk').values_list('pk', 'completed_at'))
+    order_ids = list(order_days)
+    facts = {}
+    for i in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[i:i + chunk_size]
+        _add_items(facts, _order_items(chunk), lambda order_id: timezone.localdate(order_days[order_id]))
+    report['orders'] = len(order_ids)
+
+    for processed_at, seller_id, product_id, buyer_id, amount, quantity in (
+            returns_qs.values_list('processed_at', 'order_item__seller_id', 'order_item__product_id',
+                                   'buyer_id', 'refund_amount', 'quantity')):
+        deltas = facts.setdefault((timezone.localdate(processed_at), seller_id, product_id, buyer_id), _empty())
+        deltas['refund_amount'] += amount or Decimal('0.00')
+        deltas['refunded_quantity'] += quantity
+        report['refunds'] += 1
+
+    report['rows'] = _upsert(facts)
+    invalidate_dashboards(seller_id for _, seller_id, _, _ in facts)
+    return report
@@ -0,0 +1,36 @@
+# analytics/signals.py
+"""Moderation and catalog events that make cached dashboards stale."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from auctions.models import Auction
+from products.models import Brand, Product
+from returns.models import ReturnRequest
+from reviews.models import Review
+
+from .response_cache import invalidate_dashboards
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Auction)
+@receiver(post_delete, sender=Auction)
+def on_seller_item_change(sender, instance, **kwargs):
+    invalidate_dashboards([instance.seller_id])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def on_review_change(sender, instance, **kwargs):
+    invalidate_dashboards([instance.product.seller_id])
+
+
+@receiver(post_save, sender=ReturnRequest)
+def on_return_change(sender, instance, **kwargs):
+    invalidate_dashboards([instance.order_item.seller_id])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def on_brand_change(sender, instance, **kwargs):
+    invalidate_dashboards()
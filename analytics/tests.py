@@ -1,3 +1,253 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Role
+from accounts.testing import make_user
+from orders.models import Order, OrderItem, OrderStatus
+from orders.services import SettlementService
+from products.models import Category, Product
+from returns.models import ReturnRequest, ReturnStatus
+from wallet.models import Transaction, Wallet
+
+from . import export
+from .models import DailySalesFact
+from .rollups import record_refund
+
+
+class RollupTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyers = [make_user('buyer0'), make_user('buyer1')]
+        cls.sellers = [make_user(f'seller{i}', role=Role.SELLER) for i in range(2)]
+        cls.admin = make_user('admin', role=Role.ADMIN)
+        category = Category.objects.create(name_ar='فئة', name_en='Category')
+        cls.products = [
+            Product.objects.create(seller=seller, category=category, name_en=f'Item {i}',
+                                   price=Decimal('100.00'), quantity=100, is_approved=True)
+            for i, seller in enumerate([cls.sellers[0], cls.sellers[0], cls.sellers[1]])
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _order(self, buyer, lines):
+        order = Order.objects.create(
+            buyer=buyer, total_amount=Decimal('0.00'), status=OrderStatus.DELIVERED,
+            delivered_at=timezone.now() - timezone.timedelta(days=4),
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, seller=product.seller,
+                                     quantity=quantity, price_at_purchase=product.price)
+        order.total_amount = sum(item.total_price for item in order.items.all())
+        order.save(update_fields=['total_amount'])
+        Wallet.objects.filter(user=buyer).update(held_balance=F('held_balance') + order.total_amount)
+        return order
+
+    def _settle(self):
+        with override_settings(PLATFORM_WALLET_USER_ID=self.admin.pk), \
+                self.captureOnCommitCallbacks(execute=True):
+            report = SettlementService.settle_due_orders()
+        self.assertEqual(report['orders_failed'], 0)
+
+    def _facts(self):
+        return sorted(DailySalesFact.objects.values_list(
+            'seller_id', 'product_id', 'buyer_id', 'revenue', 'quantity', 'orders', 'seller_orders',
+            'refund_amount', 'refunded_quantity'))
+
+    def _place_orders(self):
+        p0, p1, p2 = self.products
+        self._order(self.buyers[0], [(p0, 1), (p1, 2), (p2, 1)])
+        self._order(self.buyers[0], [(p0, 3)])
+        self._order(self.buyers[1], [(p2, 2)])
+        self._settle()
+
+
+
+class DailySalesRollupTests(RollupTestCase):
+    def test_settlement_books_distinct_order_counts(self):
+        self._place_orders()
+
+        self.assertEqual(DailySalesFact.objects.count(), 4)
+        totals = {
+            key: sum(row[i] for row in self._facts())
+            for key, i in (('revenue', 3), ('quantity', 4), ('orders', 5))
+        }
+        self.assertEqual(totals, {'revenue': Decimal('900.00'), 'quantity': 9, 'orders': 3})
+        seller0 = DailySalesFact.objects.filter(seller=self.sellers[0])
+        self.assertEqual(sum(seller0.values_list('seller_orders', flat=True)), 2)
+
+    def test_dashboards_read_rollups(self):
+        self._place_orders()
+        client = APIClient()
+
+        client.force_authenticate(self.sellers[0])
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/seller/orders-over-time/', secure=True)
+        self.assertEqual(response.data, [{
+            'date': timezone.localdate(), 'revenue': 600.0, 'orders': 2, 'items': 6,
+        }])
+        kpis = client.get('/api/analytics/seller/summary/', secure=True).data['kpis']
+        self.assertEqual((Decimal(kpis['revenue_all']), kpis['orders_all'], kpis['orders_30d']),
+                         (Decimal('600'), 2, 2))
+
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/admin/top-buyers/', secure=True)
+        self.assertEqual([(r['buyer_id'], r['spend'], r['orders']) for r in response.data],
+                         [(self.buyers[0].pk, 700.0, 2), (self.buyers[1].pk, 200.0, 1)])
+        kpis = client.get('/api/analytics/admin/summary/', secure=True).data['kpis']
+        self.assertEqual((Decimal(kpis['gmv']), kpis['completed_orders'], kpis['items_sold']),
+                         (Decimal('900'), 3, 9))
+
+    def test_refunds_and_backfill_match_incremental(self):
+        self._place_orders()
+        item = OrderItem.objects.filter(product=self.products[2], order__buyer=self.buyers[1]).get()
+        refund = ReturnRequest.objects.create(
+            order=item.order, order_item=item, buyer=self.buyers[1], reason='broken', quantity=1,
+            status=ReturnStatus.APPROVED, refund_amount=Decimal('100.00'), processed_at=timezone.now(),
+        )
+        record_refund(refund)
+        incremental = self._facts()
+        self.assertIn((self.sellers[1].pk, self.products[2].pk, self.buyers[1].pk,
+                       Decimal('200.00'), 2, 1, 1, Decimal('100.00'), 1), incremental)
+
+        DailySalesFact.objects.update(revenue=0)
+        call_command('backfill_daily_sales', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self._facts(), incremental)
+
+
+
+class DashboardResponseCacheTests(RollupTestCase):
+    def setUp(self):
+        super().setUp()
+        self._place_orders()
+        self.client = APIClient()
+        self.client.force_authenticate(self.sellers[0])
+
+    def _summary(self):
+        response = self.client.get('/api/analytics/seller/summary/', secure=True)
+        return response['X-Cache'], response.data['kpis']['orders_all']
+
+    def _complete_another_order(self):
+        self._order(self.buyers[1], [(self.products[0], 1)])
+        self._settle()
+
+    def test_hit_until_settlement_invalidates(self):
+        self.assertEqual(self._summary(), ('MISS', 2))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._summary(), ('HIT', 2))
+
+        # another seller's events leave this entry alone
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[2].save()
+        self.assertEqual(self._summary(), ('HIT', 2))
+
+        self._complete_another_order()
+        self.assertEqual(self._summary(), ('REVALIDATED', 3))
+        self.assertEqual(self._summary(), ('HIT', 3))
+
+    def test_stale_copy_served_while_another_request_revalidates(self):
+        self._summary()
+        self._complete_another_order()
+
+        # the revalidation lock is held by a concurrent request
+        with mock.patch('analytics.response_cache.cache.add', return_value=False):
+            self.assertEqual(self._summary(), ('STALE', 2))
+        with mock.patch('analytics.response_cache.SERVE_STALE', False), \
+                mock.patch('analytics.response_cache.cache.add', return_value=False):
+            self.assertEqual(self._summary(), ('REVALIDATED', 3))
+
+
+class StreamingExportTests(RollupTestCase):
+    def setUp(self):
+        super().setUp()
+        self._place_orders()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyers[0])
+
+    def _export(self, path, fmt, **params):
+        response = self.client.get(path, {'format': fmt, **params}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode(), response
+
+    def test_transactions_csv(self):
+        body, response = self._export('/api/wallet/transactions/', 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,created_at,transaction_type,amount,recipient,description,reference,is_successful')
+        wallet = Wallet.objects.get(user=self.buyers[0])
+        self.assertEqual(len(lines) - 1, wallet.transactions.count())
+        self.assertEqual(int(lines[1].split(',')[0]), wallet.transactions.order_by('-created_at', '-id')[0].pk)
+
+        # the JSON view still pages through the same rows
+        response = self.client.get('/api/wallet/transactions/', secure=True)
+        self.assertEqual(len(response.data['results']), wallet.transactions.count())
+
+    def test_export_reads_rows_through_one_cursor(self):
+        wallet = Wallet.objects.get(user=self.buyers[0])
+        Transaction.objects.bulk_create([
+            Transaction(wallet=wallet, amount=Decimal('1.00'), transaction_type='deposit')
+            for _ in range(50)
+        ])
+        with mock.patch.object(export, 'EXPORT_CHUNK_SIZE', 7), mock.patch.object(export, 'FLUSH_ROWS', 10):
+            response = self.client.get('/api/wallet/transactions/', {'format': 'ndjson'}, secure=True)
+            with self.assertNumQueries(1):
+                chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual(b''.join(chunks).count(b'\n'), wallet.transactions.count())
+
+    def test_orders_and_returns_ndjson(self):
+        body, _ = self._export('/api/orders/', 'ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['id'] for r in rows],
+                         list(Order.objects.filter(buyer=self.buyers[0]).order_by('-created_at', '-id')
+                              .values_list('pk', flat=True)))
+        self.assertEqual(rows[0]['total_amount'], str(Order.objects.get(pk=rows[0]['id']).total_amount))
+
+        item = OrderItem.objects.filter(order__buyer=self.buyers[0]).first()
+        ReturnRequest.objects.create(order=item.order, order_item=item, buyer=self.buyers[0],
+                                     reason='broken', quantity=1)
+        body, _ = self._export('/api/returns/my-requests/', 'ndjson')
+        self.assertEqual([json.loads(line)['order_item_id'] for line in body.splitlines()], [item.pk])
+
+    def test_admin_report_export_is_not_cached(self):
+        self.client.force_authenticate(self.admin)
+        body, response = self._export('/api/analytics/admin/top-products/', 'csv', metric='quantity')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'product_id,name_en,name_ar,seller_id,revenue,quantity')
+        self.assertEqual(lines[1].split(',')[0], str(self.products[0].pk))
+
+        _, response = self._export('/api/analytics/admin/top-products/', 'csv', metric='quantity')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.client.get('/api/analytics/admin/top-products/', {'metric': 'quantity'}, secure=True)
+        self.assertEqual(response.data[0]['product_id'], self.products[0].pk)
+
+    def test_export_negotiated_by_accept_header_skips_cached_json(self):
+        self.client.force_authenticate(self.admin)
+        path = '/api/analytics/admin/top-products/'
+        self.client.get(path, {'metric': 'quantity'}, secure=True)
+        self.assertEqual(self.client.get(path, {'metric': 'quantity'}, secure=True)['X-Cache'], 'HIT')
+
+        for media_type in ['text/csv', 'application/x-ndjson']:
+            response = self.client.get(path, {'metric': 'quantity'}, HTTP_ACCEPT=media_type, secure=True)
+            self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertTrue(response.streaming)
+            self.assertTrue(response['Content-Type'].startswith(media_type))
+
+    def test_every_tabular_report_exports(self):
+        self.client.force_authenticate(self.admin)
+        for path in ['sales-over-time', 'top-sellers', 'top-buyers', 'returns-breakdown', 'low-stock']:
+            body, _ = self._export(f'/api/analytics/admin/{path}/', 'csv', threshold=1000)
+            self.assertTrue(body.splitlines(), path)
@@ -1,47 +1,48 @@
 # analytics/views.py
-from django.db.models import Sum, Count, F, Q, Avg
+from django.db.models import Sum, Count, F, Q
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions
 from accounts.permissionsUsers import IsSeller
-from orders.models import OrderItem, OrderStatus
 from products.models import Product
 from returns.models import ReturnRequest, ReturnStatus
-from reviews.models import Review
+from reviews.stats import seller_stats
 from wallet.models import Wallet, Transaction
+from .models import DailySalesFact
+from .response_cache import cached_dashboard
 from decimal import Decimal
 from datetime import timedelta
 
 class SellerDashboardSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         seller = request.user
-        now = timezone.now()
-        start_30 = now - timedelta(days=30)
-
-        # Completed orders (funds released) → revenue to seller
-        completed_items = (OrderItem.objects
-            .filter(seller=seller, order__status=OrderStatus.COMPLETED))
-
-        revenue_all = completed_items.aggregate(v=Sum('total_price'))['v'] or Decimal('0.00')
-        orders_all = (completed_items.values('order_id').distinct().count())
-        items_all = completed_items.aggregate(c=Sum('quantity'))['c'] or 0
+        start_30 = timezone.localdate() - timedelta(days=30)
+        recent = Q(date__gte=start_30)
+
+        # One pass over the seller's daily rollups (completed orders + refunds)
+        totals = DailySalesFact.objects.filter(seller=seller).aggregate(
+            revenue_all=Sum('revenue'),
+            orders_all=Sum('seller_orders'),
+            items_all=Sum('quantity'),
+            revenue_30=Sum('revenue', filter=recent),
+            orders_30=Sum('seller_orders', filter=recent),
+            sold_qty_30=Sum('quantity', filter=recent),
+            refunded_qty_30=Sum('refunded_quantity', filter=recent),
+        )
+        revenue_all = totals['revenue_all'] or Decimal('0.00')
+        orders_all = totals['orders_all'] or 0
+        items_all = totals['items_all'] or 0
         aov = (revenue_all / orders_all) if orders_all else Decimal('0.00')
-
-        # Last 30d stats
-        completed_items_30 = completed_items.filter(order__completed_at__gte=start_30)
-        revenue_30 = completed_items_30.aggregate(v=Sum('total_price'))['v'] or Decimal('0.00')
-        orders_30 = completed_items_30.values('order_id').distinct().count()
+        revenue_30 = totals['revenue_30'] or Decimal('0.00')
+        orders_30 = totals['orders_30'] or 0
 
         # Refund rate = refunded qty / sold qty (last 30d)
-        sold_qty_30 = completed_items_30.aggregate(c=Sum('quantity'))['c'] or 0
-        refunded_qty_30 = (ReturnRequest.objects
-                           .filter(order_item__seller=seller,
-                                   status=ReturnStatus.APPROVED,
-                                   processed_at__gte=start_30)
-                           .aggregate(c=Sum('quantity'))['c'] or 0)
+        sold_qty_30 = totals['sold_qty_30'] or 0
+        refunded_qty_30 = totals['refunded_qty_30'] or 0
         refund_rate_30 = (refunded_qty_30 / sold_qty_30) if sold_qty_30 else 0
 
         # Low stock
@@ -49,9 +50,7 @@ class SellerDashboardSummaryView(APIView):
         low_stock_count = Product.objects.filter(seller=seller, quantity__lte=LOW_STOCK).count()
 
         # Rating avg
-        rating_avg = (Review.objects
-                      .filter(product__seller=seller)
-                      .aggregate(a=Avg('rating'))['a']) or 0
+        rating_avg = seller_stats(seller).average or 0
 
         # Wallet
         wallet = Wallet.objects.filter(user=seller).first()
@@ -86,19 +85,20 @@ class SellerDashboardSummaryView(APIView):
 class SellerOrdersOverTimeView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         seller = request.user
         # group by date
-        qs = (OrderItem.objects
-              .filter(seller=seller, order__status=OrderStatus.COMPLETED)
-              .values('order__completed_at__date')
+        qs = (DailySalesFact.objects
+              .filter(seller=seller, quantity__gt=0)
+              .values('date')
               .annotate(
-                  revenue=Sum('total_price'),
-                  orders=Count('order', distinct=True),
+                  revenue=Sum('revenue'),
+                  orders=Sum('seller_orders'),
                   items=Sum('quantity'))
-              .order_by('order__completed_at__date'))
+              .order_by('date'))
         data = [{
-            "date": r['order__completed_at__date'],
+            "date": r['date'],
             "revenue": float(r['revenue'] or 0),
             "orders": r['orders'],
             "items": r['items'] or 0
@@ -108,13 +108,14 @@ class SellerOrdersOverTimeView(APIView):
 class SellerTopProductsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         seller = request.user
         limit = int(request.query_params.get('limit', 10))
-        qs = (OrderItem.objects
-              .filter(seller=seller, order__status=OrderStatus.COMPLETED)
+        qs = (DailySalesFact.objects
+              .filter(seller=seller, quantity__gt=0)
               .values('product_id', 'product__name_en', 'product__name_ar')
-              .annotate(revenue=Sum('total_price'), qty=Sum('quantity'))
+              .annotate(revenue=Sum('revenue'), qty=Sum('quantity'))
               .order_by('-revenue')[:limit])
         return Response([{
             "product_id": r['product_id'],
@@ -139,6 +140,7 @@ class SellerLowStockView(APIView):
 class SellerReturnsStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         seller = request.user
         qs = (ReturnRequest.objects
@@ -155,25 +157,17 @@ class SellerReturnsStatsView(APIView):
 class SellerRatingsBreakdownView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         seller = request.user
         # counts per star 1..5
-        from reviews.models import Review
-        buckets = {i: 0 for i in range(1, 6)}
-        agg = (Review.objects
-               .filter(product__seller=seller)
-               .values('rating')
-               .annotate(c=Count('id')))
-        for row in agg:
-            buckets[row['rating']] = row['c']
-        avg = (Review.objects
-               .filter(product__seller=seller)
-               .aggregate(a=Avg('rating'))['a']) or 0
-        return Response({"avg": round(float(avg), 2), "buckets": buckets})
+        stats = seller_stats(seller)
+        return Response({"avg": round(float(stats.average or 0), 2), "buckets": stats.buckets})
 
 class SellerAuctionStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSeller]
 
+    @cached_dashboard('seller')
     def get(self, request):
         from auctions.models import Auction, AuctionStatus
         seller = request.user
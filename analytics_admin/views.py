@@ -2,7 +2,7 @@
 from datetime import timedelta
 from decimal import Decimal
 
-from django.db.models import Sum, Count, Avg, Q, F
+from django.db.models import Sum, Count, Q, F
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -14,12 +14,16 @@ from accounts.permissionsUsers import (
 
 from accounts.permissionsUsers import IsSuperAdminOrAdmin
 from accounts.models import User
-from orders.models import Order, OrderItem, OrderStatus
+from orders.models import Order
 from products.models import Product, Brand, BrandStatus
 from returns.models import ReturnRequest, ReturnStatus
 from reviews.models import Review
+from reviews.stats import global_stats
 from auctions.models import Auction, AuctionStatus
 from wallet.models import Transaction, Wallet
+from analytics.models import DailySalesFact
+from analytics.response_cache import cached_dashboard
+from analytics.export import ExportMixin, export_response
 from django.utils.dateparse import parse_date
 
 
@@ -47,30 +51,34 @@ def _daterange(request, default_days=30):
     return start, end
 
 
+def _facts_in_range(request, default_days=30):
+    """DailySalesFact rows for the days covered by _daterange()."""
+    start, end = _daterange(request, default_days)
+    return start, end, DailySalesFact.objects.filter(
+        date__gte=timezone.localdate(start), date__lte=timezone.localdate(end),
+    )
+
+
 # 1) High-level KPIs (GMV, completed orders, items, AOV, refunds, users, products, etc.)
 class AdminDashboardSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
-        start, end = _daterange(request, default_days=30)
+        start, end, facts = _facts_in_range(request, default_days=30)
 
-        # GMV = sum of completed order items' total_price
-        completed_items = OrderItem.objects.filter(
-            order__status=OrderStatus.COMPLETED,
-            order__completed_at__gte=start,
-            order__completed_at__lt=end,
+        # GMV, orders, items and refunds in one pass over the daily rollups
+        totals = facts.aggregate(
+            gmv=Sum('revenue'), orders=Sum('orders'),
+            items=Sum('quantity'), refunded_qty=Sum('refunded_quantity'),
         )
-        gmv = completed_items.aggregate(v=Sum('total_price'))['v'] or Decimal('0.00')
-        orders_cnt = completed_items.values('order_id').distinct().count()
-        items_cnt = completed_items.aggregate(c=Sum('quantity'))['c'] or 0
+        gmv = totals['gmv'] or Decimal('0.00')
+        orders_cnt = totals['orders'] or 0
+        items_cnt = totals['items'] or 0
         aov = (gmv / orders_cnt) if orders_cnt else Decimal('0.00')
 
-        # Refunds (approved) amount & rate (by qty)
-        rr_approved = ReturnRequest.objects.filter(
-            status=ReturnStatus.APPROVED,
-            processed_at__gte=start, processed_at__lt=end
-        )
-        refunded_qty = rr_approved.aggregate(c=Sum('quantity'))['c'] or 0
+        # Refund rate (by qty)
+        refunded_qty = totals['refunded_qty'] or 0
         sold_qty = items_cnt
         refund_rate = (refunded_qty / sold_qty) if sold_qty else 0
 
@@ -89,7 +97,7 @@ class AdminDashboardSummaryView(APIView):
         pending_returns = ReturnRequest.objects.filter(status=ReturnStatus.REQUESTED).count()
 
         # Reviews
-        avg_rating = Review.objects.aggregate(a=Avg('rating'))['a'] or 0
+        avg_rating = global_stats().average or 0
         reviews_30 = Review.objects.filter(created_at__gte=start, created_at__lt=end).count()
 
         return Response({
@@ -119,20 +127,23 @@ class AdminDashboardSummaryView(APIView):
 
 
 # 2) GMV / Orders over time (chart)
-class AdminSalesOverTimeView(APIView):
+class AdminSalesOverTimeView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
-        start, end = _daterange(request, default_days=30)
-        qs = (OrderItem.objects
-              .filter(order__status=OrderStatus.COMPLETED,
-                      order__completed_at__gte=start,
-                      order__completed_at__lt=end)
-              .values(date=F('order__completed_at__date'))
-              .annotate(gmv=Sum('total_price'),
-                        orders=Count('order', distinct=True),
+        _, _, facts = _facts_in_range(request, default_days=30)
+        qs = (facts
+              .filter(quantity__gt=0)
+              .values('date')
+              .annotate(gmv=Sum('revenue'),
+                        orders=Sum('orders'),
                         items=Sum('quantity'))
               .order_by('date'))
+        fmt = self.export_format()
+        if fmt:
+            columns = ['date', 'gmv', 'orders', 'items']
+            return export_response(fmt, 'sales-over-time', columns, qs.values_list(*columns))
         data = [{
             "date": r['date'],
             "gmv": float(r['gmv'] or 0),
@@ -143,35 +154,46 @@ class AdminSalesOverTimeView(APIView):
 
 
 # 3) Top-10 sellers by points (with basic seller info)
-class AdminTopSellersByPointsView(APIView):
+class AdminTopSellersByPointsView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
         limit = int(request.query_params.get('limit', 10))
+        columns = ['id', 'username', 'first_name', 'last_name', 'email', 'points']
+        fmt = self.export_format()
+        if fmt:
+            rows = User.objects.filter(role='seller').values_list(*columns).order_by('-points')[:limit]
+            return export_response(fmt, 'top-sellers', columns, rows)
         qs = (User.objects
               .filter(role='seller')
-              .values('id', 'username', 'first_name', 'last_name', 'email', 'points')
+              .values(*columns)
               .order_by('-points')[:limit])
         return Response(list(qs))
 
 
 # 4) Top products (by revenue or by quantity) in a window
-class AdminTopProductsView(APIView):
+class AdminTopProductsView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
-        start, end = _daterange(request, default_days=30)
+        _, _, facts = _facts_in_range(request, default_days=30)
         metric = request.query_params.get('metric', 'revenue')  # 'revenue' or 'quantity'
         limit = int(request.query_params.get('limit', 10))
-        qs = (OrderItem.objects
-              .filter(order__status=OrderStatus.COMPLETED,
-                      order__completed_at__gte=start,
-                      order__completed_at__lt=end)
+        qs = (facts
+              .filter(quantity__gt=0)
               .values('product_id', 'product__name_en', 'product__name_ar', 'product__seller_id')
               .annotate(
-                  revenue=Sum('total_price'),
+                  revenue=Sum('revenue'),
                   quantity=Sum('quantity'))
               .order_by('-revenue' if metric == 'revenue' else '-quantity')[:limit])
+        fmt = self.export_format()
+        if fmt:
+            return export_response(
+                fmt, 'top-products', ['product_id', 'name_en', 'name_ar', 'seller_id', 'revenue', 'quantity'],
+                qs.values_list('product_id', 'product__name_en', 'product__name_ar', 'product__seller_id',
+                               'revenue', 'quantity'))
         data = [{
             "product_id": r['product_id'],
             "name_en": r['product__name_en'],
@@ -184,33 +206,39 @@ class AdminTopProductsView(APIView):
 
 
 # 5) Top buyers (by spend or by orders) in a window
-class AdminTopBuyersView(APIView):
+class AdminTopBuyersView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
-        start, end = _daterange(request, default_days=30)
+        _, _, facts = _facts_in_range(request, default_days=30)
         metric = request.query_params.get('metric', 'spend')  # 'spend' or 'orders'
         limit = int(request.query_params.get('limit', 10))
-        oi = (OrderItem.objects
-              .filter(order__status=OrderStatus.COMPLETED,
-                      order__completed_at__gte=start,
-                      order__completed_at__lt=end)
-              .values('order__buyer_id',
-                      'order__buyer__username',
-                      'order__buyer__first_name',
-                      'order__buyer__last_name',
-                      'order__buyer__email')
+        oi = (facts
+              .filter(quantity__gt=0)
+              .values('buyer_id',
+                      'buyer__username',
+                      'buyer__first_name',
+                      'buyer__last_name',
+                      'buyer__email')
               .annotate(
-                  spend=Sum('total_price'),
-                  orders=Count('order', distinct=True),
+                  spend=Sum('revenue'),
+                  orders=Sum('orders'),
                   items=Sum('quantity'))
               .order_by('-spend' if metric == 'spend' else '-orders')[:limit])
+        fmt = self.export_format()
+        if fmt:
+            return export_response(
+                fmt, 'top-buyers',
+                ['buyer_id', 'username', 'first_name', 'last_name', 'email', 'spend', 'orders', 'items'],
+                oi.values_list('buyer_id', 'buyer__username', 'buyer__first_name', 'buyer__last_name',
+                               'buyer__email', 'spend', 'orders', 'items'))
         data = [{
-            "buyer_id": r['order__buyer_id'],
-            "username": r['order__buyer__username'],
-            "first_name": r['order__buyer__first_name'],
-            "last_name": r['order__buyer__last_name'],
-            "email": r['order__buyer__email'],
+            "buyer_id": r['buyer_id'],
+            "username": r['buyer__username'],
+            "first_name": r['buyer__first_name'],
+            "last_name": r['buyer__last_name'],
+            "email": r['buyer__email'],
             "spend": float(r['spend'] or 0),
             "orders": r['orders'],
             "items": r['items'] or 0
@@ -219,9 +247,10 @@ class AdminTopBuyersView(APIView):
 
 
 # 6) Returns breakdown by reason (and overall qty) in a window
-class AdminReturnsBreakdownView(APIView):
+class AdminReturnsBreakdownView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
         start, end = _daterange(request, default_days=30)
         qs = (ReturnRequest.objects
@@ -230,6 +259,9 @@ class AdminReturnsBreakdownView(APIView):
               .values('reason')
               .annotate(qty=Sum('quantity'))
               .order_by('-qty'))
+        fmt = self.export_format()
+        if fmt:
+            return export_response(fmt, 'returns-by-reason', ['reason', 'qty'], qs.values_list('reason', 'qty'))
         total = sum((r['qty'] or 0) for r in qs)
         return Response({
             "total_returned_qty": total,
@@ -241,33 +273,34 @@ class AdminReturnsBreakdownView(APIView):
 class AdminRatingsDistributionView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
-        buckets = {i: 0 for i in range(1, 6)}
-        agg = Review.objects.values('rating').annotate(c=Count('id'))
-        for row in agg:
-            buckets[row['rating']] = row['c']
-        avg = Review.objects.aggregate(a=Avg('rating'))['a'] or 0
-        return Response({"avg": round(float(avg), 2), "buckets": buckets})
+        stats = global_stats()
+        return Response({"avg": round(float(stats.average or 0), 2), "buckets": stats.buckets})
 
 
 # 8) Inventory health (low stock list)
-class AdminLowStockView(APIView):
+class AdminLowStockView(ExportMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
     def get(self, request):
         threshold = int(request.query_params.get('threshold', 5))
         limit = int(request.query_params.get('limit', 50))
+        columns = ['id', 'name_en', 'name_ar', 'quantity', 'seller_id']
         qs = (Product.objects
               .filter(quantity__lte=threshold)
-              .values('id', 'name_en', 'name_ar', 'quantity', 'seller_id')
-              .order_by('quantity', 'id')[:limit])
-        return Response(list(qs))
+              .order_by('quantity', 'id'))
+        fmt = self.export_format()
+        if fmt:
+            return export_response(fmt, 'low-stock', columns, qs.values_list(*columns)[:limit])
+        return Response(list(qs.values(*columns)[:limit]))
 
 
 # 9) Brands stats
 class AdminBrandsStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
         totals = dict(Brand.objects.values('status').annotate(c=Count('id')).values_list('status', 'c'))
         used = (Product.objects
@@ -285,6 +318,7 @@ class AdminBrandsStatsView(APIView):
 class AdminAuctionsStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSuperAdminOrAdmin]
 
+    @cached_dashboard('admin')
     def get(self, request):
         totals = dict(Auction.objects.values('status').annotate(c=Count('id')).values_list('status', 'c'))
         active = Auction.objects.filter(status=AuctionStatus.ACTIVE).count()
@@ -0,0 +1,45 @@
+# auctions/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .feed import group_name, snapshot
+from .models import Auction
+
+
+class AuctionFeedConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live price stream for one auction, public like AuctionDetailView.
+    Sends a snapshot of the order book on connect, then the deltas that
+    auctions.feed publishes after each bid, extension, buy-now or close,
+    so bidders need not poll AuctionDetailView.
+
+    The consumer joins the group before reading the snapshot, so a bid that
+    commits in between is still delivered. Such a delta may already be
+    counted in the snapshot: clients drop bid deltas whose bid_count is not
+    above the snapshot's.
+    """
+
+    async def connect(self):
+        self.auction_id = int(self.scope['url_route']['kwargs']['auction_id'])
+        self.group_name = group_name(self.auction_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        state = await self.get_snapshot()
+        if state is None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.close(code=4404)
+            return
+
+        await self.accept()
+        await self.send_json({'type': 'snapshot', **state})
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def auction_update(self, event):
+        await self.send_json(event['event'])
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        auction = Auction.objects.filter(pk=self.auction_id).first()
+        return snapshot(auction) if auction else None
@@ -0,0 +1,68 @@
+# auctions/feed.py
+"""
+Live auction feed.
+
+Write paths call publish_*() to push a delta to the auction's
+`auction_<id>` group (see auctions.consumers.AuctionFeedConsumer). Inside a
+transaction the delta is sent once it commits, so subscribers never see a
+bid or close that was rolled back; outside one it is sent immediately.
+Delivery is best effort: clients resync from the snapshot sent on connect.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def group_name(auction_id):
+    return f'auction_{auction_id}'
+
+
+def snapshot(auction):
+    """Current order book and lifecycle state of an auction, as sent on connect."""
+    return {
+        'auction_id': auction.id,
+        'status': auction.status,
+        'current_amount': None if auction.current_amount is None else str(auction.current_amount),
+        'min_next_bid': str(auction.minimum_bid),
+        'bid_count': auction.bid_count,
+        'end_at': auction.end_at.isoformat(),
+    }
+
+
+def publish(auction_id, event_type, **data):
+    """Queue a `event_type` delta for the auction's subscribers, sent after commit."""
+    event = {'type': event_type, 'auction_id': auction_id, **data}
+    transaction.on_commit(lambda: send(auction_id, event), robust=True)
+
+
+def send(auction_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name(auction_id), {
+            'type': 'auction_update',
+            'event': event,
+        })
+    except Exception:
+        logger.exception("Auction feed push failed for auction %s", auction_id)
+
+
+def publish_bid(auction, amount, end_at):
+    """A bid was accepted; `auction` is the book as it was before the bid."""
+    publish(
+        auction.id, 'bid',
+        current_amount=str(amount),
+        min_next_bid=str(amount + auction.min_increment),
+        bid_count=auction.bid_count + 1,
+        end_at=end_at.isoformat(),
+        extended=end_at != auction.end_at,
+    )
+
+
+def publish_status(auction, **data):
+    publish(auction.id, 'status', status=auction.status, **data)
@@ -0,0 +1,49 @@
+# auctions/management/commands/run_auction_scheduler.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auctions.scheduler import AuctionScheduler
+
+
+class Command(BaseCommand):
+    help = 'Activates approved auctions at start_at and closes/settles active ones at end_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single tick and exit')
+        parser.add_argument('--max-sleep', type=float, default=1.0,
+                            help='Upper bound (seconds) between ticks; bounds how late a deadline fires')
+        parser.add_argument('--horizon', type=float, default=600.0,
+                            help='Seconds ahead to load deadlines for')
+        parser.add_argument('--reload-interval', type=float, default=30.0,
+                            help='Seconds between reloads, so new or rescheduled auctions are picked up')
+        parser.add_argument('--metrics-every', type=float, default=60.0,
+                            help='Seconds between scheduling lag reports')
+
+    def handle(self, *args, **options):
+        scheduler = AuctionScheduler(
+            horizon=timezone.timedelta(seconds=options['horizon']),
+            reload_interval=min(options['reload_interval'], options['horizon']),
+        )
+        next_report = time.monotonic() + options['metrics_every']
+
+        while True:
+            scheduler.tick()
+
+            if options['once']:
+                self._report(scheduler)
+                return
+            if time.monotonic() >= next_report:
+                self._report(scheduler)
+                next_report = time.monotonic() + options['metrics_every']
+
+            # Sleep until the next deadline or reload, capped by --max-sleep
+            sleep_for = options['max_sleep']
+            next_at = scheduler.next_wakeup()
+            if next_at is not None:
+                sleep_for = min(sleep_for, max(0.0, (next_at - timezone.now()).total_seconds()))
+            time.sleep(sleep_for)
+
+    def _report(self, scheduler):
+        self.stdout.write(self.style.SUCCESS(f'{timezone.now():%Y-%m-%d %H:%M:%S} {scheduler.metrics()}'))
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_order_book(apps, schema_editor):
+    Auction = apps.get_model('auctions', 'Auction')
+    Bid = apps.get_model('auctions', 'Bid')
+
+    auctions = []
+    for auction in Auction.objects.filter(bids__isnull=False).distinct().iterator():
+        bids = Bid.objects.filter(auction_id=auction.pk)
+        top = bids.order_by('-amount', '-created_at').first()
+        auction.current_bidder_id = top.bidder_id
+        auction.current_amount = top.amount
+        auction.min_next_bid = top.amount + auction.min_increment
+        auction.bid_count = bids.count()
+        auctions.append(auction)
+    Auction.objects.bulk_update(
+        auctions, ['current_bidder', 'current_amount', 'min_next_bid', 'bid_count'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0002_alter_bid_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='current_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='current_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leading_auctions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='min_next_bid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_order_book, migrations.RunPython.noop),
+    ]
@@ -43,6 +43,13 @@ class Auction(models.Model):
     cancelled_at = models.DateTimeField(null=True, blank=True)
     cancelled_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='cancelled_auctions')
 
+    # order book, denormalized from bids and maintained by services.place_bid;
+    # bid_count doubles as the version its compare-and-swap UPDATE checks
+    current_bidder = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='leading_auctions')
+    current_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    min_next_bid = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    bid_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         indexes = [
             models.Index(fields=['status', 'start_at']),
@@ -70,6 +77,11 @@ class Auction(models.Model):
     def is_scheduled(self):
         return self.status == AuctionStatus.APPROVED and timezone.now() < self.start_at
 
+    @property
+    def minimum_bid(self):
+        """Smallest amount the next bid must reach."""
+        return self.start_price if self.min_next_bid is None else self.min_next_bid
+
     @property
     def is_live(self):
         now = timezone.now()
@@ -0,0 +1,8 @@
+# auctions/routing.py
+from django.urls import re_path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'^ws/auctions/(?P<auction_id>\d+)/$', consumers.AuctionFeedConsumer.as_asgi()),
+]
@@ -0,0 +1,140 @@
+# auctions/scheduler.py
+"""
+Auction lifecycle scheduler.
+
+Keeps a heap of upcoming deadlines: `start_at` of approved auctions
+(activation) and `end_at` of active ones (close and settlement). The heap
+is loaded from the (status, start_at) / (status, end_at) indexes for the
+next `horizon` and reloaded every `reload_interval`, so a newly approved
+or rescheduled auction is picked up within that interval.
+
+When a close deadline fires, the auction row is re-read under lock: if
+place_bid's anti-sniping pushed end_at back, the entry is re-armed at the
+new end_at instead of closing. Extensions only ever move end_at later, so
+the auction is never closed early and is closed at most one tick after
+its final end_at.
+
+Lag (how late an entry fired relative to its deadline) is tracked for the
+scheduler's metrics.
+"""
+import heapq
+import logging
+from collections import deque
+
+from django.utils import timezone
+
+from .models import Auction, AuctionStatus
+from .services import activate_scheduled_if_due, close_if_due
+
+logger = logging.getLogger(__name__)
+
+ACTIVATE = 'activate'
+CLOSE = 'close'
+
+
+class AuctionScheduler:
+    def __init__(self, horizon=timezone.timedelta(minutes=10), reload_interval=30.0,
+                 retry_delay=30.0, lag_samples=1000):
+        self.horizon = horizon
+        self.reload_interval = reload_interval
+        self.retry_delay = retry_delay
+        self.heap = []
+        # (kind, auction_id) -> deadline currently armed; heap entries that
+        # no longer match are stale and skipped when popped
+        self.armed = {}
+        self.next_reload_at = None
+        self.lags = deque(maxlen=lag_samples)
+        self.counts = {'activated': 0, 'closed': 0, 'rearmed': 0, 'skipped': 0, 'failed': 0}
+
+    def arm(self, kind, auction_id, deadline):
+        key = (kind, auction_id)
+        if self.armed.get(key) == deadline:
+            return
+        self.armed[key] = deadline
+        heapq.heappush(self.heap, (deadline, kind, auction_id))
+
+    def load(self, now=None):
+        """Arm every activation/close deadline up to now + horizon (overdue ones included)."""
+        now = now or timezone.now()
+        until = now + self.horizon
+        for auction_id, start_at in (Auction.objects
+                                     .filter(status=AuctionStatus.APPROVED, start_at__lte=until)
+                                     .values_list('pk', 'start_at')):
+            self.arm(ACTIVATE, auction_id, start_at)
+        for auction_id, end_at in (Auction.objects
+                                   .filter(status=AuctionStatus.ACTIVE, end_at__lte=until)
+                                   .values_list('pk', 'end_at')):
+            self.arm(CLOSE, auction_id, end_at)
+        self.next_reload_at = now + timezone.timedelta(seconds=self.reload_interval)
+
+    def tick(self, now=None):
+        """Reload if due, then fire every entry whose deadline has passed."""
+        now = now or timezone.now()
+        if self.next_reload_at is None or now >= self.next_reload_at:
+            self.load(now)
+
+        while self.heap and self.heap[0][0] <= now:
+            deadline, kind, auction_id = heapq.heappop(self.heap)
+            if self.armed.get((kind, auction_id)) != deadline:
+                continue
+            del self.armed[(kind, auction_id)]
+            self._fire(kind, auction_id, deadline)
+
+    def _fire(self, kind, auction_id, deadline):
+        now = timezone.now()
+        try:
+            if kind == ACTIVATE:
+                done = activate_scheduled_if_due(auction_id)
+                if done:
+                    self.counts['activated'] += 1
+                    # the close deadline may already be inside the horizon
+                    self.arm(CLOSE, auction_id, Auction.objects.values_list('end_at', flat=True).get(pk=auction_id))
+            else:
+                done = close_if_due(auction_id, now) is not None
+                if done:
+                    self.counts['closed'] += 1
+                elif self._rearm_close(auction_id):
+                    return
+        except Auction.DoesNotExist:
+            done = False
+        except Exception:
+            logger.exception("Auction %s %s failed; retrying in %ss", auction_id, kind, self.retry_delay)
+            self.counts['failed'] += 1
+            self.arm(kind, auction_id, now + timezone.timedelta(seconds=self.retry_delay))
+            return
+
+        if done:
+            self.lags.append((now - deadline).total_seconds())
+        else:
+            self.counts['skipped'] += 1
+
+    def _rearm_close(self, auction_id):
+        """Re-arm a close whose end_at was extended; False once the auction is no longer active."""
+        end_at = (Auction.objects.filter(pk=auction_id, status=AuctionStatus.ACTIVE)
+                  .values_list('end_at', flat=True).first())
+        if end_at is None:
+            return False
+        self.counts['rearmed'] += 1
+        self.arm(CLOSE, auction_id, end_at)
+        return True
+
+    def next_wakeup(self):
+        """When the next tick is needed: the earliest deadline or the next reload."""
+        candidates = [self.next_reload_at] if self.next_reload_at else []
+        if self.heap:
+            candidates.append(self.heap[0][0])
+        return min(candidates, default=None)
+
+    def metrics(self):
+        lags = sorted(self.lags)
+
+        def pct(p):
+            return round(lags[min(len(lags) - 1, int(p / 100 * len(lags)))] * 1000, 1) if lags else 0.0
+
+        return {
+            **self.counts,
+            'armed': len(self.armed),
+            'lag_p50_ms': pct(50),
+            'lag_p95_ms': pct(95),
+            'lag_max_ms': round(lags[-1] * 1000, 1) if lags else 0.0,
+        }
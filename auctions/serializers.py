@@ -57,6 +57,7 @@ class AuctionDetailSerializer(serializers.ModelSerializer):
     product = serializers.SerializerMethodField()
     highest_bid = serializers.SerializerMethodField()
     current_price = serializers.SerializerMethodField()
+    min_next_bid = serializers.DecimalField(source='minimum_bid', max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Auction
@@ -67,7 +68,7 @@ class AuctionDetailSerializer(serializers.ModelSerializer):
             'min_increment', 'start_at', 'end_at',
             'auto_extend_window_seconds', 'auto_extend_seconds',
             'approved_at',
-            'highest_bid', 'current_price'
+            'highest_bid', 'current_price', 'min_next_bid', 'bid_count',
         ]
 
     def get_product(self, obj):
@@ -80,12 +81,10 @@ class AuctionDetailSerializer(serializers.ModelSerializer):
         }
 
     def get_highest_bid(self, obj):
-        top = obj.bids.order_by('-amount', '-created_at').first()
-        return str(top.amount) if top else None
+        return str(obj.current_amount) if obj.current_amount is not None else None
 
     def get_current_price(self, obj):
-        top = obj.bids.order_by('-amount', '-created_at').first()
-        return str(top.amount if top else obj.start_price)
+        return str(obj.start_price if obj.current_amount is None else obj.current_amount)
 
 
 class PlaceBidSerializer(serializers.Serializer):
@@ -123,5 +122,4 @@ class AuctionListSerializer(serializers.ModelSerializer):
         ]
 
     def get_top_bid(self, obj):
-        top = obj.bids.order_by('-amount', '-created_at').first()
-        return str(top.amount) if top else None
\ No newline at end of file
+        return str(obj.current_amount) if obj.current_amount is not None else None
\ No newline at end of file
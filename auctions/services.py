@@ -1,24 +1,24 @@
 # auctions/services.py
 from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, Sum
 from django.utils import timezone
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 
+from . import feed
 from .models import Auction, Bid, AuctionStatus
+from wallet.ledger import LedgerWriter
 from wallet.models import Wallet, Transaction
 from notifications.models import Notification
+from notifications.outbox import notify, notify_many
 from orders.models import Order, OrderItem, OrderStatus
 from rest_framework.exceptions import ValidationError
 
 User = get_user_model()
 
 
-def _current_top(auction: Auction):
-    top = auction.bids.order_by('-amount', '-created_at').first()
-    return (top.bidder if top else None), (top.amount if top else None)
-
-
 @transaction.atomic
 def activate_scheduled_if_due(auction_id: int) -> bool:
     auction = Auction.objects.select_for_update().get(pk=auction_id)
@@ -26,142 +26,205 @@ def activate_scheduled_if_due(auction_id: int) -> bool:
     if auction.status == AuctionStatus.APPROVED and auction.start_at <= now < auction.end_at:
         auction.status = AuctionStatus.ACTIVE
         auction.save(update_fields=['status'])
+        feed.publish_status(auction)
         return True
     return False
 
 
+def activate_due_auctions(now=None) -> int:
+    """Sweep: activate every approved auction whose start_at has passed."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(Auction.objects.select_for_update().filter(
+            status=AuctionStatus.APPROVED, start_at__lte=now, end_at__gt=now,
+        ).values_list('pk', flat=True))
+        Auction.objects.filter(pk__in=due).update(status=AuctionStatus.ACTIVE)
+        for auction_id in due:
+            feed.publish(auction_id, 'status', status=AuctionStatus.ACTIVE)
+    return len(due)
+
+
 @transaction.atomic
-def place_bid(auction_id: int, bidder: User, amount: Decimal):
+def close_if_due(auction_id: int, now=None):
+    """
+    Close an active auction whose end_at has passed, settling it like an
+    admin close. Returns the close result, or None when the auction is not
+    due (already closed, or end_at was pushed back by anti-sniping).
+    """
+    now = now or timezone.now()
     auction = Auction.objects.select_for_update().get(pk=auction_id)
+    if auction.status != AuctionStatus.ACTIVE or auction.end_at > now:
+        return None
+    return admin_close_auction(auction_id, None)
+
+
+def close_due_auctions(now=None) -> int:
+    """Sweep: close every active auction past its end_at; returns how many closed."""
+    now = now or timezone.now()
+    due = Auction.objects.filter(status=AuctionStatus.ACTIVE, end_at__lte=now).values_list('pk', flat=True)
+    return sum(1 for auction_id in list(due) if close_if_due(auction_id, now) is not None)
+
+
+# How often a bidder re-reads the order book after losing the
+# compare-and-swap to a concurrent bid before giving up
+BID_CAS_ATTEMPTS = 5
+
+
+class BidContentionError(ValidationError):
+    """The bid lost every compare-and-swap attempt; the client may retry it."""
+
+
+def place_bid(auction_id: int, bidder: User, amount: Decimal):
+    """
+    Bid engine. The auction row carries its order book (current leader,
+    amount and minimum next bid), so a bid is validated against a plain
+    read and committed with a compare-and-swap UPDATE conditioned on the
+    bid_count it saw. The auction row is only locked from that UPDATE to
+    commit, which covers the wallet hold/refund and the Bid insert;
+    notifications are queued after the engine's transaction.
+
+    A bidder that loses the race to a concurrent bid re-reads the book and
+    retries as long as its amount still clears the new minimum.
+    """
+    for _ in range(BID_CAS_ATTEMPTS):
+        now = timezone.now()
+        auction = Auction.objects.get(pk=auction_id)
+        top_up = _validate_bid(auction, bidder, amount, now)
+        with transaction.atomic():
+            bid = _swap_leader(auction, bidder, amount, top_up, now)
+        if bid is not None:
+            break
+    else:
+        raise BidContentionError("Auction is receiving too many bids, please try again.")
+
+    # `auction` still holds the book as it was before this bid
+    if auction.current_bidder_id and auction.current_bidder_id != bidder.id:
+        notify(
+            user=auction.current_bidder,
+            notification_type='auction_outbid',
+            message_ar=f"تمت المزايدة عليك في المزاد #{auction.id} بمبلغ أعلى.",
+            message_en=f"You've been outbid on auction #{auction.id}.",
+            content_object=auction
+        )
+    notify(
+        user=auction.seller,
+        notification_type='auction_new_bid',
+        message_ar=f"مزايدة جديدة على مزادك #{auction.id}: {amount}.",
+        message_en=f"New bid on your auction #{auction.id}: {amount}.",
+        content_object=auction
+    )
+    return bid
 
+
+def _validate_bid(auction: Auction, bidder: User, amount: Decimal, now) -> Decimal:
+    """Check a bid against an unlocked read of the order book; returns the amount to move into held."""
     # live window check
-    now = timezone.now()
     if auction.status != AuctionStatus.ACTIVE or not (auction.start_at <= now < auction.end_at):
         raise ValidationError("Auction is not active.")
 
-    if bidder_id := getattr(bidder, "id", None):
-        if bidder_id == auction.seller_id:
-            raise ValidationError("Seller cannot bid on their own auction.")
+    if bidder.id == auction.seller_id:
+        raise ValidationError("Seller cannot bid on their own auction.")
 
     # enforce min increment
-    curr_leader, curr_amount = _current_top(auction)
-    min_allowed = auction.start_price if curr_amount is None else (curr_amount + auction.min_increment)
-    if amount < min_allowed:
-        raise ValidationError(f"Bid must be at least {min_allowed}.")
-
-    # bidder wallet
-    bidder_wallet = Wallet.objects.select_for_update().get(user=bidder)
+    if amount < auction.minimum_bid:
+        raise ValidationError(f"Bid must be at least {auction.minimum_bid}.")
 
     # how much to newly move into held?
-    if curr_leader and curr_leader.id == bidder.id:
-        top_up = amount - curr_amount
+    if auction.current_bidder_id == bidder.id:
+        top_up = amount - auction.current_amount
         if top_up <= 0:
             raise ValidationError("New bid must exceed your current highest bid.")
     else:
         top_up = amount
 
-    if bidder_wallet.balance < top_up:
+    # early reject without locking; re-checked after the hold is applied
+    if not Wallet.objects.filter(user=bidder, balance__gte=top_up).exists():
         raise ValidationError("Insufficient wallet balance to place this bid.")
+    return top_up
 
-    # move top-up from balance -> held
-    bidder_wallet.balance -= top_up
-    bidder_wallet.held_balance += top_up
-    bidder_wallet.save()
-    Transaction.objects.create(
-        wallet=bidder_wallet,
-        amount=-top_up,
+
+def _swap_leader(auction: Auction, bidder: User, amount: Decimal, top_up: Decimal, now):
+    """
+    Move the order book from the state `auction` was read in to `bidder`
+    leading at `amount`. Returns None when a concurrent bid got there first.
+    Must run inside transaction.atomic().
+    """
+    # anti-sniping auto-extend
+    end_at = auction.end_at
+    if (end_at - now).total_seconds() <= auction.auto_extend_window_seconds:
+        end_at += timezone.timedelta(seconds=auction.auto_extend_seconds)
+
+    swapped = Auction.objects.filter(
+        pk=auction.pk,
+        bid_count=auction.bid_count,
+        status=AuctionStatus.ACTIVE,
+        end_at=auction.end_at,
+    ).update(
+        current_bidder=bidder,
+        current_amount=amount,
+        min_next_bid=amount + auction.min_increment,
+        bid_count=F('bid_count') + 1,
+        end_at=end_at,
+    )
+    if not swapped:
+        return None
+
+    # move top-up from balance -> held, release previous leader (if different)
+    ledger = LedgerWriter()
+    ledger.post(
+        bidder.id, amount=-top_up,
         transaction_type=Transaction.TransactionType.ESCROW_HOLD,
         description=f"Bid hold for Auction #{auction.id}",
         reference=f"BID_HOLD_{auction.id}",
-        is_successful=True
+        balance_delta=-top_up, held_delta=top_up,
     )
-
-    # release previous leader (if different)
-    if curr_leader and curr_leader.id != bidder.id:
-        prev_wallet = Wallet.objects.select_for_update().get(user=curr_leader)
-        prev_wallet.held_balance -= curr_amount
-        prev_wallet.balance += curr_amount
-        prev_wallet.save()
-        Transaction.objects.create(
-            wallet=prev_wallet,
-            amount=curr_amount,
+    prev_leader_id, prev_amount = auction.current_bidder_id, auction.current_amount
+    if prev_leader_id and prev_leader_id != bidder.id:
+        ledger.post(
+            prev_leader_id, amount=prev_amount,
             transaction_type=Transaction.TransactionType.REFUND,
             description=f"Outbid refund (Auction #{auction.id})",
             reference=f"OUTBID_REFUND_{auction.id}",
-            is_successful=True
-        )
-        # notify previous leader
-        Notification.objects.create(
-            user=curr_leader,
-            notification_type='auction_outbid',
-            message_ar=f"تمت المزايدة عليك في المزاد #{auction.id} بمبلغ أعلى.",
-            message_en=f"You've been outbid on auction #{auction.id}.",
-            content_object=auction
+            balance_delta=prev_amount, held_delta=-prev_amount,
         )
+    ledger.flush()
+    if Wallet.objects.filter(user=bidder, balance__lt=0).exists():
+        # rolls back the swap along with the hold
+        raise ValidationError("Insufficient wallet balance to place this bid.")
 
-    # record bid
     bid = Bid.objects.create(auction=auction, bidder=bidder, amount=amount)
-
-    # anti-sniping auto-extend
-    time_left = (auction.end_at - now).total_seconds()
-    if time_left <= auction.auto_extend_window_seconds:
-        auction.end_at = auction.end_at + timezone.timedelta(seconds=auction.auto_extend_seconds)
-        auction.save(update_fields=['end_at'])
-
-    # notify seller
-    Notification.objects.create(
-        user=auction.seller,
-        notification_type='auction_new_bid',
-        message_ar=f"مزايدة جديدة على مزادك #{auction.id}: {amount}.",
-        message_en=f"New bid on your auction #{auction.id}: {amount}.",
-        content_object=auction
-    )
-
+    feed.publish_bid(auction, amount, end_at)
     return bid
 
 
-def _final_highest_bids_by_bidder(auction: Auction):
+def _outstanding_holds(auction: Auction):
     """
-    Dict {bidder_id: max_amount}. Traverse once, keep first (highest) per bidder.
+    {bidder_id: amount still held for this auction}, from one aggregate
+    over the bidders' bid holds and outbid refunds. Outbid bidders net to
+    zero, so normally only the current leader holds anything.
     """
-    highest = {}
-    for b in Bid.objects.filter(auction=auction).order_by('-amount', '-created_at'):
-        if b.bidder_id not in highest:
-            highest[b.bidder_id] = b.amount
-    return highest
-
-
-def _release_hold(user: User, amount: Decimal, auction: Auction, note: str):
-    if amount <= 0:
-        return
-    w = Wallet.objects.select_for_update().get(user=user)
-    w.held_balance -= amount
-    w.balance += amount
-    w.save()
-    Transaction.objects.create(
-        wallet=w,
-        amount=amount,
-        transaction_type=Transaction.TransactionType.REFUND,
-        description=f"{note} (Auction #{auction.id})",
-        reference=f"AUCTION_RELEASE_{auction.id}",
-        is_successful=True,
-    )
-
-
-def _convert_winner_hold_to_escrow(user: User, auction: Auction):
-    """
-    Funds are already in 'held_balance' from bidding. No balance change.
-    We just create a zero-amount bookkeeping entry to mark escrow continuity.
-    """
-    w = Wallet.objects.select_for_update().get(user=user)
-    Transaction.objects.create(
-        wallet=w,
-        amount=Decimal('0.00'),
-        transaction_type=Transaction.TransactionType.ESCROW_HOLD,
-        description=f"Converted bid hold to escrow hold for Auction #{auction.id}",
-        reference=f"ESCROW_HOLD_AUCTION_{auction.id}",
-        is_successful=True,
-    )
+    rows = (Transaction.objects
+            .filter(wallet__user_id__in=Bid.objects.filter(auction=auction).values('bidder_id'),
+                    reference__in=[f"BID_HOLD_{auction.id}", f"OUTBID_REFUND_{auction.id}"])
+            .values('wallet__user_id')
+            .annotate(net=Sum('amount'))
+            .order_by())
+    # holds are posted as negative amounts, refunds as positive ones
+    return {row['wallet__user_id']: -row['net'] for row in rows}
+
+
+def _release_holds(ledger: LedgerWriter, auction: Auction, holds, note: str, keep=None):
+    """Post the release of every outstanding hold except `keep`'s."""
+    for bidder_id, amount in sorted(holds.items()):
+        if bidder_id == keep or amount <= 0:
+            continue
+        ledger.post(
+            bidder_id, amount=amount,
+            transaction_type=Transaction.TransactionType.REFUND,
+            description=f"{note} (Auction #{auction.id})",
+            reference=f"AUCTION_RELEASE_{auction.id}",
+            balance_delta=amount, held_delta=-amount,
+        )
 
 
 @transaction.atomic
@@ -169,36 +232,42 @@ def admin_close_auction(auction_id: int, admin_user: User):
     """
     Manually close an auction:
     - Decide winner (if reserve met)
-    - Release all losers’ holds
-    - Keep winner’s hold and create Order
+    - Release all outstanding holds except the winner's
+    - Keep winner's hold and create Order
     - Restock if no sale
+
+    Set-based: holds come from one aggregate query, the wallets are
+    locked and updated by a single LedgerWriter flush, and the losers'
+    notifications are queued in bulk.
     """
     auction = Auction.objects.select_for_update().get(pk=auction_id)
+    # a second close would create another order against the winner's hold,
+    # or put the reserved stock back twice
+    if auction.status in (AuctionStatus.ENDED, AuctionStatus.CANCELLED):
+        raise ValidationError("Auction is already closed.")
 
     # allow closing in ACTIVE/APPROVED/SUBMITTED (manual, since no scheduler)
-    bids_qs = Bid.objects.filter(auction=auction).order_by('-amount', '-created_at')
-    winner_bid = bids_qs.first()
     reserve = auction.reserve_price
-
-    final_by_bidder = _final_highest_bids_by_bidder(auction)
+    holds = _outstanding_holds(auction)
+    ledger = LedgerWriter()
 
     # No sale case
-    if not winner_bid or (reserve and winner_bid.amount < reserve):
-        for bidder_id, held_amt in final_by_bidder.items():
-            bidder = User.objects.get(pk=bidder_id)
-            _release_hold(bidder, held_amt, auction, note="Auction ended without sale")
+    if not auction.current_bidder_id or (reserve and auction.current_amount < reserve):
+        _release_holds(ledger, auction, holds, note="Auction ended without sale")
+        ledger.flush()
 
         auction.status = AuctionStatus.ENDED
         auction.cancelled_at = timezone.now()
         auction.cancelled_by = admin_user
         auction.save()
+        feed.publish_status(auction, sold=False)
 
         # restore reserved stock
         product = auction.product
         product.quantity += auction.quantity
         product.save()
 
-        Notification.objects.create(
+        notify(
             user=auction.seller,
             notification_type='auction_ended_no_sale',
             message_ar=f"انتهى المزاد #{auction.id} بدون بيع.",
@@ -208,25 +277,33 @@ def admin_close_auction(auction_id: int, admin_user: User):
         return {"status": "ended_no_sale"}
 
     # There is a winner
-    winner = winner_bid.bidder
-    winning_amount = winner_bid.amount
+    winner = auction.current_bidder
+    winning_amount = auction.current_amount
 
     # release losers
-    for bidder_id, held_amt in final_by_bidder.items():
-        if bidder_id == winner.id:
-            continue
-        bidder = User.objects.get(pk=bidder_id)
-        _release_hold(bidder, held_amt, auction, note="Outbid refund / auction ended")
-        Notification.objects.create(
-            user=bidder,
+    _release_holds(ledger, auction, holds, note="Outbid refund / auction ended", keep=winner.id)
+    # keep winner hold (no balance change), mark escrow continuity
+    ledger.post(
+        winner.id, amount=Decimal('0.00'),
+        transaction_type=Transaction.TransactionType.ESCROW_HOLD,
+        description=f"Converted bid hold to escrow hold for Auction #{auction.id}",
+        reference=f"ESCROW_HOLD_AUCTION_{auction.id}",
+    )
+    ledger.flush()
+
+    auction_type = ContentType.objects.get_for_model(Auction)
+    notify_many(
+        Notification(
+            user_id=bidder_id,
             notification_type='auction_lost',
             message_ar=f"انتهى المزاد #{auction.id} ولم تربح.",
             message_en=f"Auction #{auction.id} has ended and you did not win.",
-            content_object=auction
+            content_type=auction_type,
+            object_id=auction.pk,
         )
-
-    # keep winner hold (no balance change), mark escrow continuity
-    _convert_winner_hold_to_escrow(winner, auction)
+        for bidder_id in sorted(holds)
+        if bidder_id != winner.id
+    )
 
     # create order for winner
     order = Order.objects.create(
@@ -249,16 +326,17 @@ def admin_close_auction(auction_id: int, admin_user: User):
     auction.cancelled_at = timezone.now()
     auction.cancelled_by = admin_user
     auction.save()
+    feed.publish_status(auction, sold=True, final_amount=str(winning_amount))
 
     # notifications
-    Notification.objects.create(
+    notify(
         user=winner,
         notification_type='auction_won',
         message_ar=f"ربحت المزاد #{auction.id} بمبلغ {winning_amount}. تم إنشاء طلب جديد.",
         message_en=f"You won auction #{auction.id} for {winning_amount}. A new order was created.",
         content_object=order,
     )
-    Notification.objects.create(
+    notify(
         user=auction.seller,
         notification_type='auction_sold',
         message_ar=f"تم بيع المزاد #{auction.id} بمبلغ {winning_amount}. تم إنشاء طلب للعميل.",
@@ -276,26 +354,27 @@ def cancel_auction(auction_id: int, actor: User, is_admin=False):
 
     if not is_admin:
         # seller rules
-        if not (auction.status in [AuctionStatus.SUBMITTED, AuctionStatus.APPROVED] and auction.bids.count() == 0):
+        if not (auction.status in [AuctionStatus.SUBMITTED, AuctionStatus.APPROVED] and auction.bid_count == 0):
             raise ValidationError("Seller cannot cancel this auction at current state.")
 
     # release current top if any
-    top_bid = auction.bids.order_by('-amount', '-created_at').first()
-    if top_bid:
-        w = Wallet.objects.select_for_update().get(user=top_bid.bidder)
-        w.held_balance -= top_bid.amount
-        w.balance += top_bid.amount
+    if auction.current_bidder_id:
+        w = Wallet.objects.select_for_update().get(user_id=auction.current_bidder_id)
+        w.held_balance -= auction.current_amount
+        w.balance += auction.current_amount
         w.save()
         Transaction.objects.create(
             wallet=w,
-            amount=top_bid.amount,
+            amount=auction.current_amount,
             transaction_type=Transaction.TransactionType.REFUND,
             description=f"Auction cancelled #{auction.id}",
             reference=f"AUCT_CANCEL_{auction.id}",
-            is_successful=True
+            is_successful=True,
+            balance_delta=auction.current_amount,
+            held_delta=-auction.current_amount,
         )
-        Notification.objects.create(
-            user=top_bid.bidder,
+        notify(
+            user=auction.current_bidder,
             notification_type='auction_cancelled',
             message_ar=f"تم إلغاء المزاد {auction.title}. تم تحرير الأموال المحتجزة.",
             message_en=f"Auction {auction.title} was cancelled. Your held funds were released.",
@@ -311,8 +390,9 @@ def cancel_auction(auction_id: int, actor: User, is_admin=False):
     auction.cancelled_at = timezone.now()
     auction.cancelled_by = actor
     auction.save(update_fields=['status', 'cancelled_at', 'cancelled_by'])
+    feed.publish_status(auction)
 
-    Notification.objects.create(
+    notify(
         user=auction.seller,
         notification_type='auction_cancelled',
         message_ar=f"تم إلغاء المزاد {auction.title}.",
@@ -342,7 +422,7 @@ def buy_now(auction_id: int, buyer: User):
         raise ValidationError("Seller cannot buy their own auction.")
     
     # Check if there are no existing bids (optional: you might want to allow buy now even with bids)
-    if auction.bids.exists():
+    if auction.bid_count:
         raise ValidationError("Buy now is not available after bidding has started.")
     
     # Check buyer's wallet balance
@@ -357,16 +437,18 @@ def buy_now(auction_id: int, buyer: User):
     Transaction.objects.create(
         wallet=buyer_wallet,
         amount=-auction.buy_now_price,
-        transaction_type=Transaction.TransactionType.PURCHASE,
+        transaction_type=Transaction.TransactionType.PAYMENT,
         description=f"Buy now purchase for Auction #{auction.id}",
         reference=f"BUY_NOW_{auction.id}",
-        is_successful=True
+        is_successful=True,
+        balance_delta=-auction.buy_now_price,
     )
     
     # End the auction
     auction.status = AuctionStatus.ENDED
     auction.cancelled_at = now
     auction.save()
+    feed.publish_status(auction, sold=True, final_amount=str(auction.buy_now_price), buy_now=True)
     
     # Create order
     order = Order.objects.create(
@@ -386,7 +468,7 @@ def buy_now(auction_id: int, buyer: User):
     )
     
     # Notifications
-    Notification.objects.create(
+    notify(
         user=buyer,
         notification_type='auction_bought',
         message_ar=f"اشتريت المزاد #{auction.id} بسعر الشراء الفوري {auction.buy_now_price}.",
@@ -394,7 +476,7 @@ def buy_now(auction_id: int, buyer: User):
         content_object=order,
     )
     
-    Notification.objects.create(
+    notify(
         user=auction.seller,
         notification_type='auction_sold_buy_now',
         message_ar=f"تم بيع المزاد #{auction.id} عبر الشراء الفوري بمبلغ {auction.buy_now_price}.",
@@ -403,10 +485,9 @@ def buy_now(auction_id: int, buyer: User):
     )
     
     # Release any existing bids (though there shouldn't be any if you prevent buy now after bidding)
-    final_by_bidder = _final_highest_bids_by_bidder(auction)
-    for bidder_id, held_amt in final_by_bidder.items():
-        if bidder_id != buyer.id:  # Don't release buyer's funds since they're used for purchase
-            bidder = User.objects.get(pk=bidder_id)
-            _release_hold(bidder, held_amt, auction, note="Auction ended via buy now")
-    
+    ledger = LedgerWriter()
+    # Don't release buyer's funds since they're used for purchase
+    _release_holds(ledger, auction, _outstanding_holds(auction), note="Auction ended via buy now", keep=buyer.id)
+    ledger.flush()
+
     return {"status": "sold_via_buy_now", "order_id": order.id}
\ No newline at end of file
@@ -1,3 +1,391 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from accounts.models import Role
+from accounts.testing import make_user
+from notifications.models import Notification
+from orders.models import Order
+from products.models import Category, Product
+from wallet.models import IdempotencyRecord, Transaction, Wallet
+
+from .feed import group_name, snapshot
+from .models import Auction, AuctionStatus, Bid
+from .routing import websocket_urlpatterns
+from .scheduler import CLOSE, AuctionScheduler
+from .services import _swap_leader, _validate_bid, admin_close_auction, place_bid
+
+
+def _fund(user, amount):
+    Wallet.objects.filter(user=user).update(balance=Decimal(amount))
+
+
+def _wallet(user):
+    wallet = Wallet.objects.get(user=user)
+    return wallet.balance, wallet.held_balance
+
+
+class AuctionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_user('seller', role=Role.SELLER)
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        category = Category.objects.create(name_ar='فئة', name_en='Category')
+        cls.product = Product.objects.create(seller=cls.seller, category=category, name_en='Lamp',
+                                             price=Decimal('100.00'), quantity=5, is_approved=True)
+
+    def setUp(self):
+        _fund(self.alice, '1000.00')
+        _fund(self.bob, '1000.00')
+
+    def _auction(self, start_in, end_in, status=AuctionStatus.ACTIVE):
+        now = timezone.now()
+        return Auction.objects.create(
+            seller=self.seller, product=self.product, title='Lamp',
+            start_price=Decimal('100.00'), min_increment=Decimal('5.00'),
+            start_at=now + timezone.timedelta(seconds=start_in),
+            end_at=now + timezone.timedelta(seconds=end_in),
+            status=status,
+        )
+
+
+class BidEngineTests(AuctionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auction = self._auction(-3600, 3 * 3600)
+
+    def _bid(self, bidder, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return place_bid(self.auction.pk, bidder, Decimal(amount))
+
+    def test_bid_updates_order_book_and_holds_funds(self):
+        self._bid(self.alice, '100.00')
+
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_bidder, self.alice)
+        self.assertEqual(self.auction.current_amount, Decimal('100.00'))
+        self.assertEqual(self.auction.min_next_bid, Decimal('105.00'))
+        self.assertEqual(self.auction.bid_count, 1)
+        self.assertEqual(_wallet(self.alice), (Decimal('900.00'), Decimal('100.00')))
+
+    def test_outbid_refunds_previous_leader_and_notifies(self):
+        self._bid(self.alice, '100.00')
+        self._bid(self.bob, '120.00')
+
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_bidder, self.bob)
+        self.assertEqual(self.auction.minimum_bid, Decimal('125.00'))
+        self.assertEqual(_wallet(self.alice), (Decimal('1000.00'), Decimal('0.00')))
+        self.assertEqual(_wallet(self.bob), (Decimal('880.00'), Decimal('120.00')))
+        self.assertTrue(Transaction.objects.filter(wallet__user=self.alice,
+                                                   reference=f'OUTBID_REFUND_{self.auction.pk}').exists())
+        self.assertEqual(Notification.objects.filter(user=self.alice, notification_type='auction_outbid').count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.seller, notification_type='auction_new_bid').count(), 2)
+
+    def test_leader_raising_own_bid_only_holds_the_difference(self):
+        self._bid(self.alice, '100.00')
+        self._bid(self.alice, '150.00')
+
+        self.assertEqual(_wallet(self.alice), (Decimal('850.00'), Decimal('150.00')))
+        self.assertFalse(Notification.objects.filter(notification_type='auction_outbid').exists())
+
+    def test_bid_below_minimum_is_rejected(self):
+        self._bid(self.alice, '100.00')
+        with self.assertRaisesMessage(ValidationError, 'Bid must be at least 105.00'):
+            self._bid(self.bob, '104.00')
+
+    def test_stale_read_loses_the_swap(self):
+        now = timezone.now()
+        stale = Auction.objects.get(pk=self.auction.pk)
+        top_up = _validate_bid(stale, self.bob, Decimal('100.00'), now)
+        self._bid(self.alice, '100.00')
+
+        self.assertIsNone(_swap_leader(stale, self.bob, Decimal('100.00'), top_up, now))
+        self.assertEqual(_wallet(self.bob), (Decimal('1000.00'), Decimal('0.00')))
+        self.assertEqual(Bid.objects.filter(auction=self.auction).count(), 1)
+
+    def test_insufficient_balance_rolls_back_the_swap(self):
+        now = timezone.now()
+        auction = Auction.objects.get(pk=self.auction.pk)
+        top_up = _validate_bid(auction, self.bob, Decimal('900.00'), now)
+        _fund(self.bob, '50.00')
+
+        with self.assertRaisesMessage(ValidationError, 'Insufficient wallet balance'):
+            self._bid(self.bob, '900.00')
+        with self.assertRaises(ValidationError):
+            with transaction.atomic():
+                _swap_leader(auction, self.bob, Decimal('900.00'), top_up, now)
+
+        self.auction.refresh_from_db()
+        self.assertIsNone(self.auction.current_bidder)
+        self.assertEqual(self.auction.bid_count, 0)
+        self.assertEqual(_wallet(self.bob), (Decimal('50.00'), Decimal('0.00')))
+
+    def test_bid_in_closing_window_extends_the_auction(self):
+        end_at = timezone.now() + timezone.timedelta(seconds=30)
+        Auction.objects.filter(pk=self.auction.pk).update(end_at=end_at)
+
+        self._bid(self.alice, '100.00')
+
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.end_at, end_at + timezone.timedelta(seconds=120))
+
+
+    def test_contended_bid_is_not_stored_under_its_idempotency_key(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+
+        def bid():
+            return client.post(f'/api/auctions/{self.auction.pk}/bid/', {'amount': '100.00'}, format='json',
+                               secure=True, HTTP_IDEMPOTENCY_KEY='bid-1')
+
+        with mock.patch('auctions.services.BID_CAS_ATTEMPTS', 0):
+            busy = bid()
+        self.assertEqual((busy.status_code, busy['Retry-After']), (400, '1'))
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+        # the retry under the same key places the bid
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(bid().status_code, 201)
+        self.assertEqual(_wallet(self.alice), (Decimal('900.00'), Decimal('100.00')))
+
+class AuctionSchedulerTests(AuctionTestCase):
+    def _tick(self, scheduler):
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduler.tick()
+
+    def test_activates_due_auction_and_arms_its_close(self):
+        auction = self._auction(-5, 3 * 3600, status=AuctionStatus.APPROVED)
+        later = self._auction(3600, 4 * 3600, status=AuctionStatus.APPROVED)
+        scheduler = AuctionScheduler()
+
+        self._tick(scheduler)
+
+        auction.refresh_from_db()
+        self.assertEqual(auction.status, AuctionStatus.ACTIVE)
+        self.assertEqual(Auction.objects.get(pk=later.pk).status, AuctionStatus.APPROVED)
+        self.assertEqual(scheduler.armed, {(CLOSE, auction.pk): auction.end_at})
+        self.assertEqual(scheduler.metrics()['activated'], 1)
+
+    def test_closes_and_settles_auction_at_end(self):
+        auction = self._auction(-3600, 3600)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(auction.pk, self.alice, Decimal('150.00'))
+        Auction.objects.filter(pk=auction.pk).update(end_at=timezone.now() - timezone.timedelta(seconds=1))
+        scheduler = AuctionScheduler()
+
+        self._tick(scheduler)
+
+        auction.refresh_from_db()
+        self.assertEqual(auction.status, AuctionStatus.ENDED)
+        self.assertEqual(Order.objects.get(buyer=self.alice).total_amount, Decimal('150.00'))
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics['closed'], 1)
+        self.assertGreater(metrics['lag_max_ms'], 0)
+
+    def test_rearms_when_end_at_was_extended(self):
+        auction = self._auction(-3600, 3600)
+        scheduler = AuctionScheduler()
+        scheduler.load()
+        overdue = timezone.now() - timezone.timedelta(seconds=1)
+        scheduler.arm(CLOSE, auction.pk, overdue)
+
+        self._tick(scheduler)
+
+        self.assertEqual(Auction.objects.get(pk=auction.pk).status, AuctionStatus.ACTIVE)
+        self.assertEqual(scheduler.armed[(CLOSE, auction.pk)], auction.end_at)
+        self.assertEqual(scheduler.metrics()['rearmed'], 1)
+
+    def test_deadlines_beyond_horizon_are_not_loaded(self):
+        self._auction(3 * 3600, 6 * 3600, status=AuctionStatus.APPROVED)
+        scheduler = AuctionScheduler()
+        scheduler.load()
+        self.assertEqual(scheduler.armed, {})
+
+
+class AdminCloseAuctionTests(AuctionTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = make_user('admin', role=Role.ADMIN)
+        cls.bidders = [cls.alice, cls.bob] + [make_user(f'bidder{i}') for i in range(4)]
+
+    def setUp(self):
+        for bidder in self.bidders:
+            _fund(bidder, '1000.00')
+        self.auction = self._auction(-3600, 3600)
+
+    def _bid_round(self, bidders, start):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, bidder in enumerate(bidders):
+                place_bid(self.auction.pk, bidder, Decimal(start) + 10 * i)
+
+    def _close(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return admin_close_auction(self.auction.pk, self.admin)
+
+    def _close_queries(self):
+        # statements run while the auction is locked; delivery happens after commit
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks():
+            admin_close_auction(self.auction.pk, self.admin)
+        return len(ctx.captured_queries)
+
+    def test_sale_releases_losers_once_and_keeps_winner_hold(self):
+        self._bid_round(self.bidders, '100.00')
+        self._bid_round([self.alice], '500.00')
+
+        result = self._close()
+
+        self.assertEqual(result['status'], 'ended_sold')
+        self.assertEqual(Order.objects.get(pk=result['order_id']).buyer, self.alice)
+        self.assertEqual(_wallet(self.alice), (Decimal('500.00'), Decimal('500.00')))
+        for bidder in self.bidders[1:]:
+            self.assertEqual(_wallet(bidder), (Decimal('1000.00'), Decimal('0.00')))
+        self.assertEqual(Notification.objects.filter(notification_type='auction_lost').count(), 5)
+        self.assertTrue(Transaction.objects.filter(wallet__user=self.alice,
+                                                   reference=f'ESCROW_HOLD_AUCTION_{self.auction.pk}').exists())
+
+    def test_reserve_not_met_releases_leader(self):
+        Auction.objects.filter(pk=self.auction.pk).update(reserve_price=Decimal('900.00'))
+        self._bid_round(self.bidders[:2], '100.00')
+
+        self.assertEqual(self._close()['status'], 'ended_no_sale')
+
+        for bidder in self.bidders[:2]:
+            self.assertEqual(_wallet(bidder), (Decimal('1000.00'), Decimal('0.00')))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+
+    def test_second_close_is_refused(self):
+        self._bid_round(self.bidders[:2], '100.00')
+        self._close()
+
+        with self.assertRaises(ValidationError):
+            self._close()
+        self.assertEqual(Order.objects.filter(buyer=self.bob).count(), 1)
+        self.assertEqual(_wallet(self.bob), (Decimal('890.00'), Decimal('110.00')))
+
+    def test_closing_a_no_sale_auction_twice_restocks_once(self):
+        self.assertEqual(self._close()['status'], 'ended_no_sale')
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(f'/api/auctions/admin/auctions/{self.auction.pk}/close/', secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+
+    def test_statement_count_does_not_grow_with_bidders(self):
+        ContentType.objects.get_for_model(Auction)
+        self._bid_round(self.bidders, '100.00')
+        with_six = self._close_queries()
+
+        self.auction = self._auction(-3600, 3600)
+        self._bid_round(self.bidders[:2], '100.00')
+        self.assertEqual(self._close_queries(), with_six)
+
+
+class AuctionFeedTests(AuctionTestCase):
+    def _subscribe(self, auction):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(group_name(auction.pk), channel)
+        return lambda: async_to_sync(channel_layer.receive)(channel)['event']
+
+    def test_bid_delta_is_published_after_commit(self):
+        auction = self._auction(-3600, 60)
+        receive = self._subscribe(auction)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            place_bid(auction.pk, self.alice, Decimal('100.00'))
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+
+        event = receive()
+        self.assertEqual(event['type'], 'bid')
+        self.assertEqual((event['current_amount'], event['min_next_bid'], event['bid_count']),
+                         ('100.00', '105.00', 1))
+        self.assertTrue(event['extended'])
+
+    def test_close_publishes_final_status(self):
+        auction = self._auction(-3600, 3600)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(auction.pk, self.alice, Decimal('100.00'))
+        receive = self._subscribe(auction)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_close_auction(auction.pk, None)
+
+        self.assertEqual(receive(), {'type': 'status', 'auction_id': auction.pk, 'status': 'ended',
+                                     'sold': True, 'final_amount': '100.00'})
+
+
+class AuctionFeedConsumerTests(TransactionTestCase):
+    def setUp(self):
+        seller, self.bidder = make_user('seller', role=Role.SELLER), make_user('bidder')
+        _fund(self.bidder, '1000.00')
+        category = Category.objects.create(name_ar='فئة', name_en='Category')
+        product = Product.objects.create(seller=seller, category=category, name_en='Lamp',
+                                         price=Decimal('100.00'), quantity=5, is_approved=True)
+        now = timezone.now()
+        self.auction = Auction.objects.create(
+            seller=seller, product=product, title='Lamp', start_price=Decimal('100.00'),
+            start_at=now - timezone.timedelta(hours=1), end_at=now + timezone.timedelta(hours=3),
+            status=AuctionStatus.ACTIVE,
+        )
+
+    def test_streams_snapshot_then_bids(self):
+        auction, bidder = self.auction, self.bidder
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/auctions/{auction.pk}/')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            snapshot = await communicator.receive_json_from()
+            self.assertEqual((snapshot['type'], snapshot['min_next_bid'], snapshot['bid_count']),
+                             ('snapshot', '100.00', 0))
+
+            await database_sync_to_async(place_bid)(auction.pk, bidder, Decimal('120.00'))
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['type'], event['current_amount'], event['min_next_bid']),
+                             ('bid', '120.00', '121.00'))
+            await communicator.disconnect()
+
+            missing = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/auctions/999999/')
+            connected, _ = await missing.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+    def test_bid_committed_while_connecting_is_delivered(self):
+        def bid_then_snapshot(auction):
+            # the bid commits after the consumer read the auction row
+            place_bid(auction.pk, self.bidder, Decimal('120.00'))
+            return snapshot(auction)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/auctions/{self.auction.pk}/')
+            with mock.patch('auctions.consumers.snapshot', bid_then_snapshot):
+                connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual((await communicator.receive_json_from())['bid_count'], 0)
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['type'], event['bid_count']), ('bid', 1))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
@@ -25,6 +25,7 @@ from products.models import Category
 from .models import Auction, AuctionStatus
 from .serializers import AuctionListSerializer
 from .services import (
+    BidContentionError,
     place_bid,
     activate_scheduled_if_due,
     cancel_auction,
@@ -32,6 +33,7 @@ from .services import (
 )
 from accounts.permissionsUsers import IsSeller, IsSuperAdminOrAdmin,IsAdmin
 from notifications.models import Notification
+from wallet.idempotency import idempotent
 
 PUBLIC_STATUSES = [
     AuctionStatus.APPROVED,
@@ -76,14 +78,18 @@ class AuctionDetailView(APIView):
 
     def get(self, request, pk):
         auction = get_object_or_404(Auction, pk=pk)
-        # opportunistic activation
-        activate_scheduled_if_due(auction.id)
-        auction.refresh_from_db()
+        # opportunistic activation, only taking the row lock when it is due
+        # (the scheduler normally gets there first; live prices are pushed
+        # over ws/auctions/<id>/)
+        if auction.status == AuctionStatus.APPROVED and auction.start_at <= timezone.now():
+            activate_scheduled_if_due(auction.id)
+            auction.refresh_from_db()
         return Response(AuctionDetailSerializer(auction).data)
 
 class PlaceBidView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent('place_bid')
     def post(self, request, pk):
         ser = PlaceBidSerializer(data=request.data)
         if not ser.is_valid():
@@ -94,6 +100,10 @@ class PlaceBidView(APIView):
             bid = place_bid(pk, request.user, amount)
             return Response(BidSerializer(bid).data, status=201)
 
+        except BidContentionError as e:
+            # not a final answer: the same bid may go through on a retry
+            return Response({"error": str(e.detail[0])}, status=400, headers={'Retry-After': '1'})
+
         except (DRFValidationError, DjangoValidationError) as e:
             # normalize message(s)
             detail = getattr(e, "detail", None)
@@ -333,6 +343,9 @@ class AdminCloseAuctionView(APIView):
         try:
             result = admin_close_auction(pk, request.user)
             return Response(result, status=status.HTTP_200_OK)
+        except (DRFValidationError, DjangoValidationError) as e:
+            msg = getattr(e, "detail", str(e))
+            return Response({"error": msg}, status=status.HTTP_400_BAD_REQUEST)
         except Auction.DoesNotExist:
             return Response({"error": "Auction not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -351,6 +364,7 @@ class AdminActivateAuctionView(APIView):
 class BuyNowView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent('buy_now')
     def post(self, request, pk):
         try:
             result = buy_now(pk, request.user)
@@ -0,0 +1,200 @@
+# benchmarks/contention.py
+"""
+Concurrency drivers. Each worker runs in its own thread with its own
+database connection.
+
+run_bid_contention: bidders keep bidding the current minimum on one
+auction through auctions.services.place_bid, so every bid races the others
+for the auction's order book. Reports sustained accepted bids/sec, how
+many bids lost the race (outbid before they landed) and the latency of
+accepted bids.
+
+run_transfer_contention: a small set of users keep transferring money to
+each other through wallet.transfers.transfer, with some requests retried
+under the same idempotency key. Reports transfers/sec and whether the
+total held by the set was conserved.
+"""
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from auctions.models import Auction
+from auctions.services import place_bid
+from wallet.models import Transaction, Wallet
+from wallet.transfers import TransferError, transfer
+
+from .harness import percentile
+
+
+def run_bid_contention(auction, bidders, duration=5.0, max_bids=None):
+    """
+    Hammer `auction` with one thread per bidder for `duration` seconds, or
+    until `max_bids` bids were accepted. Bidders need wallets that cover
+    their bids.
+    """
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies = []
+    counts = {'accepted': 0, 'outbid': 0, 'lock_errors': 0}
+    errors = []
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+            if key == 'accepted' and max_bids and counts['accepted'] >= max_bids:
+                stop.set()
+
+    def bidder_loop(bidder):
+        rng = random.Random(bidder.pk)
+        backoff = 0.001
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    amount = Auction.objects.get(pk=auction.pk).minimum_bid
+                    place_bid(auction.pk, bidder, amount)
+                except ValidationError:
+                    count('outbid')
+                    continue
+                except OperationalError:
+                    # SQLite reports writer contention as a locked database
+                    count('lock_errors')
+                    time.sleep(rng.uniform(0, backoff))
+                    backoff = min(backoff * 2, 0.05)
+                    continue
+                backoff = 0.001
+                took = time.perf_counter() - started
+                with lock:
+                    latencies.append(took)
+                count('accepted')
+        except Exception as e:
+            errors.append(repr(e))
+            stop.set()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=bidder_loop, args=(bidder,)) for bidder in bidders]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = [s * 1000 for s in latencies]
+    return {
+        'bidders': len(bidders),
+        'seconds': round(elapsed, 3),
+        'accepted': counts['accepted'],
+        'outbid': counts['outbid'],
+        'lock_errors': counts['lock_errors'],
+        'errors': len(errors),
+        'sample_errors': errors[:5],
+        'bids_per_second': round(counts['accepted'] / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+    }
+
+
+def run_transfer_contention(users, duration=5.0, max_transfers=None, amount=Decimal('1.00'), retry_rate=0.3):
+    """
+    One thread per user, each sending `amount` to a random other user of
+    the set for `duration` seconds, or until `max_transfers` transfers were
+    posted. A `retry_rate` share of transfers is sent a second time with the
+    same idempotency key, as a client retrying after a timeout would.
+    """
+    wallets = Wallet.objects.filter(user__in=users)
+    total_before = wallets.aggregate(total=Sum('balance'))['total']
+    run = uuid.uuid4().hex[:8]
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies = []
+    counts = {'posted': 0, 'replayed': 0, 'rejected': 0, 'lock_errors': 0}
+    errors = []
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+            if key == 'posted' and max_transfers and counts['posted'] >= max_transfers:
+                stop.set()
+
+    def send(sender, recipient, key):
+        # retried until it lands: SQLite reports writer contention as a locked database
+        backoff = 0.001
+        while True:
+            try:
+                return transfer(sender, recipient, amount, idempotency_key=key)
+            except OperationalError:
+                count('lock_errors')
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, 0.05)
+
+    def sender_loop(sender):
+        rng = random.Random(sender.pk)
+        others = [user for user in users if user.pk != sender.pk]
+        n = 0
+        try:
+            while not stop.is_set():
+                n += 1
+                key = f'{run}-{sender.pk}-{n}'
+                recipient = rng.choice(others)
+                started = time.perf_counter()
+                try:
+                    send(sender, recipient, key)
+                except TransferError:
+                    count('rejected')
+                    continue
+                took = time.perf_counter() - started
+                with lock:
+                    latencies.append(took)
+                count('posted')
+                if rng.random() < retry_rate:
+                    if send(sender, recipient, key).replayed:
+                        count('replayed')
+        except Exception as e:
+            errors.append(repr(e))
+            stop.set()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=sender_loop, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total_after = wallets.aggregate(total=Sum('balance'))['total']
+    ledger_rows = Transaction.objects.filter(reference__startswith='TRF-', reference__contains=f'-{run}-').count()
+    latencies_ms = [s * 1000 for s in latencies]
+    return {
+        'users': len(users),
+        'seconds': round(elapsed, 3),
+        'transfers': counts['posted'],
+        'replayed': counts['replayed'],
+        'rejected': counts['rejected'],
+        'lock_errors': counts['lock_errors'],
+        'errors': len(errors),
+        'sample_errors': errors[:5],
+        'transfers_per_second': round(counts['posted'] / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+        'total_before': str(total_before),
+        'total_after': str(total_after),
+        'conserved': total_before == total_after and ledger_rows == 2 * counts['posted'],
+        'negative_wallets': wallets.filter(balance__lt=0).count(),
+    }
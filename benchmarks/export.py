@@ -0,0 +1,44 @@
+# benchmarks/export.py
+"""
+Streaming export throughput. Books `rows` transactions on one wallet and
+streams its history through the CSV and NDJSON exports, reporting rows/sec
+and the peak Python memory allocated while the response was consumed
+(tracemalloc). Peak memory should not grow with the row count.
+"""
+import time
+import tracemalloc
+from decimal import Decimal
+
+from rest_framework.test import APIClient
+
+from wallet.models import Transaction, Wallet
+
+
+def run_export(user, rows, formats=('csv', 'ndjson')):
+    wallet = Wallet.objects.get(user=user)
+    Transaction.objects.bulk_create([
+        Transaction(wallet=wallet, amount=Decimal('1.00'), transaction_type=Transaction.TransactionType.DEPOSIT,
+                    description=f'bench deposit {i}', reference=f'BENCH-EXPORT-{i}')
+        for i in range(rows)
+    ], batch_size=2000)
+    total = wallet.transactions.count()
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    report = {}
+    for fmt in formats:
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.get('/api/wallet/transactions/', {'format': fmt}, secure=True)
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report[fmt] = {
+            'rows': total,
+            'bytes': size,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(total / elapsed, 1) if elapsed else 0.0,
+            'peak_kib': round(peak / 1024, 1),
+        }
+    return report
@@ -0,0 +1,120 @@
+# benchmarks/harness.py
+"""
+In-process benchmark runner: drives the DRF endpoints through APIClient,
+timing each request and counting its queries, and compares the results
+against a saved baseline.
+"""
+import json
+import math
+import platform
+import statistics
+import time
+
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies_ms = [s * 1000 for s in latencies]
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies_ms), 3) if count else 0.0,
+        'queries_per_request': round(sum(queries) / count, 2) if count else 0.0,
+        'max_queries': max(queries, default=0),
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def run_scenario(scenario, iterations, warmup=0):
+    client = APIClient()
+    latencies, queries, errors = [], [], []
+
+    for i in range(warmup + iterations):
+        user, method, path, payload = scenario.next_request()
+        client.force_authenticate(user=user)
+        if user is not None:
+            scenario.prepare(user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, payload, format='json', secure=True)
+            took = time.perf_counter() - started
+
+        if i < warmup:
+            continue
+        latencies.append(took)
+        queries.append(len(ctx.captured_queries))
+        if response.status_code not in scenario.expected_status:
+            errors.append(f'{method.upper()} {path} -> {response.status_code}')
+
+    result = summarize(latencies, queries, len(errors), sum(latencies))
+    result['sample_errors'] = errors[:5]
+    return result
+
+
+def run(data, scenarios, iterations, warmup=0, log=None):
+    results = {}
+    for scenario_cls in scenarios:
+        if log:
+            log(f'Running {scenario_cls.name} ({iterations} requests)...')
+        results[scenario_cls.name] = run_scenario(scenario_cls(data), iterations, warmup)
+    return {
+        'meta': {
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'scale': vars(data.scale),
+            'iterations': iterations,
+        },
+        'scenarios': results,
+    }
+
+
+def save(report, path):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Compare a report with a baseline. Returns rows of
+    (scenario, metric, baseline, current, change, regressed); a metric
+    regresses when it grows by more than `tolerance` (queries by any amount).
+    """
+    rows = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            limit = 0 if metric == 'queries_per_request' else tolerance
+            rows.append((name, metric, before, after, change, after > before and change > limit))
+    return rows
@@ -0,0 +1,147 @@
+# benchmarks/management/commands/benchmark.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks import harness
+from benchmarks.contention import run_bid_contention, run_transfer_contention
+from benchmarks.export import run_export
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.seed import Scale, seed
+from products.category_tree import invalidate_category_tree
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and benchmarks the checkout, bidding and '
+        'catalog endpoints in-process (latency percentiles, queries per request, throughput)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=['small', 'medium', 'large'], default='medium')
+        parser.add_argument('--products', type=int, help='Override the number of seeded products')
+        parser.add_argument('--buyers', type=int, help='Override the number of seeded buyers')
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+        parser.add_argument('--output', help='Write the report as JSON to this path')
+        parser.add_argument('--baseline', help='Compare against a previously saved report')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative latency growth before flagging a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--contention', type=int, default=0, metavar='BIDDERS',
+                            help='Also run this many concurrent bidders against one auction (0 to skip)')
+        parser.add_argument('--contention-seconds', type=float, default=5.0)
+        parser.add_argument('--transfer-contention', type=int, default=0, metavar='USERS',
+                            help='Also run this many users transferring money to each other concurrently (0 to skip)')
+        parser.add_argument('--export-rows', type=int, default=0, metavar='ROWS',
+                            help='Also stream a wallet history of this many transactions as CSV/NDJSON (0 to skip)')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        try:
+            scenarios = [SCENARIOS[name.strip()] for name in options['scenarios'].split(',') if name.strip()]
+        except KeyError as e:
+            raise CommandError(f"Unknown scenario {e}")
+
+        scale = Scale.preset(options['scale'])
+        if options['products']:
+            scale.products = options['products']
+        if options['buyers']:
+            scale.buyers = options['buyers']
+        scale.auctions = min(scale.auctions, scale.products)
+
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.stdout.write(f"Seeding {connection.vendor} database ({vars(scale)})...")
+            data = seed(scale)
+            invalidate_category_tree()
+            report = harness.run(data, scenarios, options['iterations'], options['warmup'], log=self.stdout.write)
+            if options['contention']:
+                bidders = data.buyers[:options['contention']]
+                self.stdout.write(f"Running bid contention ({len(bidders)} bidders, "
+                                  f"{options['contention_seconds']}s)...")
+                report['contention'] = run_bid_contention(
+                    data.auctions[0], bidders, duration=options['contention_seconds'],
+                )
+            if options['transfer_contention']:
+                users = data.buyers[:options['transfer_contention']]
+                self.stdout.write(f"Running transfer contention ({len(users)} users, "
+                                  f"{options['contention_seconds']}s)...")
+                report['transfer_contention'] = run_transfer_contention(
+                    users, duration=options['contention_seconds'],
+                )
+            if options['export_rows']:
+                self.stdout.write(f"Streaming a {options['export_rows']}-row transaction export...")
+                report['export'] = run_export(data.buyers[0], options['export_rows'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self._print_report(report)
+        if options['output']:
+            harness.save(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            regressions = self._print_comparison(
+                harness.compare(report, harness.load(options['baseline']), options['tolerance'])
+            )
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} metric(s) regressed against {options['baseline']}")
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"\n{'scenario':<16}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'queries':>9}{'req/s':>9}"
+        )
+        for name, r in report['scenarios'].items():
+            self.stdout.write(
+                f"{name:<16}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['p99_ms']:>10.2f}{r['queries_per_request']:>9.1f}{r['throughput_rps']:>9.1f}"
+            )
+            for error in r['sample_errors']:
+                self.stderr.write(f"  {error}")
+
+        if 'contention' in report:
+            r = report['contention']
+            self.stdout.write(
+                f"\nbid contention: {r['bidders']} bidders, {r['accepted']} bids in {r['seconds']}s "
+                f"= {r['bids_per_second']} bids/s (outbid {r['outbid']}, lock errors {r['lock_errors']}, "
+                f"p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, p99 {r['p99_ms']} ms)"
+            )
+            for error in r['sample_errors']:
+                self.stderr.write(f"  {error}")
+
+        if 'transfer_contention' in report:
+            r = report['transfer_contention']
+            self.stdout.write(
+                f"\ntransfer contention: {r['users']} users, {r['transfers']} transfers in {r['seconds']}s "
+                f"= {r['transfers_per_second']} transfers/s (replayed retries {r['replayed']}, "
+                f"lock errors {r['lock_errors']}, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms); "
+                f"money {'conserved' if r['conserved'] else 'NOT CONSERVED'} "
+                f"({r['total_before']} -> {r['total_after']})"
+            )
+            for error in r['sample_errors']:
+                self.stderr.write(f"  {error}")
+
+        for fmt, r in report.get('export', {}).items():
+            self.stdout.write(
+                f"\n{fmt} export: {r['rows']} rows ({r['bytes']} bytes) in {r['seconds']}s "
+                f"= {r['rows_per_second']} rows/s (peak {r['peak_kib']} KiB)"
+            )
+
+    def _print_comparison(self, rows):
+        regressions = 0
+        self.stdout.write('\nAgainst baseline:')
+        for name, metric, before, after, change, regressed in rows:
+            line = f"  {name:<16}{metric:<22}{before:>10}{after:>10}{change:>+9.1%}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSION"))
+            else:
+                self.stdout.write(line)
+        return regressions
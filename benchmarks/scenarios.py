@@ -0,0 +1,98 @@
+# benchmarks/scenarios.py
+"""
+Benchmark scenarios. Each scenario yields one request per iteration as
+(user, method, path, payload); `prepare` runs untimed before the request,
+for state that must be reset (a refilled cart, the next bid amount).
+"""
+import itertools
+import random
+from decimal import Decimal
+
+from .seed import fill_cart
+
+
+class Scenario:
+    name = ''
+    expected_status = (200,)
+
+    def __init__(self, data):
+        self.data = data
+
+    def next_request(self):
+        raise NotImplementedError
+
+    def prepare(self, user):
+        pass
+
+
+class CatalogListScenario(Scenario):
+    name = 'catalog_list'
+    # parameters ProductListView reads (sort_by/sort_direction, category_id...)
+    queries = [
+        '',
+        '?sort_by=price&sort_direction=desc',
+        '?has_discount=true',
+        '?min_price=50&max_price=2000',
+    ]
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.paths = itertools.cycle(self.catalog_paths(data))
+
+    @classmethod
+    def catalog_paths(cls, data):
+        return ([f'/api/product/{q}' for q in cls.queries]
+                + [f'/api/product/?category_id={c.pk}' for c in data.categories[:4]])
+
+    def next_request(self):
+        return None, 'get', next(self.paths), None
+
+
+class CatalogSearchScenario(Scenario):
+    name = 'catalog_search'
+    terms = ['phone', 'laptop case', 'camera', 'هاتف', 'شاحن', 'speaker cable']
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.terms = itertools.cycle(self.terms)
+
+    def next_request(self):
+        return None, 'get', f'/api/product/search/?q={next(self.terms)}', None
+
+
+class CheckoutScenario(Scenario):
+    name = 'checkout'
+    expected_status = (201,)
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.buyers = itertools.cycle(data.buyers)
+        self.rng = random.Random(7)
+
+    def prepare(self, user):
+        fill_cart(user, self.data.products, self.data.scale.cart_lines, self.rng)
+
+    def next_request(self):
+        return next(self.buyers), 'post', '/api/orders/checkout/', {}
+
+
+class BiddingScenario(Scenario):
+    name = 'bidding'
+    expected_status = (201,)
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.buyers = itertools.cycle(data.buyers)
+        self.auctions = itertools.cycle(data.auctions)
+        self.next_amount = {a.pk: a.start_price for a in data.auctions}
+
+    def next_request(self):
+        auction = next(self.auctions)
+        amount = self.next_amount[auction.pk]
+        self.next_amount[auction.pk] = amount + auction.min_increment + Decimal('1.00')
+        return next(self.buyers), 'post', f'/api/auctions/{auction.pk}/bid/', {'amount': str(amount)}
+
+
+SCENARIOS = {cls.name: cls for cls in (
+    CatalogListScenario, CatalogSearchScenario, CheckoutScenario, BiddingScenario,
+)}
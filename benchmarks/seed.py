@@ -0,0 +1,135 @@
+# benchmarks/seed.py
+"""
+Synthetic data for the benchmark harness. Everything is bulk-inserted, so
+model signals do not run: wallets, profiles, carts, pricing and search
+documents are created here explicitly.
+"""
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from accounts.models import Profile, Role, User
+from auctions.models import Auction, AuctionStatus
+from products.models import Brand, BrandStatus, Cart, CartItem, Category, Product, ProductImage
+from products.pricing import refresh_product_pricing
+from products.search import index_products
+from wallet.models import Wallet
+
+WORDS = ['phone', 'laptop', 'camera', 'watch', 'speaker', 'charger', 'cable', 'case',
+         'هاتف', 'حاسوب', 'كاميرا', 'ساعة', 'سماعة', 'شاحن']
+STARTING_BALANCE = Decimal('10000000.00')
+
+
+@dataclass
+class Scale:
+    products: int = 500
+    sellers: int = 20
+    buyers: int = 50
+    cart_lines: int = 5
+    auctions: int = 10
+
+    @classmethod
+    def preset(cls, name):
+        return {
+            'small': cls(products=200, sellers=10, buyers=20, cart_lines=3, auctions=5),
+            'medium': cls(),
+            'large': cls(products=5000, sellers=100, buyers=300, cart_lines=15, auctions=50),
+        }[name]
+
+
+@dataclass
+class SeedData:
+    scale: Scale
+    sellers: list = field(default_factory=list)
+    buyers: list = field(default_factory=list)
+    categories: list = field(default_factory=list)
+    products: list = field(default_factory=list)
+    auctions: list = field(default_factory=list)
+
+
+def _users(prefix, count, role, password):
+    users = User.objects.bulk_create([
+        User(email=f'{prefix}{i}@bench.local', username=f'{prefix}{i}', first_name=prefix,
+             last_name=str(i), role=role, password=password)
+        for i in range(count)
+    ])
+    Wallet.objects.bulk_create([Wallet(user=user, balance=STARTING_BALANCE) for user in users])
+    Profile.objects.bulk_create([
+        Profile(user=user, latitude=Decimal('24.7136'), longitude=Decimal('46.6753'), city='Riyadh')
+        for user in users
+    ])
+    return users
+
+
+def fill_cart(buyer, products, lines, rng):
+    """(Re)fill a buyer's cart with `lines` distinct products."""
+    cart, _ = Cart.objects.get_or_create(user=buyer)
+    CartItem.objects.filter(cart=cart).delete()
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+        for product in rng.sample(products, min(lines, len(products)))
+    ])
+    return cart
+
+
+def seed(scale, rng_seed=42):
+    rng = random.Random(rng_seed)
+    now = timezone.now()
+    password = make_password('bench')
+    data = SeedData(scale=scale)
+
+    data.sellers = _users('seller', scale.sellers, Role.SELLER, password)
+    data.buyers = _users('buyer', scale.buyers, Role.USER, password)
+
+    parents = Category.objects.bulk_create([
+        Category(name_ar=f'قسم {i}', name_en=f'Department {i}') for i in range(5)
+    ])
+    data.categories = Category.objects.bulk_create([
+        Category(name_ar=f'فئة {p.pk}-{i}', name_en=f'Category {p.pk}-{i}', parent=p)
+        for p in parents for i in range(4)
+    ])
+    brands = Brand.objects.bulk_create([
+        Brand(name=f'Brand {i}', slug=f'brand-{i}', owner=seller, status=BrandStatus.APPROVED)
+        for i, seller in enumerate(data.sellers)
+    ])
+
+    products = []
+    for i in range(scale.products):
+        seller_index = i % scale.sellers
+        name_en = ' '.join(rng.sample(WORDS[:8], 2))
+        discounted = rng.random() < 0.2
+        products.append(Product(
+            seller=data.sellers[seller_index], brand=brands[seller_index],
+            category=rng.choice(data.categories),
+            name_en=f'{name_en} {i}', name_ar=f'{" ".join(rng.sample(WORDS[8:], 2))} {i}',
+            description_en=' '.join(rng.choices(WORDS[:8], k=12)),
+            price=Decimal(rng.randint(500, 500000)) / 100,
+            quantity=1_000_000, is_approved=True, status='approved',
+            rating=Decimal(rng.randint(10, 50)) / 10,
+            has_standalone_discount=discounted,
+            standalone_discount_percentage=Decimal(rng.choice([10, 15, 25])) if discounted else None,
+        ))
+    data.products = Product.objects.bulk_create(products, batch_size=500)
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=f'products/bench-{product.pk}-{n}.jpg')
+        for product in data.products for n in range(2)
+    ], batch_size=1000)
+    refresh_product_pricing(data.products, now)
+    index_products(Product.objects.select_related('brand'))
+
+    for buyer in data.buyers:
+        fill_cart(buyer, data.products, scale.cart_lines, rng)
+
+    data.auctions = Auction.objects.bulk_create([
+        Auction(
+            seller=product.seller, product=product, title=f'Auction {product.name_en}',
+            start_price=Decimal('10.00'), min_increment=Decimal('1.00'),
+            start_at=now - timezone.timedelta(hours=1), end_at=now + timezone.timedelta(days=2),
+            status=AuctionStatus.ACTIVE,
+        )
+        for product in data.products[:scale.auctions]
+    ])
+    return data
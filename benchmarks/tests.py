@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from auctions.models import Bid
+from wallet.models import Wallet
+
+from . import harness
+from .contention import run_bid_contention, run_transfer_contention
+from .scenarios import SCENARIOS, CatalogListScenario
+from .seed import Scale, seed
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_percentile_is_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(harness.percentile(samples, 50), 50)
+        self.assertEqual(harness.percentile(samples, 99), 99)
+        self.assertEqual(harness.percentile([3.0], 95), 3.0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'scenarios': {'checkout': {'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0,
+                                               'queries_per_request': 12.0}}}
+        report = {'scenarios': {'checkout': {'p50_ms': 10.5, 'p95_ms': 30.0, 'p99_ms': 30.0,
+                                             'queries_per_request': 13.0}}}
+        regressed = {metric for _, metric, *_, flag in harness.compare(report, baseline) if flag}
+        self.assertEqual(regressed, {'p95_ms', 'queries_per_request'})
+
+    def test_all_scenarios_run_against_seeded_data(self):
+        data = seed(Scale(products=20, sellers=2, buyers=3, cart_lines=2, auctions=2))
+        report = harness.run(data, SCENARIOS.values(), iterations=3)
+
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['requests'], 3, name)
+            self.assertEqual(result['errors'], 0, result['sample_errors'])
+            self.assertGreater(result['queries_per_request'], 0)
+
+    def test_catalog_queries_are_applied_by_the_list_view(self):
+        data = seed(Scale(products=40, sellers=2, buyers=1, cart_lines=1, auctions=0))
+        client = APIClient()
+
+        def ids(path):
+            response = client.get(path, secure=True)
+            self.assertEqual(response.status_code, 200, path)
+            return [product['id'] for product in response.data['results']]
+
+        paths = CatalogListScenario.catalog_paths(data)
+        default = ids(paths[0])
+        # every filter or sort must change the listing, or it benchmarks the default list
+        for path in paths[1:]:
+            self.assertNotEqual(ids(path), default, path)
+
+
+class BidContentionTests(TransactionTestCase):
+    def test_concurrent_bidders_keep_the_order_book_consistent(self):
+        data = seed(Scale(products=2, sellers=1, buyers=4, cart_lines=1, auctions=1))
+        auction = data.auctions[0]
+
+        result = run_bid_contention(auction, data.buyers, duration=30, max_bids=12)
+
+        self.assertEqual(result['errors'], 0, result['sample_errors'])
+        self.assertGreaterEqual(result['accepted'], 12)
+        auction.refresh_from_db()
+        self.assertEqual(auction.bid_count, Bid.objects.filter(auction=auction).count())
+        top = Bid.objects.filter(auction=auction).first()
+        self.assertEqual((auction.current_bidder_id, auction.current_amount), (top.bidder_id, top.amount))
+        held = dict(Wallet.objects.filter(user__in=data.buyers).values_list('user_id', 'held_balance'))
+        self.assertEqual(held.pop(top.bidder_id), top.amount)
+        self.assertEqual(set(held.values()), {Decimal('0.00')})
+
+
+class TransferContentionTests(TransactionTestCase):
+    def test_concurrent_transfers_conserve_money(self):
+        data = seed(Scale(products=1, sellers=1, buyers=4, cart_lines=1, auctions=0))
+        # little enough money that some transfers bounce off an empty wallet
+        Wallet.objects.filter(user__in=data.buyers).update(balance=Decimal('3.00'))
+
+        result = run_transfer_contention(data.buyers, duration=30, max_transfers=40, retry_rate=0.5)
+
+        self.assertEqual(result['errors'], 0, result['sample_errors'])
+        self.assertGreaterEqual(result['transfers'], 40)
+        self.assertTrue(result['conserved'], result)
+        self.assertEqual(result['negative_wallets'], 0)
+        self.assertGreater(result['replayed'], 0)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DeliveryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'delivery'
+
+    def ready(self):
+        from . import signals  # noqa
@@ -0,0 +1,143 @@
+# delivery/dispatch.py
+"""
+Courier dispatch.
+
+Claimable orders (CREATED, unassigned) are indexed on a fixed lat/lon grid:
+every order stores the cell of its shipping coordinates
+(Order.dispatch_cell_y/x, kept in sync by delivery.signals), and a partial
+index covers only claimable orders. Finding the K nearest orders to a
+courier is one query over the block of cells around them, ordered by an
+equirectangular distance estimate. It widens to a larger block only when
+the first one has fewer than K orders.
+
+Claims lock the order row with SKIP LOCKED: a courier never waits on an
+order another courier is claiming at the same moment, it just moves on
+(claim_nearest) or is told the order is taken (claim). A courier's own
+claims are serialized on their user row so the active-order limit holds.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from accounts.models import User
+from notifications.outbox import notify
+from orders.models import Order, OrderStatus
+
+from .models import DeliveryAssignment
+
+# ~5.5 km of latitude per cell
+CELL_DEGREES = 0.05
+# cells searched around the courier's cell: first pass, then the widened pass
+SEARCH_RINGS = (2, 20)
+DEFAULT_K = 20
+MAX_K = 50
+
+ACTIVE_FOR_DELIVERY = {OrderStatus.CREATED, OrderStatus.PROCESSING, OrderStatus.SHIPPED}
+MAX_ACTIVE_ORDERS = 5
+
+
+class ClaimLimitReached(Exception):
+    pass
+
+
+def cell_for(latitude, longitude):
+    """(row, column) of the grid cell containing a point, or (None, None)."""
+    if latitude is None or longitude is None:
+        return None, None
+    return math.floor(float(latitude) / CELL_DEGREES), math.floor(float(longitude) / CELL_DEGREES)
+
+
+def claimable():
+    return Order.objects.filter(status=OrderStatus.CREATED, assigned_delivery__isnull=True)
+
+
+def _within(queryset, latitude, longitude, rings):
+    row, col = cell_for(latitude, longitude)
+    # squared equirectangular distance in degrees of latitude; only used for ordering
+    lon_scale = math.cos(math.radians(float(latitude)))
+    d_lat = Cast('shipping_latitude', FloatField()) - Value(float(latitude))
+    d_lon = (Cast('shipping_longitude', FloatField()) - Value(float(longitude))) * Value(lon_scale)
+    return (queryset
+            .filter(dispatch_cell_y__range=(row - rings, row + rings),
+                    dispatch_cell_x__range=(col - rings, col + rings))
+            .annotate(distance_sq=d_lat * d_lat + d_lon * d_lon)
+            .order_by('distance_sq', 'created_at'))
+
+
+def nearest_claimable(latitude, longitude, k=DEFAULT_K):
+    """The k claimable orders closest to the point, nearest first."""
+    k = max(1, min(k, MAX_K))
+    orders = []
+    for rings in SEARCH_RINGS:
+        orders = list(_within(claimable().select_related('buyer__profile'), latitude, longitude, rings)[:k])
+        if len(orders) >= k:
+            break
+    for order in orders:
+        order.distance_km = round(math.sqrt(order.distance_sq) * 111.32, 3)
+    return orders
+
+
+def _check_limit(courier):
+    # lock the courier's row first: one courier's concurrent claims then
+    # count their active orders one after another, never both seeing 4
+    list(User.objects.select_for_update().filter(pk=courier.pk).values_list('pk', flat=True))
+    active = Order.objects.filter(assigned_delivery=courier, status__in=ACTIVE_FOR_DELIVERY).count()
+    if active >= MAX_ACTIVE_ORDERS:
+        raise ClaimLimitReached(
+            f'Limit reached. You can work on up to {MAX_ACTIVE_ORDERS} orders at a time.'
+        )
+
+
+def _assign(order, courier):
+    order.assigned_delivery = courier
+    order.assigned_at = timezone.now()
+    order.status = OrderStatus.PROCESSING
+    order.save(update_fields=['assigned_delivery', 'assigned_at', 'status'])
+    DeliveryAssignment.objects.update_or_create(order=order, defaults={'courier': courier})
+
+    notify(
+        user=order.buyer,
+        notification_type='order_claimed',
+        message_ar=f"تم استلام طلبك {order.order_number} من قبل مندوب التوصيل.",
+        message_en=f"Your order {order.order_number} was claimed by a courier.",
+        content_object=order,
+    )
+    return order
+
+
+@transaction.atomic
+def claim(order_id, courier):
+    """
+    Claim one order. Returns (outcome, order) with outcome one of
+    'claimed', 'mine', 'taken' or 'unavailable'. An order whose row another
+    courier holds right now is reported as taken instead of waited on.
+    """
+    _check_limit(courier)
+    order = (Order.objects.select_for_update(skip_locked=True, of=('self',))
+             .select_related('buyer').filter(pk=order_id).first())
+    if order is None:
+        if not Order.objects.filter(pk=order_id).exists():
+            raise Order.DoesNotExist
+        return 'taken', None
+    if order.assigned_delivery_id:
+        return ('mine' if order.assigned_delivery_id == courier.id else 'taken'), order
+    if order.status != OrderStatus.CREATED:
+        return 'unavailable', order
+    return 'claimed', _assign(order, courier)
+
+
+@transaction.atomic
+def claim_nearest(courier, latitude, longitude):
+    """Claim the nearest claimable order nobody else is claiming; None if there is none."""
+    _check_limit(courier)
+    for rings in SEARCH_RINGS:
+        order = (_within(claimable(), latitude, longitude, rings)
+                 .select_for_update(skip_locked=True, of=('self',))
+                 .select_related('buyer')
+                 .first())
+        if order is not None:
+            return _assign(order, courier)
+    return None
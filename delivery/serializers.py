@@ -14,16 +14,27 @@ class LocationSerializer(serializers.Serializer):
     longitude = serializers.FloatField()
     address_line = serializers.CharField(allow_blank=True)
 
+class DispatchLimitSerializer(serializers.Serializer):
+    """How many orders to list; delivery.dispatch caps it at MAX_K."""
+    k = serializers.IntegerField(required=False, min_value=1)
+
+class DispatchQuerySerializer(DispatchLimitSerializer):
+    """Courier position for nearest-order dispatch (delivery.dispatch)."""
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
 class DeliveryOrderSerializer(serializers.ModelSerializer):
     # show only minimal buyer info
     buyer = serializers.SerializerMethodField()
     buyer_location = serializers.SerializerMethodField()
+    # set by delivery.dispatch.nearest_claimable
+    distance_km = serializers.FloatField(read_only=True, default=None)
 
     class Meta:
         model = Order
         fields = [
             "id", "order_number", "status", "created_at", "assigned_at",
-            "buyer", "buyer_location", "total_amount", "delivery_fee"
+            "buyer", "buyer_location", "total_amount", "delivery_fee", "distance_km"
         ]
 
     def get_buyer(self, obj):
@@ -0,0 +1,21 @@
+# delivery/signals.py
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from orders.models import Order
+
+from .dispatch import cell_for
+
+
+@receiver(pre_save, sender=Order)
+def set_dispatch_cell(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the order's dispatch grid cell in line with its shipping
+    coordinates. Saves with update_fields that touch the coordinates must
+    list dispatch_cell_y/x too.
+    """
+    if update_fields is not None and not {'shipping_latitude', 'shipping_longitude'} & set(update_fields):
+        return
+    instance.dispatch_cell_y, instance.dispatch_cell_x = cell_for(
+        instance.shipping_latitude, instance.shipping_longitude,
+    )
@@ -1,3 +1,112 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import Role, User
+from accounts.testing import make_user
+from orders.models import Order, OrderStatus
+
+from . import dispatch
+
+
+class DispatchTests(TestCase):
+    # courier stands in central Amman
+    HERE = (31.9539, 35.9106)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = make_user('buyer')
+        cls.couriers = [make_user(f'courier{i}', role=Role.DELIVERY) for i in range(2)]
+        cls.near = cls._order('31.955000', '35.912000')
+        cls.mid = cls._order('31.990000', '35.880000')
+        cls.far = cls._order('32.550000', '35.850000')      # Irbid, outside the first search block
+        cls.claimed = cls._order('31.954000', '35.911000', assigned_delivery=cls.couriers[1],
+                                 status=OrderStatus.PROCESSING)
+        cls.no_coords = cls._order(None, None)
+
+    @classmethod
+    def _order(cls, lat, lon, **extra):
+        return Order.objects.create(
+            buyer=cls.buyer, total_amount=Decimal('10.00'),
+            shipping_latitude=None if lat is None else Decimal(lat),
+            shipping_longitude=None if lon is None else Decimal(lon),
+            **extra
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.couriers[0])
+
+    def test_orders_are_indexed_by_grid_cell(self):
+        self.assertEqual((self.near.dispatch_cell_y, self.near.dispatch_cell_x),
+                         dispatch.cell_for(*self.HERE))
+        self.assertIsNone(self.no_coords.dispatch_cell_y)
+
+    def test_nearest_claimable_in_one_query(self):
+        with self.assertNumQueries(1):
+            orders = dispatch.nearest_claimable(*self.HERE, k=2)
+        self.assertEqual([o.pk for o in orders], [self.near.pk, self.mid.pk])
+        self.assertLess(orders[0].distance_km, orders[1].distance_km)
+
+    def test_search_widens_when_the_block_is_sparse(self):
+        orders = dispatch.nearest_claimable(*self.HERE, k=5)
+        self.assertEqual([o.pk for o in orders], [self.near.pk, self.mid.pk, self.far.pk])
+
+    def test_available_orders_endpoint(self):
+        response = self.client.get('/api/delivery/orders/available/',
+                                   {'latitude': self.HERE[0], 'longitude': self.HERE[1], 'k': 1}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['id'] for o in response.data], [self.near.pk])
+        self.assertIsNotNone(response.data[0]['distance_km'])
+
+        response = self.client.get('/api/delivery/orders/available/', secure=True)
+        self.assertEqual({o['id'] for o in response.data},
+                         {self.near.pk, self.mid.pk, self.far.pk, self.no_coords.pk})
+
+    def test_available_orders_rejects_a_bad_k(self):
+        for k in ('abc', '0', '-1'):
+            response = self.client.get('/api/delivery/orders/available/', {'k': k}, secure=True)
+            self.assertEqual(response.status_code, 400, k)
+            self.assertIn('k', response.data)
+        response = self.client.get('/api/delivery/orders/available/', {'k': 1000}, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_claim_locks_the_courier_before_counting(self):
+        with CaptureQueriesContext(connection) as ctx:
+            dispatch.claim(self.near.pk, self.couriers[0])
+        lock, count = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))][:2]
+        self.assertIn(User._meta.db_table, lock)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', lock)
+        self.assertIn('COUNT(', count)
+
+    def test_claim_and_conflict(self):
+        url = f'/api/delivery/orders/{self.near.pk}/claim/'
+        self.assertEqual(self.client.post(url, secure=True).status_code, 200)
+        self.assertEqual(self.client.post(url, secure=True).data, {'message': 'You already claimed this order.'})
+
+        other = APIClient()
+        other.force_authenticate(self.couriers[1])
+        self.assertEqual(other.post(url, secure=True).status_code, 409)
+        self.assertEqual(other.post('/api/delivery/orders/999999/claim/', secure=True).status_code, 404)
+
+        self.near.refresh_from_db()
+        self.assertEqual((self.near.status, self.near.assigned_delivery), (OrderStatus.PROCESSING, self.couriers[0]))
+
+    def test_claim_nearest_hands_out_orders_in_distance_order(self):
+        payload = {'latitude': self.HERE[0], 'longitude': self.HERE[1]}
+        first = self.client.post('/api/delivery/orders/claim-nearest/', payload, format='json', secure=True)
+        second = self.client.post('/api/delivery/orders/claim-nearest/', payload, format='json', secure=True)
+
+        self.assertEqual([first.data['id'], second.data['id']], [self.near.pk, self.mid.pk])
+        self.assertFalse(dispatch.claimable().filter(pk__in=[self.near.pk, self.mid.pk]).exists())
 
-# Create your tests here.
+    def test_claim_limit(self):
+        for _ in range(dispatch.MAX_ACTIVE_ORDERS):
+            self._order('31.950000', '35.910000', assigned_delivery=self.couriers[0],
+                        status=OrderStatus.PROCESSING)
+        response = self.client.post(f'/api/delivery/orders/{self.near.pk}/claim/', secure=True)
+        self.assertEqual(response.status_code, 403)
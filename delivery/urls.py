@@ -2,7 +2,7 @@
 from django.urls import path
 from .views import (
     AvailableOrdersView, MyActiveOrdersView,
-    ClaimOrderView, AdvanceOrderStatusView,
+    ClaimOrderView, ClaimNearestOrderView, AdvanceOrderStatusView,
     OrderDetailForDeliveryView,MyDeliveredOrdersView,
 )
 from .views_qr import GenerateDeliveryQRView, ConfirmDeliveryByQRView
@@ -11,6 +11,7 @@ from .views_qr import GenerateDeliveryQRView, ConfirmDeliveryByQRView
 urlpatterns = [
     path('orders/available/', AvailableOrdersView.as_view(), name='delivery-available-orders'),
     path('orders/my/', MyActiveOrdersView.as_view(), name='delivery-my-orders'),
+    path('orders/claim-nearest/', ClaimNearestOrderView.as_view(), name='delivery-claim-nearest'),
     path('orders/<int:order_id>/claim/', ClaimOrderView.as_view(), name='delivery-claim'),
     path('orders/<int:order_id>/advance/', AdvanceOrderStatusView.as_view(), name='delivery-advance'),
     path('orders/<int:order_id>/', OrderDetailForDeliveryView.as_view(), name='delivery-order-detail'),
@@ -1,6 +1,7 @@
 # delivery/views.py
 from django.db import transaction
 from django.utils import timezone
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status
 from rest_framework.views import APIView
@@ -9,7 +10,9 @@ from rest_framework.response import Response
 from orders.models import Order, OrderStatus, OrderItem
 from notifications.models import Notification
 from .permissions import IsDelivery
-from .serializers import DeliveryOrderSerializer
+from . import dispatch
+from .dispatch import ACTIVE_FOR_DELIVERY
+from .serializers import DeliveryOrderSerializer, DispatchLimitSerializer, DispatchQuerySerializer
 from .models import DeliveryProof
 from .utils import generate_delivery_token, default_expiry
 
@@ -22,21 +25,30 @@ except Exception:  # pragma: no cover
     qrcode = None
 
 
-ACTIVE_FOR_DELIVERY = {OrderStatus.CREATED, OrderStatus.PROCESSING, OrderStatus.SHIPPED}
-MAX_ACTIVE_ORDERS = 5
-
 class AvailableOrdersView(APIView):
     """
-    GET /api/delivery/orders/available/
-    List orders that are not claimed and are in a claimable state.
+    GET /api/delivery/orders/available/?latitude=..&longitude=..&k=..
+    The k (default 20, max 50) claimable orders nearest to the courier,
+    nearest first. Without a position, the k most recent claimable orders.
     """
     permission_classes = [permissions.IsAuthenticated, IsDelivery]
 
     def get(self, request):
-        qs = (Order.objects
-              .filter(assigned_delivery__isnull=True, status__in=[OrderStatus.CREATED])
-              .order_by('-created_at'))
-        return Response(DeliveryOrderSerializer(qs, many=True).data)
+        if 'latitude' in request.query_params or 'longitude' in request.query_params:
+            ser = DispatchQuerySerializer(data=request.query_params)
+            ser.is_valid(raise_exception=True)
+            orders = dispatch.nearest_claimable(
+                ser.validated_data['latitude'], ser.validated_data['longitude'],
+                ser.validated_data.get('k', dispatch.DEFAULT_K),
+            )
+        else:
+            ser = DispatchLimitSerializer(data=request.query_params)
+            ser.is_valid(raise_exception=True)
+            k = min(ser.validated_data.get('k', dispatch.DEFAULT_K), dispatch.MAX_K)
+            orders = (dispatch.claimable()
+                      .select_related('buyer__profile')
+                      .order_by('-created_at')[:k])
+        return Response(DeliveryOrderSerializer(orders, many=True).data)
 
 class MyActiveOrdersView(APIView):
     """
@@ -48,6 +60,7 @@ class MyActiveOrdersView(APIView):
     def get(self, request):
         qs = (Order.objects
               .filter(assigned_delivery=request.user, status__in=ACTIVE_FOR_DELIVERY)
+              .select_related('buyer__profile')
               .order_by('-assigned_at'))
         return Response(DeliveryOrderSerializer(qs, many=True).data)
 
@@ -55,57 +68,49 @@ class ClaimOrderView(APIView):
     """
     POST /api/delivery/orders/<order_id>/claim/
     Claim an order (if not taken). Sets status -> PROCESSING.
-    Enforces max 5 active per courier.
+    Enforces max 5 active per courier. Never waits on another courier's
+    in-flight claim of the same order: that order is reported as taken.
     """
     permission_classes = [permissions.IsAuthenticated, IsDelivery]
 
-    @transaction.atomic
     def post(self, request, order_id):
-        # Enforce the 5-active limit
-        active_count = Order.objects.select_for_update().filter(
-            assigned_delivery=request.user, status__in=ACTIVE_FOR_DELIVERY
-        ).count()
-        if active_count >= MAX_ACTIVE_ORDERS:
-            return Response(
-                {'error': f'Limit reached. You can work on up to {MAX_ACTIVE_ORDERS} orders at a time.'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        order = Order.objects.select_for_update().get(pk=order_id)
-
-        if order.assigned_delivery_id:
-            if order.assigned_delivery_id == request.user.id:
-                return Response({'message': 'You already claimed this order.'})
+        try:
+            outcome, order = dispatch.claim(order_id, request.user)
+        except dispatch.ClaimLimitReached as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+        except Order.DoesNotExist:
+            raise Http404
+
+        if outcome == 'mine':
+            return Response({'message': 'You already claimed this order.'})
+        if outcome == 'taken':
             return Response(
                 {'error': 'This order is already taken by another delivery agent.'},
                 status=status.HTTP_409_CONFLICT
             )
-
-        if order.status != OrderStatus.CREATED:
+        if outcome == 'unavailable':
             return Response({'error': 'Order is not available to claim.'}, status=400)
+        return Response(DeliveryOrderSerializer(order).data, status=200)
 
-        # Claim it
-        order.assigned_delivery = request.user
-        order.assigned_at = timezone.now()
-        order.status = OrderStatus.PROCESSING
-        order.save(update_fields=['assigned_delivery', 'assigned_at', 'status'])
+class ClaimNearestOrderView(APIView):
+    """
+    POST /api/delivery/orders/claim-nearest/  {"latitude": .., "longitude": ..}
+    Claim the nearest claimable order that no other courier is claiming
+    at the same moment.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsDelivery]
 
-        # (optional) create DeliveryAssignment row
+    def post(self, request):
+        ser = DispatchQuerySerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
         try:
-            from .models import DeliveryAssignment
-            DeliveryAssignment.objects.create(order=order, courier=request.user)
-        except Exception:
-            pass
-
-        # Notify buyer
-        Notification.objects.create(
-            user=order.buyer,
-            notification_type='order_claimed',
-            message_ar=f"تم استلام طلبك {order.order_number} من قبل مندوب التوصيل.",
-            message_en=f"Your order {order.order_number} was claimed by a courier.",
-            content_object=order,
-        )
-
+            order = dispatch.claim_nearest(
+                request.user, ser.validated_data['latitude'], ser.validated_data['longitude'],
+            )
+        except dispatch.ClaimLimitReached as e:
+            return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+        if order is None:
+            return Response({'error': 'No claimable orders nearby.'}, status=status.HTTP_404_NOT_FOUND)
         return Response(DeliveryOrderSerializer(order).data, status=200)
 
 class AdvanceOrderStatusView(APIView):
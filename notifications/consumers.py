@@ -0,0 +1,36 @@
+# notifications/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Notification
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Real-time notifications for the connected user. Joins the
+    `notifications_<user_id>` group that notifications.outbox pushes to and
+    sends the unread count on connect, so clients need not poll
+    UnreadCountView.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.group_name = f'notifications_{user.id}'
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({'type': 'unread_count', 'count': await self.unread_count(user)})
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def send_notification(self, event):
+        await self.send_json({'type': 'notification', 'notification': event['notification']})
+
+    @database_sync_to_async
+    def unread_count(self, user):
+        return Notification.objects.filter(user=user, is_read=False).count()
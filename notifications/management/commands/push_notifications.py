@@ -0,0 +1,24 @@
+# notifications/management/commands/push_notifications.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import PUSH_BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = 'Pushes committed notifications from the outbox to WebSocket clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds to sleep when the outbox is empty; bounds push latency')
+        parser.add_argument('--batch-size', type=int, default=PUSH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            pushed = drain(options['batch_size'])
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Pushed {pushed} notifications"))
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_pushed(apps, schema_editor):
+    # rows from before the outbox worker were delivered (or not) already;
+    # only notifications written from now on are pushed
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(pushed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0011_notification_notificatio_user_id_b87bb1_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='pushed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_pushed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('pushed_at__isnull', True)), fields=['id'], name='notification_unpushed_idx'),
+        ),
+    ]
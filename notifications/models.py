@@ -54,6 +54,8 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
+    # set once notifications.outbox has pushed it over WebSocket
+    pushed_at = models.DateTimeField(null=True, blank=True)
     extra_data = models.JSONField(null=True, blank=True)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
     object_id = models.PositiveIntegerField(null=True, blank=True)
@@ -62,6 +64,11 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'notifications_notification'
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['id'], condition=models.Q(pushed_at__isnull=True),
+                         name='notification_unpushed_idx'),
+        ]
 
     def mark_as_read(self):
         """Mark notification as read with timestamp"""
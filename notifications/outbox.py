@@ -0,0 +1,107 @@
+# notifications/outbox.py
+"""
+Notification outbox.
+
+Write paths call notify() / notify_many() instead of
+Notification.objects.create(). The rows are inserted right away in the
+caller's transaction, so they commit or roll back together with the
+business write that caused them. Any committed row with pushed_at NULL is
+waiting in the outbox, including rows still created directly.
+
+A worker drains the outbox: `manage.py push_notifications` (long-running)
+or the push_pending_notifications task. push_pending() claims undelivered
+rows with SKIP LOCKED, so several workers never push the same row. It sends
+each one to its recipient's `notifications_<user_id>` group over Channels
+(see notifications.consumers) and marks it pushed. Requests never wait on
+the channel layer. A push that fails, or whose worker dies before marking
+the row, is retried on the next pass.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+PUSH_BATCH_SIZE = 500
+
+
+def notify_many(notifications):
+    """Insert Notification instances in the current transaction; delivered by the outbox worker."""
+    notifications = list(notifications)
+    if not notifications:
+        return []
+    return Notification.objects.bulk_create(notifications, batch_size=500)
+
+
+def notify(user, notification_type, message_ar, message_en, content_object=None, **fields):
+    """Queue one notification; the outbox counterpart of Notification.objects.create()."""
+    notification = Notification(
+        user=user,
+        notification_type=notification_type,
+        message_ar=message_ar,
+        message_en=message_en,
+        **fields
+    )
+    if content_object is not None:
+        notification.content_object = content_object
+    notify_many([notification])
+    return notification
+
+
+async def _send_all(channel_layer, messages):
+    return await asyncio.gather(
+        *(channel_layer.group_send(group, message) for group, message in messages),
+        return_exceptions=True,
+    )
+
+
+def push_pending(limit=PUSH_BATCH_SIZE):
+    """Push up to `limit` undelivered notifications, oldest first. Returns how many were pushed."""
+    from .serializers import NotificationSerializer
+
+    channel_layer = get_channel_layer()
+    with transaction.atomic():
+        pending = list(Notification.objects
+                       .select_for_update(skip_locked=True)
+                       .filter(pushed_at__isnull=True)
+                       .order_by('id')[:limit])
+        if not pending:
+            return 0
+
+        pushed = pending
+        if channel_layer is not None:
+            # one query per content type for NotificationSerializer.get_related_object
+            prefetch_related_objects(pending, 'content_object')
+            messages = [
+                (f'notifications_{notification.user_id}',
+                 {'type': 'send_notification', 'notification': NotificationSerializer(notification).data})
+                for notification in pending
+            ]
+            results = async_to_sync(_send_all)(channel_layer, messages)
+            pushed = []
+            for notification, result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    logger.warning("WebSocket push failed for notification %s: %s", notification.pk, result)
+                else:
+                    pushed.append(notification)
+
+        Notification.objects.filter(pk__in=[notification.pk for notification in pushed]).update(
+            pushed_at=timezone.now())
+    return len(pushed)
+
+
+def drain(batch_size=PUSH_BATCH_SIZE):
+    """Push batches until the outbox is empty (or a batch is not fully pushed); returns the total."""
+    total = 0
+    while True:
+        pushed = push_pending(batch_size)
+        total += pushed
+        if pushed < batch_size:
+            return total
@@ -3,6 +3,7 @@ from django.dispatch import receiver
 from products.models import Product, ProductSale, WishlistItem
 from django.contrib.contenttypes.models import ContentType
 from notifications.models import Notification
+from notifications.outbox import notify_many
 
 # @receiver(post_save, sender=Product)
 # def handle_product_approval(sender, instance, created, **kwargs):
@@ -64,13 +65,15 @@ def notify_wishlist_users(sender, instance, created, **kwargs):
         message_ar = f"المنتج {product.name_ar} في قائمة أمنياتك أصبح في عرض! خصم {instance.discount_percentage}%"
         message_en = f"Product {product.name_en} in your wishlist is now on sale! {instance.discount_percentage}% off"
         
-        # Create notifications for each user
-        for item in wishlist_items:
-            Notification.objects.create(
+        # Queue notifications for each user (delivered in bulk after commit)
+        notify_many(
+            Notification(
                 user=item.wishlist.user,
                 notification_type='wishlist_discount',
                 message_ar=message_ar,
                 message_en=message_en,
                 content_type=product_content_type,
                 object_id=product.id
-            )
\ No newline at end of file
+            )
+            for item in wishlist_items
+        )
\ No newline at end of file
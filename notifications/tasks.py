@@ -0,0 +1,8 @@
+# notifications/tasks.py
+from celery import shared_task
+from .outbox import drain
+
+@shared_task
+def push_pending_notifications():
+    # Drain the outbox when no push_notifications worker is running
+    return f"Pushed {drain()} notifications"
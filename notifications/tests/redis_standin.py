@@ -0,0 +1,114 @@
+# notifications/tests/redis_standin.py
+"""
+A minimal Redis stand-in for tests.
+
+It speaks just enough RESP2 to carry channels_redis.pubsub.RedisPubSubChannelLayer
+traffic between processes: PING, SELECT, CLIENT, PUBLISH, SUBSCRIBE and
+UNSUBSCRIBE. Nothing is stored; other commands get an error. The cross-worker
+fan-out test in notifications.tests.test_notifications runs it in a subprocess:
+
+    python -m notifications.tests.redis_standin [--port 0]
+
+It prints the port it listens on, then serves until killed.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+
+
+def _bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, str):
+        value = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _array(*items):
+    return b'*%d\r\n' % len(items) + b''.join(items)
+
+
+def _int(value):
+    return b':%d\r\n' % value
+
+
+async def _read_command(reader):
+    """One command as a list of bytes arguments; None once the client is gone."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        return line.split()  # inline command
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+class Broker:
+    def __init__(self):
+        self.subscribers = defaultdict(set)  # channel -> writers
+
+    async def publish(self, channel, data):
+        writers = list(self.subscribers.get(channel, ()))
+        for writer in writers:
+            writer.write(_array(_bulk('message'), _bulk(channel), _bulk(data)))
+        for writer in writers:
+            await writer.drain()
+        return len(writers)
+
+    async def serve(self, reader, writer):
+        subscribed = set()
+        try:
+            while (args := await _read_command(reader)) is not None:
+                if not args:
+                    continue
+                command = args[0].upper()
+                if command == b'SUBSCRIBE':
+                    for channel in args[1:]:
+                        subscribed.add(channel)
+                        self.subscribers[channel].add(writer)
+                        writer.write(_array(_bulk('subscribe'), _bulk(channel), _int(len(subscribed))))
+                elif command == b'UNSUBSCRIBE':
+                    channels = args[1:] or sorted(subscribed) or [None]
+                    for channel in channels:
+                        subscribed.discard(channel)
+                        self.subscribers.get(channel, set()).discard(writer)
+                        writer.write(_array(_bulk('unsubscribe'), _bulk(channel), _int(len(subscribed))))
+                elif command == b'PUBLISH':
+                    writer.write(_int(await self.publish(args[1], args[2])))
+                elif command == b'PING':
+                    if subscribed:
+                        writer.write(_array(_bulk('pong'), _bulk(args[1] if len(args) > 1 else b'')))
+                    else:
+                        writer.write(b'+PONG\r\n')
+                elif command in (b'SELECT', b'CLIENT'):
+                    writer.write(b'+OK\r\n')
+                elif command == b'QUIT':
+                    writer.write(b'+OK\r\n')
+                    break
+                else:
+                    writer.write(b'-ERR unknown command \'%s\'\r\n' % args[0])
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.subscribers[channel].discard(writer)
+            writer.close()
+
+
+async def main(host='127.0.0.1', port=0):
+    server = await asyncio.start_server(Broker().serve, host, port)
+    print(server.sockets[0].getsockname()[1], flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    options = parser.parse_args()
+    asyncio.run(main(options.host, options.port))
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import transaction
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.testing import make_user
+
+from ..consumers import NotificationConsumer
+from ..models import Notification
+from ..outbox import notify, push_pending
+
+
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+
+    def _notify(self, text):
+        notify(self.user, 'system_alert', text, text)
+
+    def _listen(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'notifications_{self.user.id}', channel)
+        return channel_layer, channel
+
+    def test_written_in_the_callers_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self._notify('hello')
+                self.assertTrue(Notification.objects.filter(user=self.user, pushed_at__isnull=True).exists())
+        self.assertEqual(callbacks, [])
+
+    def test_rolled_back_savepoint_drops_its_notifications(self):
+        with transaction.atomic():
+            self._notify('kept')
+            try:
+                with transaction.atomic():
+                    self._notify('dropped')
+                    raise ValueError
+            except ValueError:
+                pass
+            self._notify('kept too')
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('message_en', flat=True)),
+            ['kept', 'kept too'],
+        )
+
+    def test_push_pending_sends_to_user_group_once(self):
+        channel_layer, channel = self._listen()
+        self._notify('hello')
+
+        self.assertEqual(push_pending(), 1)
+        message = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(message['type'], 'send_notification')
+        self.assertEqual(message['notification']['message_en'], 'hello')
+        self.assertIsNotNone(Notification.objects.get().pushed_at)
+        self.assertEqual(push_pending(), 0)
+
+    def test_failed_push_stays_pending(self):
+        self._notify('hello')
+        channel_layer = get_channel_layer()
+        with mock.patch.object(channel_layer, 'group_send', side_effect=ConnectionError):
+            self.assertEqual(push_pending(), 0)
+        self.assertIsNone(Notification.objects.get().pushed_at)
+        self.assertEqual(push_pending(), 1)
+
+    def test_command_drains_in_batches(self):
+        for i in range(5):
+            self._notify(f'n{i}')
+        out = StringIO()
+        call_command('push_notifications', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Pushed 5 notifications', out.getvalue())
+        self.assertFalse(Notification.objects.filter(pushed_at__isnull=True).exists())
+
+
+class NotificationConsumerTests(TransactionTestCase):
+    def test_receives_unread_count_and_pushed_notifications(self):
+        user = make_user('ws')
+        Notification.objects.create(user=user, notification_type='system_alert',
+                                    message_ar='قديم', message_en='old', pushed_at=timezone.now())
+
+        async def scenario():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'count': 1})
+
+            await database_sync_to_async(notify)(user, 'system_alert', 'جديد', 'new')
+            await database_sync_to_async(push_pending)()
+            event = await communicator.receive_json_from()
+            self.assertEqual(event['type'], 'notification')
+            self.assertEqual(event['notification']['message_en'], 'new')
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_anonymous_connection_is_rejected(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        async def scenario():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = AnonymousUser()
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+
+# Set to a real Redis URL to also run the fan-out test over the default
+# (channels_redis.core) layer; the pub/sub layer always runs against the
+# in-repo stand-in (notifications.tests.redis_standin)
+FANOUT_REDIS_URL = os.environ.get('CHANNEL_LAYERS_TEST_REDIS_URL')
+
+PUBLISHER = """
+import django, sys
+django.setup()
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+async_to_sync(get_channel_layer().group_send)(sys.argv[1], {
+    'type': 'send_notification',
+    'notification': {'message_en': 'from another worker'},
+})
+"""
+
+
+class ChannelLayerFanOutTests(TransactionTestCase):
+    """A group_send from another process reaches a socket held by this one."""
+
+    def _fan_out(self, backend, url):
+        user = make_user('fanout')
+        prefix = f'store2-test-{os.getpid()}'
+        layers = {'default': {'BACKEND': backend, 'CONFIG': {'hosts': [url], 'prefix': prefix}}}
+
+        async def scenario():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()  # unread count
+
+            # a separate interpreter stands in for another ASGI worker
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE='Store2.settings', CHANNEL_REDIS_URL=url,
+                       CHANNEL_LAYER_BACKEND=backend, CHANNEL_LAYER_PREFIX=prefix)
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', PUBLISHER, f'notifications_{user.id}', env=env, cwd=settings.BASE_DIR)
+            self.assertEqual(await asyncio.wait_for(process.wait(), 30), 0)
+
+            event = await communicator.receive_json_from(timeout=5)
+            self.assertEqual(event['notification']['message_en'], 'from another worker')
+            await communicator.disconnect()
+
+        with override_settings(CHANNEL_LAYERS=layers):
+            async_to_sync(scenario)()
+
+    def test_pubsub_layer_fans_out_across_processes(self):
+        server = subprocess.Popen([sys.executable, '-m', 'notifications.tests.redis_standin'],
+                                  stdout=subprocess.PIPE, cwd=settings.BASE_DIR, text=True)
+        self.addCleanup(server.wait, 10)
+        self.addCleanup(server.kill)
+        port = int(server.stdout.readline())
+        self._fan_out('channels_redis.pubsub.RedisPubSubChannelLayer', f'redis://127.0.0.1:{port}/0')
+
+    @unittest.skipUnless(FANOUT_REDIS_URL, 'set CHANNEL_LAYERS_TEST_REDIS_URL to a Redis server')
+    def test_core_layer_fans_out_across_processes(self):
+        self._fan_out('channels_redis.core.RedisChannelLayer', FANOUT_REDIS_URL)
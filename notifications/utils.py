@@ -1,5 +1,6 @@
 from django.contrib.contenttypes.models import ContentType
 from notifications.models import Notification
+from notifications.outbox import notify
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from .serializers import NotificationSerializer
@@ -48,7 +49,7 @@ def send_order_notification(user, order, notification_type):
         }
     }
     
-    Notification.objects.create(
+    notify(
         user=user,
         notification_type=notification_type,
         message_ar=messages[notification_type]['ar'],
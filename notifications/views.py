@@ -9,8 +9,9 @@ from .models import Notification
 from .serializers import NotificationSerializer
 from django.utils import timezone
 from django.db.models import Q
+from products.pagination import CursorModeMixin
 
-class NotificationPagination(PageNumberPagination):
+class NotificationPagination(CursorModeMixin, PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -19,6 +20,7 @@ class NotificationListView(APIView):
     """
     List all notifications for the authenticated user with pagination
     Supports filtering by read/unread status and notification type
+    Pass ?cursor= for keyset pagination (no OFFSET / COUNT on long histories)
     """
     permission_classes = [IsAuthenticated]
     pagination_class = NotificationPagination
@@ -30,7 +32,7 @@ class NotificationListView(APIView):
         page_size = request.query_params.get('page_size', 20)
         
         # Base queryset
-        notifications = request.user.user_notifications.all().order_by('-created_at')
+        notifications = request.user.user_notifications.all().order_by('-created_at', '-id')
         
         # Apply filters
         if is_read is not None:
@@ -0,0 +1,25 @@
+# orders/management/commands/complete_due_orders.py
+from django.core.management.base import BaseCommand
+
+from orders.services import SettlementService
+
+class Command(BaseCommand):
+    help = 'Completes delivered orders past the refund window, settling sellers in batched chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SettlementService.CHUNK_SIZE)
+        parser.add_argument('--limit', type=int, default=None, help='Settle at most this many orders')
+
+    def handle(self, *args, **options):
+        report = SettlementService.settle_due_orders(
+            chunk_size=options['chunk_size'], limit=options['limit'],
+        )
+
+        for failure in report['failed_chunks']:
+            self.stderr.write(f"Order {failure['order_ids'][0]} failed: {failure['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Completed {report['orders_completed']} orders in {report['chunks']} chunks "
+            f"({report['elapsed_seconds']}s, {report['orders_per_second']} orders/sec); "
+            f"skipped {report['orders_skipped']}, failed {report['orders_failed']}"
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:51
+
+from django.conf import settings
+import math
+
+from django.db import migrations, models
+
+# delivery.dispatch.CELL_DEGREES at the time of this migration
+CELL_DEGREES = 0.05
+
+
+def backfill_dispatch_cells(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    orders = list(Order.objects.filter(shipping_latitude__isnull=False, shipping_longitude__isnull=False)
+                  .only('pk', 'shipping_latitude', 'shipping_longitude'))
+    for order in orders:
+        order.dispatch_cell_y = math.floor(float(order.shipping_latitude) / CELL_DEGREES)
+        order.dispatch_cell_x = math.floor(float(order.shipping_longitude) / CELL_DEGREES)
+    Order.objects.bulk_update(orders, ['dispatch_cell_y', 'dispatch_cell_x'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_assigned_at_order_assigned_delivery_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='dispatch_cell_x',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='dispatch_cell_y',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('assigned_delivery__isnull', True), ('status', 'created')), fields=['dispatch_cell_y', 'dispatch_cell_x'], name='order_dispatch_cell_idx'),
+        ),
+        migrations.RunPython(backfill_dispatch_cells, migrations.RunPython.noop),
+    ]
@@ -48,6 +48,9 @@ class Order(models.Model):
         related_name='assigned_orders'
     )
     assigned_at = models.DateTimeField(null=True, blank=True)
+    # dispatch grid cell of the shipping coordinates (see delivery.dispatch)
+    dispatch_cell_y = models.IntegerField(null=True, blank=True, editable=False)
+    dispatch_cell_x = models.IntegerField(null=True, blank=True, editable=False)
 
     # convenience
     @property
@@ -56,6 +59,14 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # claimable orders only: the courier dispatch queue
+            models.Index(
+                fields=['dispatch_cell_y', 'dispatch_cell_x'],
+                name='order_dispatch_cell_idx',
+                condition=models.Q(status='created', assigned_delivery__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return f"Order #{self.order_number} - {self.buyer.username}"
@@ -1,5 +1,10 @@
 # orders/services.py
+import time
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Q, Value, When
 from django.utils import timezone
 from decimal import Decimal
 from itertools import groupby
@@ -8,9 +13,13 @@ from notifications.utils import send_order_notification
 
 # Import models from other apps
 from products.models import Cart, CartItem, Product
-from accounts.models import User
+from accounts.authentication import invalidate_sessions
+from accounts.models import Role, User
+from analytics.rollups import record_completed_orders
+from wallet.ledger import LedgerWriter
 from wallet.models import Wallet, Transaction
 from notifications.models import Notification
+from notifications.outbox import notify_many
 from decimal import Decimal, ROUND_HALF_UP
 from itertools import groupby
 from operator import attrgetter
@@ -29,6 +38,10 @@ MAX_FEE = (Decimal(settings.PLATFORM_MAX_FEE)
 POINTS_PER_CURRENCY_UNIT = Decimal(getattr(settings, 'POINTS_PER_CURRENCY_UNIT', '10.00'))
 
 
+class StockChangedError(ValueError):
+    """A concurrent checkout took the stock first; the checkout may be retried."""
+
+
 class CheckoutService:
     @classmethod
     def process_checkout(cls, user, delivery_fee=Decimal('0.00')):
@@ -44,11 +57,22 @@ class CheckoutService:
             wallet = Wallet.objects.select_for_update().get(user=user)
             
             # Calculate total (products + delivery fee)
-            cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-            if not cart_items.exists():
+            cart_items = list(CartItem.objects.filter(cart=cart).order_by('pk'))
+            if not cart_items:
                 raise ValueError("Cart has no items")
-            
-            # Validate stock and availability
+
+            # Lock every product up front, in id order, so concurrent
+            # checkouts sharing products always queue in the same order
+            products = {
+                product.pk: product
+                for product in Product.objects.select_for_update()
+                .filter(pk__in={item.product_id for item in cart_items})
+                .order_by('pk')
+            }
+            for item in cart_items:
+                item.product = products[item.product_id]
+
+            # Validate stock and availability (against the locked rows)
             for item in cart_items:
                 if item.product.quantity < item.quantity:
                     raise ValueError(
@@ -94,62 +118,79 @@ class CheckoutService:
                 transaction_type='escrow_hold',  # Use string value directly
                 description=f"Escrow hold for Order #{order.order_number}",
                 reference=f"ESCROW_HOLD_{order.order_number}",
-                is_successful=True
+                is_successful=True,
+                balance_delta=-total_amount,
+                held_delta=total_amount,
             )
             
-            # Create order items
-            for item in cart_items:
-                OrderItem.objects.create(
+            # Create order items (bulk_create skips OrderItem.save, so set total_price here)
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
                     product=item.product,
-                    seller=item.product.seller,
+                    seller_id=item.product.seller_id,
                     quantity=item.quantity,
                     price_at_purchase=item.product.current_price,
                     total_price=Decimal(item.product.current_price) * item.quantity
                 )
-                
-                # Update product quantities
-                product = Product.objects.select_for_update().get(pk=item.product.pk)
-                old_quantity = product.quantity
-                product.quantity -= item.quantity
-                product.save()
+                for item in cart_items
+            ])
 
-                from products.utils import reconcile_carts_for_product
-                reconcile_carts_for_product(product)
-
-                LOW_STOCK_THRESHOLD = 5
-                if product.quantity <= LOW_STOCK_THRESHOLD and old_quantity > LOW_STOCK_THRESHOLD:
-                    Notification.objects.create(
-                        user=product.seller,
-                        notification_type='low_stock',
-                        message_ar=f"انخفض مخزون منتجك ({product.name_ar}) إلى {product.quantity}. يرجى إعادة التعبئة.",
-                        message_en=f"Your product ({product.name_en}) stock is low: {product.quantity} left. Please restock.",
-                        content_object=product,
-                    )
+            cls._decrement_stock(cart_items)
+
+            # Clamp/remove these products in other carts
+            from products.utils import reconcile_carts_for_products
+            reconcile_carts_for_products(products.values())
+
+            cls._notify_low_stock(cart_items)
 
             # Clear the cart
-            cart_items.delete()
+            CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
             send_order_notification(user, order, 'order_created')
             return order
 
+    LOW_STOCK_THRESHOLD = 5
+
     @classmethod
-    def complete_order(cls, order_id):
-        # helpers / config
-        def _to_dec(x): return Decimal(str(x))
-        FEE_RATE = Decimal(getattr(settings, 'PLATFORM_FEE_RATE', '0.04'))
-        MIN_FEE = Decimal(getattr(settings, 'PLATFORM_MIN_FEE', '0.00'))
-        MAX_FEE = (Decimal(settings.PLATFORM_MAX_FEE)
-                    if getattr(settings, 'PLATFORM_MAX_FEE', None) else None)
-        POINTS_PER_CURRENCY_UNIT = Decimal(getattr(settings, 'POINTS_PER_CURRENCY_UNIT', '10.00'))
-
-        def _calc_fee(amount: Decimal) -> Decimal:
-            fee = (amount * FEE_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            if MIN_FEE:
-                fee = max(fee, MIN_FEE)
-            if MAX_FEE is not None:
-                fee = min(fee, MAX_FEE)
-            return fee
+    def _decrement_stock(cls, cart_items):
+        """
+        Take stock for all lines with one conditional UPDATE. Each row only
+        matches while it still has enough quantity, so a short count means
+        someone else took the stock and the whole checkout rolls back.
+        """
+        guard = Q(pk__in=[])
+        whens = []
+        for item in cart_items:
+            guard |= Q(pk=item.product_id, quantity__gte=item.quantity)
+            whens.append(When(pk=item.product_id, then=F('quantity') - item.quantity))
+
+        updated = Product.objects.filter(guard).update(
+            quantity=Case(*whens, output_field=IntegerField()),
+            updated_at=timezone.now(),
+        )
+        if updated != len(cart_items):
+            raise StockChangedError("Stock changed during checkout, please try again.")
+
+        for item in cart_items:
+            item.product.quantity -= item.quantity
 
+    @classmethod
+    def _notify_low_stock(cls, cart_items):
+        notify_many([
+            Notification(
+                user_id=product.seller_id,
+                notification_type='low_stock',
+                message_ar=f"انخفض مخزون منتجك ({product.name_ar}) إلى {product.quantity}. يرجى إعادة التعبئة.",
+                message_en=f"Your product ({product.name_en}) stock is low: {product.quantity} left. Please restock.",
+                content_object=product,
+            )
+            for product, old_quantity in ((item.product, item.product.quantity + item.quantity)
+                                          for item in cart_items)
+            if product.quantity <= cls.LOW_STOCK_THRESHOLD < old_quantity
+        ])
+
+    @classmethod
+    def complete_order(cls, order_id):
         with transaction.atomic():
             order = Order.objects.select_for_update().get(pk=order_id)
 
@@ -161,111 +202,244 @@ class CheckoutService:
             if timezone.now() < order.delivered_at + timezone.timedelta(days=3):
                 raise ValueError("Refund window still active (3 days after delivery)")
 
-            # Release buyer escrow "held" (bookkeeping)
-            buyer_wallet = Wallet.objects.select_for_update().get(user=order.buyer)
-            buyer_wallet.held_balance -= order.total_amount
-            buyer_wallet.save()
+            SettlementService.settle_chunk([order.pk])
+            order.refresh_from_db()
+            return order
 
-            Transaction.objects.create(
-                wallet=buyer_wallet,
+
+class SettlementService:
+    """
+    Completes delivered orders whose refund window has passed, many at a
+    time: escrow release, seller payouts, platform fees, seller points and
+    notifications for a whole chunk are written with a handful of bulk
+    statements. Each chunk is its own transaction; a failing chunk is
+    reported and the run carries on with the next one.
+    """
+    REFUND_WINDOW_DAYS = 3
+    CHUNK_SIZE = 100
+
+    @classmethod
+    def due_orders(cls, now=None):
+        now = now or timezone.now()
+        return Order.objects.filter(
+            status=OrderStatus.DELIVERED,
+            delivered_at__lte=now - timezone.timedelta(days=cls.REFUND_WINDOW_DAYS),
+        )
+
+    @classmethod
+    def settle_due_orders(cls, chunk_size=None, limit=None):
+        order_ids = cls.due_orders().order_by('pk').values_list('pk', flat=True)
+        if limit:
+            order_ids = order_ids[:limit]
+        return cls.settle_orders(list(order_ids), chunk_size=chunk_size)
+
+    @classmethod
+    def settle_orders(cls, order_ids, chunk_size=None):
+        """Settle the given orders chunk by chunk and return a run report."""
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        report = {
+            'orders_completed': 0,
+            'orders_skipped': 0,
+            'orders_failed': 0,
+            'chunks': 0,
+            'failed_chunks': [],
+        }
+        started = time.monotonic()
+
+        for start in range(0, len(order_ids), chunk_size):
+            report['chunks'] += 1
+            cls._settle_isolating(order_ids[start:start + chunk_size], report)
+
+        elapsed = time.monotonic() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['orders_per_second'] = round(report['orders_completed'] / elapsed, 2) if elapsed else None
+        return report
+
+    @classmethod
+    def _settle_isolating(cls, chunk, report):
+        """
+        Settle a chunk in one transaction. If it fails, bisect it and retry
+        the halves so only the orders that cannot settle are reported;
+        otherwise the same bad order would hold back its whole chunk on
+        every run.
+        """
+        try:
+            with transaction.atomic():
+                completed = cls.settle_chunk(chunk)
+        except Exception as e:
+            if len(chunk) > 1:
+                middle = len(chunk) // 2
+                cls._settle_isolating(chunk[:middle], report)
+                cls._settle_isolating(chunk[middle:], report)
+                return
+            report['orders_failed'] += 1
+            report['failed_chunks'].append({'order_ids': chunk, 'error': f"{type(e).__name__}: {e}"})
+            return
+        report['orders_completed'] += len(completed)
+        report['orders_skipped'] += len(chunk) - len(completed)
+
+    @classmethod
+    def _platform_fee(cls, amount):
+        fee = (amount * FEE_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        if MIN_FEE:
+            fee = max(fee, MIN_FEE)
+        if MAX_FEE is not None:
+            fee = min(fee, MAX_FEE)
+        return fee
+
+    @classmethod
+    def settle_chunk(cls, order_ids):
+        """
+        Complete the due orders among order_ids (must run inside a
+        transaction). Orders that are no longer due are skipped.
+        Returns the completed orders.
+        """
+        now = timezone.now()
+        orders = list(
+            cls.due_orders(now).select_for_update()
+            .filter(pk__in=order_ids)
+            .order_by('pk')
+        )
+        if not orders:
+            return []
+
+        # order_id -> {seller_id: gross}
+        gross_by_order = defaultdict(dict)
+        for order_id, seller_id, total_price in (OrderItem.objects
+                                                 .filter(order__in=orders)
+                                                 .order_by('order_id', 'seller_id')
+                                                 .values_list('order_id', 'seller_id', 'total_price')):
+            sellers = gross_by_order[order_id]
+            sellers[seller_id] = sellers.get(seller_id, Decimal('0.00')) + Decimal(str(total_price))
+
+        platform_user_id = getattr(settings, 'PLATFORM_WALLET_USER_ID', None)
+        order_type = ContentType.objects.get_for_model(Order)
+        ledger = LedgerWriter()
+        notifications = []
+        points = {}
+
+        for order in orders:
+            # Release buyer escrow "held" (bookkeeping)
+            ledger.post(
+                order.buyer_id,
                 amount=order.total_amount,  # ledger-only release; balance unchanged
                 transaction_type=Transaction.TransactionType.ESCROW_RELEASE,
                 description=f"Escrow release for Order #{order.order_number}",
                 reference=f"ESCROW_RELEASE_{order.order_number}",
-                is_successful=True
+                held_delta=-order.total_amount,
             )
 
-            # Platform wallet (to collect fees)
-            platform_wallet = None
-            platform_user_id = getattr(settings, 'PLATFORM_WALLET_USER_ID', None)
-            if platform_user_id:
-                platform_wallet = Wallet.objects.select_for_update().get(user_id=platform_user_id)
-
-            # Group items by seller once
-            items_by_seller = groupby(
-                sorted(order.items.all(), key=attrgetter('seller')),
-                key=attrgetter('seller')
-            )
-
-            for seller, items in items_by_seller:
-                items = list(items)
-                gross = sum(_to_dec(i.total_price) for i in items)
-
-                fee = _calc_fee(gross)
+            for seller_id, gross in gross_by_order[order.pk].items():
+                fee = cls._platform_fee(gross)
                 net = (gross - fee).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
                 # Pay seller NET
-                seller_wallet = Wallet.objects.select_for_update().get(user=seller)
-                seller_wallet.balance += net
-                seller_wallet.save()
-
-                Transaction.objects.create(
-                    wallet=seller_wallet,
+                ledger.post(
+                    seller_id,
                     amount=net,
                     transaction_type=Transaction.TransactionType.PAYMENT,
                     description=f"Payout for Order #{order.order_number} (after {int(FEE_RATE*100)}% fee)",
                     reference=f"ORDER_PAY_NET_{order.order_number}",
-                    is_successful=True
+                    balance_delta=net,
                 )
 
                 # Platform commission (FEE)
-                if platform_wallet and fee > 0:
-                    platform_wallet.balance += fee
-                    platform_wallet.save()
-                    Transaction.objects.create(
-                        wallet=platform_wallet,
+                if platform_user_id and fee > 0:
+                    ledger.post(
+                        platform_user_id,
                         amount=fee,
                         transaction_type=Transaction.TransactionType.FEE,
-                        description=f"Commission from Order #{order.order_number} (seller {seller.id})",
+                        description=f"Commission from Order #{order.order_number} (seller {seller_id})",
                         reference=f"ORDER_FEE_{order.order_number}",
-                        is_successful=True
+                        balance_delta=fee,
                     )
 
                 # Award points on NET (e.g., 1 point per 10.00)
                 pts = int((net / POINTS_PER_CURRENCY_UNIT)
-                            .to_integral_value(rounding=ROUND_HALF_UP))
-                if pts > 0 and hasattr(seller, "add_seller_points"):
-                    before = getattr(seller, "points", 0)
-                    seller.add_seller_points(pts)
-                    after = getattr(seller, "points", before + pts)
-
-                    # Optional: verification threshold notification
-                    threshold = getattr(seller, "VERIFICATION_THRESHOLD", 500)
-                    if (not getattr(seller, "is_verified_seller", False)) and before < threshold <= after:
-                        Notification.objects.create(
-                            user=seller,
-                            notification_type='seller_verified',
-                            message_ar='لقد أصبحت بائعًا موثقًا! تهانينا.',
-                            message_en='You are now a verified seller! Congratulations.',
-                            content_object=seller
-                        )
+                          .to_integral_value(rounding=ROUND_HALF_UP))
+                if pts > 0:
+                    points[seller_id] = points.get(seller_id, 0) + pts
 
                 # Notify seller (gross/fee/net)
-                Notification.objects.create(
-                    user=seller,
+                notifications.append(Notification(
+                    user_id=seller_id,
                     notification_type='seller_payment',
                     message_ar=(f"تم إكمال الطلب {order.order_number}. مجموعك {gross}، "
                                 f"العمولة {fee}، الصافي {net} أُضيف لمحفظتك."),
                     message_en=(f"Order {order.order_number} completed. Gross {gross}, "
                                 f"fee {fee}, net {net} added to your wallet."),
-                    content_object=order
-                )
-
-            # Finalize order
-            order.status = OrderStatus.COMPLETED
-            order.completed_at = timezone.now()
-            order.save()
+                    content_type=order_type,
+                    object_id=order.pk,
+                ))
 
-            Notification.objects.create(
-                user=order.buyer,
+            notifications.append(Notification(
+                user_id=order.buyer_id,
                 notification_type='order_completed',
                 message_ar=f"تم إكمال طلبك رقم {order.order_number}. شكراً لتسوقك معنا.",
                 message_en=f"Your order #{order.order_number} has been completed. Thank you for shopping with us!",
-                content_object=order
-            )
+                content_type=order_type,
+                object_id=order.pk,
+            ))
 
-            return order
+        ledger.flush()
+        notifications.extend(cls._award_points(points))
 
+        # Finalize orders
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            status=OrderStatus.COMPLETED, completed_at=now, updated_at=now,
+        )
+        record_completed_orders(orders, now)
+        notify_many(notifications)
+        return orders
+
+    @classmethod
+    def _award_points(cls, points):
+        """
+        Add points to many sellers with one UPDATE (what User.add_seller_points
+        does one row at a time). Returns verification notifications for
+        sellers who crossed the threshold.
+        """
+        if not points:
+            return []
+        threshold = User.VERIFICATION_THRESHOLD
+        sellers = (User.objects.select_for_update()
+                   .filter(pk__in=points, role=Role.SELLER)
+                   .order_by('pk')
+                   .values_list('pk', 'points', 'is_verified_seller'))
+        seller_ids, newly_verified, whens = [], [], []
+        for pk, current, verified in sellers:
+            seller_ids.append(pk)
+            whens.append(When(pk=pk, then=Value(points[pk])))
+            if not verified and current + points[pk] >= threshold:
+                newly_verified.append(pk)
+        if not seller_ids:
+            return []
+
+        User.objects.filter(pk__in=seller_ids).update(
+            points=F('points') + Case(*whens, default=Value(0), output_field=IntegerField()),
+            is_verified_seller=Case(
+                When(pk__in=newly_verified, then=Value(True)),
+                default=F('is_verified_seller'),
+                output_field=BooleanField(),
+            ),
+        )
+        # .update() skips post_save, so drop the cached session snapshots
+        # (as accounts.signals does) or they would serve the old points
+        invalidate_sessions(seller_ids)
+        transaction.on_commit(lambda: invalidate_sessions(seller_ids))
+
+        user_type = ContentType.objects.get_for_model(User)
+        return [
+            Notification(
+                user_id=pk,
+                notification_type='seller_verified',
+                message_ar='لقد أصبحت بائعًا موثقًا! تهانينا.',
+                message_en='You are now a verified seller! Congratulations.',
+                content_type=user_type,
+                object_id=pk,
+            )
+            for pk in newly_verified
+        ]
 
 
 class OrderService:
@@ -297,7 +471,9 @@ class OrderService:
                 transaction_type=Transaction.TransactionType.REFUND,
                 description=f"Order cancellation (10% penalty + delivery fee kept)",
                 reference=f"ORDER_CANCEL_{order.order_number}",
-                is_successful=True
+                is_successful=True,
+                balance_delta=refund_amount,
+                held_delta=-order.total_amount,
             )
             
             # Restock products
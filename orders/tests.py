@@ -1,3 +1,227 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import Role, User
+from notifications.models import Notification
+from products.models import Cart, CartItem, Category, Product
+from wallet.models import Wallet
+
+from .models import Order, OrderItem, OrderStatus
+from .services import CheckoutService, SettlementService
+
+
+class CheckoutServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', password='pass', username='seller',
+            first_name='S', last_name='S', role=Role.SELLER,
+        )
+        cls.category = Category.objects.create(name_ar='فئة', name_en='Category')
+
+    def setUp(self):
+        self.buyer = self._buyer('buyer')
+
+    def _buyer(self, name):
+        user = User.objects.create_user(
+            email=f'{name}@example.com', password='pass', username=name,
+            first_name='B', last_name='B',
+        )
+        user.profile.latitude, user.profile.longitude = Decimal('24.7'), Decimal('46.7')
+        user.profile.save()
+        Wallet.objects.filter(user=user).update(balance=Decimal('100000'))
+        Cart.objects.create(user=user)
+        return user
+
+    def _product(self, quantity=10, price='10.00'):
+        return Product.objects.create(
+            seller=self.seller, category=self.category, name_en='Item',
+            price=Decimal(price), quantity=quantity, is_approved=True, status='approved',
+        )
+
+    def _add(self, user, product, quantity):
+        CartItem.objects.create(cart=user.cart, product=product, quantity=quantity)
+
+    def _queries_for_cart(self, lines):
+        buyer = self._buyer(f'buyer{lines}')
+        for _ in range(lines):
+            self._add(buyer, self._product(), 2)
+        buyer = User.objects.get(pk=buyer.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            CheckoutService.process_checkout(buyer)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        self.assertEqual(self._queries_for_cart(3), self._queries_for_cart(30))
+
+    def test_checkout_takes_stock_and_reconciles_other_carts(self):
+        low = self._product(quantity=6)
+        gone = self._product(quantity=2, price='5.00')
+        self._add(self.buyer, low, 2)
+        self._add(self.buyer, gone, 2)
+
+        other = self._buyer('other')
+        self._add(other, low, 4)
+        self._add(other, gone, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = CheckoutService.process_checkout(self.buyer)
+
+        self.assertEqual(order.total_amount, Decimal('30.00'))
+        self.assertEqual(
+            sorted(OrderItem.objects.filter(order=order).values_list('product_id', 'total_price')),
+            [(low.pk, Decimal('20.00')), (gone.pk, Decimal('10.00'))],
+        )
+        low.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual((low.quantity, gone.quantity), (4, 0))
+
+        self.assertFalse(CartItem.objects.filter(cart=self.buyer.cart).exists())
+        self.assertEqual(list(CartItem.objects.filter(cart=other.cart).values_list('product_id', 'quantity')),
+                         [(low.pk, 4)])
+        self.assertEqual(Notification.objects.filter(user=other, notification_type='system_alert').count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.seller, notification_type='low_stock').count(), 1)
+
+    def test_insufficient_stock_rolls_back(self):
+        product = self._product(quantity=2)
+        self._add(self.buyer, product, 2)
+        Product.objects.filter(pk=product.pk).update(quantity=1)  # sold elsewhere meanwhile
+
+        with self.assertRaisesMessage(ValueError, 'Not enough stock'):
+            CheckoutService.process_checkout(self.buyer)
+
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 1)
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_checkout_retry_with_idempotency_key_returns_the_same_order(self):
+        self._add(self.buyer, self._product(), 2)
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = client.post('/api/orders/checkout/', secure=True, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        # the cart is empty now, so without the key the retry would fail
+        retry = client.post('/api/orders/checkout/', secure=True, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data['order_number'], first.data['order_number'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(buyer=self.buyer).count(), 1)
+
+
+class SettlementServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.platform = User.objects.create_user(
+            email='platform@example.com', password='pass', username='platform',
+            first_name='P', last_name='P',
+        )
+        cls.buyer = User.objects.create_user(
+            email='buyer@example.com', password='pass', username='buyer',
+            first_name='B', last_name='B',
+        )
+        cls.sellers = [
+            User.objects.create_user(
+                email=f'seller{i}@example.com', password='pass', username=f'seller{i}',
+                first_name='S', last_name='S', role=Role.SELLER,
+            )
+            for i in range(2)
+        ]
+        category = Category.objects.create(name_ar='فئة', name_en='Category')
+        cls.products = [
+            Product.objects.create(seller=seller, category=category, name_en='Item',
+                                   price=Decimal('100.00'), quantity=100, is_approved=True)
+            for seller in cls.sellers
+        ]
+
+    def _order(self, delivered_days_ago=4):
+        order = Order.objects.create(
+            buyer=self.buyer, total_amount=Decimal('300.00'), status=OrderStatus.DELIVERED,
+            delivered_at=timezone.now() - timezone.timedelta(days=delivered_days_ago),
+        )
+        for product, quantity in zip(self.products, (1, 2)):
+            OrderItem.objects.create(order=order, product=product, seller=product.seller,
+                                     quantity=quantity, price_at_purchase=product.price)
+        Wallet.objects.filter(user=self.buyer).update(held_balance=F('held_balance') + order.total_amount)
+        return order
+
+    def _wallet(self, user):
+        return Wallet.objects.get(user=user)
+
+    def test_settles_due_orders_in_chunks(self):
+        orders = [self._order() for _ in range(5)]
+        not_due = self._order(delivered_days_ago=1)
+
+        with override_settings(PLATFORM_WALLET_USER_ID=self.platform.pk), \
+                self.captureOnCommitCallbacks(execute=True):
+            report = SettlementService.settle_due_orders(chunk_size=2)
+
+        self.assertEqual((report['orders_completed'], report['chunks'], report['failed_chunks']), (5, 3, []))
+        self.assertIsNotNone(report['orders_per_second'])
+        self.assertEqual(Order.objects.filter(status=OrderStatus.COMPLETED).count(), 5)
+        not_due.refresh_from_db()
+        self.assertEqual(not_due.status, OrderStatus.DELIVERED)
+
+        # 4% fee: 100 -> 96 net, 200 -> 192 net, per order
+        self.assertEqual(self._wallet(self.sellers[0]).balance, Decimal('480.00'))
+        self.assertEqual(self._wallet(self.sellers[1]).balance, Decimal('960.00'))
+        self.assertEqual(self._wallet(self.platform).balance, Decimal('60.00'))
+        self.assertEqual(self._wallet(self.buyer).held_balance, not_due.total_amount)
+
+        self.sellers[1].refresh_from_db()
+        self.assertEqual(self.sellers[1].points, 5 * 19)
+        self.assertEqual(
+            Notification.objects.filter(notification_type='seller_payment').count(), 10)
+        self.assertEqual(
+            Notification.objects.filter(user=self.buyer, notification_type='order_completed').count(), 5)
+        self.assertEqual(orders[0].items.count(), 2)
+
+    def test_failed_chunk_does_not_abort_run(self):
+        first = self._order()
+        second = self._order()
+        # Only the first order pays seller0, whose wallet is gone
+        OrderItem.objects.filter(order=second).update(seller=self.sellers[1])
+        Wallet.objects.filter(user=self.sellers[0]).delete()
+
+        with override_settings(PLATFORM_WALLET_USER_ID=self.platform.pk):
+            report = SettlementService.settle_orders([first.pk, second.pk], chunk_size=1)
+
+        self.assertEqual(report['orders_completed'], 1)
+        self.assertEqual(report['failed_chunks'][0]['order_ids'], [first.pk])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), (OrderStatus.DELIVERED, OrderStatus.COMPLETED))
+
+    def test_unsettleable_order_does_not_hold_back_its_chunk(self):
+        orders = [self._order() for _ in range(5)]
+        bad = orders[2]
+        # only the bad order pays seller0, whose wallet is gone
+        OrderItem.objects.exclude(order=bad).update(seller=self.sellers[1])
+        Wallet.objects.filter(user=self.sellers[0]).delete()
+
+        with override_settings(PLATFORM_WALLET_USER_ID=self.platform.pk):
+            report = SettlementService.settle_orders([order.pk for order in orders], chunk_size=100)
+
+        self.assertEqual((report['chunks'], report['orders_completed'], report['orders_failed']), (1, 4, 1))
+        self.assertEqual([failure['order_ids'] for failure in report['failed_chunks']], [[bad.pk]])
+        self.assertIn('DoesNotExist', report['failed_chunks'][0]['error'])
+        self.assertEqual(
+            list(Order.objects.exclude(status=OrderStatus.COMPLETED).values_list('pk', flat=True)), [bad.pk])
+
+    def test_complete_order_keeps_preconditions(self):
+        order = self._order(delivered_days_ago=1)
+        with self.assertRaisesMessage(ValueError, 'Refund window still active'):
+            CheckoutService.complete_order(order.pk)
+
+        order = self._order()
+        with override_settings(PLATFORM_WALLET_USER_ID=self.platform.pk):
+            completed = CheckoutService.complete_order(order.pk)
+        self.assertEqual(completed.status, OrderStatus.COMPLETED)
+        self.assertIsNotNone(completed.completed_at)
@@ -10,6 +10,8 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from decimal import Decimal
 from rest_framework.decorators import api_view, permission_classes
 from notifications.utils import send_order_notification
+from analytics.export import ExportMixin, export_response
+from wallet.idempotency import idempotent
 
 # Import models
 from products.models import Cart, CartItem, Product
@@ -18,7 +20,7 @@ from wallet.models import Wallet, Transaction
 from .models import Order, OrderItem, OrderStatus, Refund
 
 # Import services
-from .services import CheckoutService, OrderService, RefundService
+from .services import CheckoutService, OrderService, RefundService, StockChangedError
 
 # Import serializers
 from .serializers import OrderSerializer,OrderDetailSerializer
@@ -33,6 +35,7 @@ def calculate_penalty(created_at):
         return Decimal('0.15')  # 15% penalty after 1 day
 
 class CheckoutView(APIView):
+    @idempotent('checkout')
     def post(self, request):
         user = request.user
         try:
@@ -49,6 +52,13 @@ class CheckoutView(APIView):
                     {"order_number": order.order_number},
                     status=status.HTTP_201_CREATED
                 )
+            except StockChangedError as e:
+                # a concurrent checkout took the stock; the client may retry
+                return Response(
+                    {"error": "Checkout error", "detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                    headers={'Retry-After': '1'},
+                )
             except ValueError as e:
                 return Response(
                     {"error": "Checkout error", "detail": str(e)},
@@ -72,11 +82,13 @@ class CheckoutView(APIView):
             )
 
 
-class OrderListView(generics.ListAPIView):
+class OrderListView(ExportMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status']
-    
+    export_columns = ['id', 'order_number', 'status', 'total_amount', 'delivery_fee',
+                      'created_at', 'delivered_at', 'completed_at', 'shipping_city', 'shipping_country']
+
     def get_queryset(self):
         return Order.objects.filter(
             buyer=self.request.user
@@ -86,6 +98,15 @@ class OrderListView(generics.ListAPIView):
             'items__seller'
         ).order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        fmt = self.export_format()
+        if fmt:
+            rows = (Order.objects.filter(buyer=request.user)
+                    .order_by('-created_at', '-id')
+                    .values_list(*self.export_columns))
+            return export_response(fmt, 'orders', self.export_columns, rows)
+        return super().list(request, *args, **kwargs)
+
 class OrderDetailView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -229,7 +250,9 @@ class CancelOrderView(APIView):
                     transaction_type=Transaction.TransactionType.REFUND,
                     description=f"Order cancellation ({penalty_percentage*100}% penalty + delivery fee kept)",
                     reference=f"ORDER_CANCEL_{order.order_number}",
-                    is_successful=True
+                    is_successful=True,
+                    balance_delta=refund_amount,
+                    held_delta=-order.total_amount,
                 )
                 
                 # Restock products
@@ -347,7 +370,9 @@ class ProcessRefundView(APIView):
                             transaction_type=Transaction.TransactionType.REFUND,
                             description=f"Refund for Order #{refund.order.order_number} (10% penalty applied)",
                             reference=f"REFUND_{refund.id}",
-                            is_successful=True
+                            is_successful=True,
+                            balance_delta=refund_amount,
+                            held_delta=-refund.order.total_amount,
                         )
                         
                         # Record penalty as platform income
@@ -363,7 +388,8 @@ class ProcessRefundView(APIView):
                             transaction_type=Transaction.TransactionType.PENALTY,
                             description=f"Penalty from refund Order #{refund.order.order_number}",
                             reference=f"PENALTY_{refund.id}",
-                            is_successful=True
+                            is_successful=True,
+                            balance_delta=penalty_amount,
                         )
                         
                         refund.amount = refund_amount  # Update with penalty deducted
@@ -0,0 +1,115 @@
+# products/category_tree.py
+"""
+Read-through cache for the category hierarchy.
+
+The whole tree (both languages, logo paths) is one small entry in Django's
+cache, so every worker shares it (locmem in tests, Redis when REDIS_URL is
+set). Entries are keyed by a generation number; a Category save/delete bumps
+the generation after commit (see products.signals) and the next read rebuilds
+the tree with a single query. Old generations simply expire.
+"""
+import time
+
+from django.core.cache import cache
+from rest_framework import serializers
+
+TREE_KEY = 'category_tree:v{generation}'
+GENERATION_KEY = 'category_tree:generation'
+HITS_KEY = 'category_tree:hits'
+MISSES_KEY = 'category_tree:misses'
+TREE_TIMEOUT = 60 * 60 * 24
+
+
+def _incr(key, start=1):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing key; add() loses the race gracefully if another worker set it
+        if cache.add(key, start, timeout=None):
+            return start
+        return cache.incr(key)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so an evicted counter never reuses an old tree key
+        cache.add(GENERATION_KEY, int(time.time()), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate_category_tree():
+    """Move to a new generation; the next read rebuilds the tree."""
+    get_generation()
+    return _incr(GENERATION_KEY)
+
+
+def build_category_tree():
+    """
+    Return [parent, ...] where each node is a dict with id, name_ar, name_en,
+    parent, logo (relative URL or None), created_at and children.
+    """
+    from .models import Category
+
+    created_at = serializers.DateTimeField()
+    nodes, roots = {}, []
+    for category in Category.objects.order_by('id'):
+        nodes[category.id] = {
+            'id': category.id,
+            'name_ar': category.name_ar,
+            'name_en': category.name_en,
+            'parent': category.parent_id,
+            'logo': category.logo.url if category.logo else None,
+            'created_at': created_at.to_representation(category.created_at),
+            'children': [],
+        }
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        if parent is not None:
+            parent['children'].append(node)
+        elif node['parent'] is None:
+            roots.append(node)
+    return roots
+
+
+def get_category_tree():
+    """Cached category tree; rebuilds on a miss."""
+    key = TREE_KEY.format(generation=get_generation())
+    tree = cache.get(key)
+    if tree is not None:
+        _incr(HITS_KEY)
+        return tree
+    _incr(MISSES_KEY)
+    tree = build_category_tree()
+    cache.set(key, tree, TREE_TIMEOUT)
+    return tree
+
+
+def find_category(tree, category_id):
+    """Look up a parent or child node by id, or None."""
+    for parent in tree:
+        if parent['id'] == category_id:
+            return parent
+        for child in parent['children']:
+            if child['id'] == category_id:
+                return child
+    return None
+
+
+def get_category_tree_stats():
+    generation = get_generation()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    lookups = hits + misses
+    return {
+        'generation': generation,
+        'cached': cache.get(TREE_KEY.format(generation=generation)) is not None,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+    }
+
+
+def reset_category_tree_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
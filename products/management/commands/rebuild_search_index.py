@@ -0,0 +1,30 @@
+# products/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from products.models import Product, ProductSearchDocument
+from products.search import index_products
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search documents (and with them the full-text index)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete all documents before rebuilding')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['clear']:
+            ProductSearchDocument.objects.all().delete()
+
+        total = 0
+        batch = []
+        for product in Product.objects.select_related('brand').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                total += index_products(batch)
+                batch = []
+        if batch:
+            total += index_products(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} products'))
@@ -0,0 +1,31 @@
+# products/management/commands/run_discount_scheduler.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.pricing import apply_discount_boundaries, next_discount_boundary
+
+class Command(BaseCommand):
+    help = 'Reprices products at sale / standalone discount start and end boundaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single tick and exit')
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help='Upper bound (seconds) between ticks, so new sales are picked up')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = apply_discount_boundaries()
+            if any(stats.values()):
+                self.stdout.write(self.style.SUCCESS(f'{timezone.now():%Y-%m-%d %H:%M:%S} {stats}'))
+
+            if options['once']:
+                return
+
+            # Sleep until the next known boundary, capped by --max-sleep
+            sleep_for = options['max_sleep']
+            next_at = next_discount_boundary()
+            if next_at is not None:
+                sleep_for = min(sleep_for, max(0.0, (next_at - timezone.now()).total_seconds()))
+            time.sleep(sleep_for)
@@ -0,0 +1,115 @@
+# Generated by Django 5.2.2 on 2026-10-16 22:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'products_search_fts'
+DOCUMENT_TABLE = 'products_productsearchdocument'
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, brand, body,
+        content='{DOCUMENT_TABLE}', content_rowid='product_id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, body)
+        VALUES (new.product_id, new.name, new.brand, new.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, body)
+        VALUES ('delete', old.product_id, old.name, old.brand, old.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, body)
+        VALUES ('delete', old.product_id, old.name, old.brand, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, body)
+        VALUES (new.product_id, new.name, new.brand, new.body);
+    END""",
+]
+SQLITE_DROP = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+POSTGRES_CREATE = [
+    f"""ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(brand, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(body, '')), 'C')
+        ) STORED""",
+    f'CREATE INDEX products_search_vector_gin ON {DOCUMENT_TABLE} USING GIN (search_vector)',
+]
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS products_search_vector_gin',
+    f'ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # SQLite builds without FTS5 fall back to BasicSearchBackend
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return
+        statements = SQLITE_CREATE
+    elif vendor == 'postgresql':
+        statements = POSTGRES_CREATE
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def backfill_documents(apps, schema_editor):
+    from products.search import build_document
+
+    Product = apps.get_model('products', 'Product')
+    ProductSearchDocument = apps.get_model('products', 'ProductSearchDocument')
+    batch = []
+    for product in Product.objects.select_related('brand').iterator(chunk_size=500):
+        batch.append(ProductSearchDocument(
+            product_id=product.pk,
+            **build_document(
+                product.name_ar, product.name_en,
+                product.description_ar, product.description_en,
+                product.brand.name if product.brand_id else '',
+            ),
+        ))
+        if len(batch) >= 500:
+            ProductSearchDocument.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ProductSearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_alter_producteditrequest_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='products.product')),
+                ('name', models.TextField(blank=True, default='')),
+                ('brand', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_pricing(apps, schema_editor):
+    from products.pricing import PRICING_FIELDS, resolve_pricing
+
+    Product = apps.get_model('products', 'Product')
+    ProductSale = apps.get_model('products', 'ProductSale')
+    now = timezone.now()
+
+    sales_by_product = {}
+    for sale in ProductSale.objects.select_related('sale_event'):
+        sales_by_product.setdefault(sale.product_id, []).append(sale)
+
+    products = list(Product.objects.all())
+    for product in products:
+        for field, value in resolve_pricing(product, sales_by_product.get(product.pk, []), now).items():
+            setattr(product, field, value)
+    Product.objects.bulk_update(products, PRICING_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_product_products_pr_created_3be21c_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='products_pr_price_dbec84_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='active_discount_pct',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_source',
+            field=models.CharField(choices=[('none', 'None'), ('standalone', 'Standalone'), ('sale', 'Sale')], default='none', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_recompute_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='products_pr_effecti_5873d8_idx'),
+        ),
+        migrations.RunPython(backfill_pricing, migrations.RunPython.noop),
+    ]
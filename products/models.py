@@ -4,11 +4,13 @@ from django.db import models
 from accounts.models import EmailVerification, Purpose, User, Role
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum, F  # Add these imports at the top
+from django.db.models import Sum, F, Count  # Add these imports at the top
 from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
+from .pricing import apply_pricing, PRICING_FIELDS, PRICING_INPUTS
 
 class BrandStatus(models.TextChoices):
     PENDING = 'pending', 'Pending'
@@ -69,6 +71,11 @@ class BrandBlock(models.Model):
     def __str__(self):
         return f"{self.user.email} blocked {self.brand.name}"
 
+class DiscountSource(models.TextChoices):
+    NONE = 'none', 'None'
+    STANDALONE = 'standalone', 'Standalone'
+    SALE = 'sale', 'Sale'
+
 class status(models.TextChoices):
     PENDING = 'pending'
     APPROVED = 'approved'
@@ -98,6 +105,22 @@ class Category(models.Model):
     def is_child(self):
         return self.parent is not None
 
+# Relations read by ProductLanguageSerializer for every listed product
+LISTING_SELECT_RELATED = ('category__parent', 'brand')
+LISTING_PREFETCH_RELATED = ('images',)
+
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Load everything a listing page renders in a fixed number of queries:
+        category/parent/brand are joined, images are prefetched and the
+        ratings count is read from the product's rating stats row.
+        """
+        return (self
+                .select_related(*LISTING_SELECT_RELATED)
+                .prefetch_related(*LISTING_PREFETCH_RELATED)
+                .annotate(ratings_count=Coalesce('rating_stats__rating_count', 0)))
+
 class Product(models.Model):
     seller = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(
@@ -169,72 +192,57 @@ class Product(models.Model):
     ('unsaleable', 'Unsaleable')
     ]
     condition = models.CharField(max_length=20, choices=CONDITION_CHOICES, default='new')
+
+    # Materialized by products.pricing; see apply_discount_boundaries()
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    active_discount_pct = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    discount_source = models.CharField(
+        max_length=20,
+        choices=DiscountSource.choices,
+        default=DiscountSource.NONE
+    )
+    price_recompute_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Keyset pagination walks (sort key, id) ranges; see products/pagination.py
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['effective_price', 'id']),
+            models.Index(fields=['rating', 'id']),
+        ]
+
+    def _fresh_pricing(self):
+        """
+        Recompute in memory if a discount boundary passed and the scheduler
+        has not caught up yet, so buyers never see a stale price.
+        """
+        if self.pk is None or (self.price_recompute_at is not None
+                               and self.price_recompute_at <= timezone.now()):
+            apply_pricing(self)
+        return self
+
     @property
     def current_price(self):
         """Returns either discounted price or regular price"""
-        now = timezone.now()
-        if (self.has_standalone_discount and 
-            self.standalone_discount_percentage and
-            (not self.standalone_discount_start or self.standalone_discount_start <= now) and
-            (not self.standalone_discount_end or now <= self.standalone_discount_end)):
-            return self.price * (100 - self.standalone_discount_percentage) / 100
-        return self.price
+        return self._fresh_pricing().effective_price
   
     def has_active_standalone_discount(self):
         """
         Check if product currently has an active standalone discount
         """
-        if not self.has_standalone_discount or not self.standalone_discount_percentage:
-            return False
-            
-        now = timezone.now()
-        start_ok = (self.standalone_discount_start is None) or (self.standalone_discount_start <= now)
-        end_ok = (self.standalone_discount_end is None) or (now <= self.standalone_discount_end)
-        
-        return start_ok and end_ok
+        return self._fresh_pricing().discount_source == DiscountSource.STANDALONE
     
     @property
     def has_active_discount(self):
         """Check if product has any active discount (standalone or sale)"""
-        now = timezone.now()
-        
-        # Check standalone discount
-        if self.has_standalone_discount and self.standalone_discount_percentage:
-            start_ok = (self.standalone_discount_start is None) or (self.standalone_discount_start <= now)
-            end_ok = (self.standalone_discount_end is None) or (now <= self.standalone_discount_end)
-            if start_ok and end_ok:
-                return True
-        
-        # Check sale discounts
-        active_sales = self.sales.filter(
-            sale_event__start_date__lte=now,
-            sale_event__end_date__gte=now
-        ).exists()
-        
-        return active_sales
+        return self._fresh_pricing().discount_source != DiscountSource.NONE
 
     @property
     def active_discount_percentage(self):
         """Get the current active discount percentage"""
-        if not self.has_active_discount:
-            return None
-            
-        now = timezone.now()
-        
-        # Check standalone discount first
-        if self.has_standalone_discount and self.standalone_discount_percentage:
-            start_ok = (self.standalone_discount_start is None) or (self.standalone_discount_start <= now)
-            end_ok = (self.standalone_discount_end is None) or (now <= self.standalone_discount_end)
-            if start_ok and end_ok:
-                return self.standalone_discount_percentage
-        
-        # Check sale discounts
-        active_sale = self.sales.filter(
-            sale_event__start_date__lte=now,
-            sale_event__end_date__gte=now
-        ).first()
-        
-        return active_sale.discount_percentage if active_sale else None
+        return self._fresh_pricing().active_discount_pct
 
     def get_dirty_fields(self):
         """Track which fields have changed"""
@@ -253,6 +261,14 @@ class Product(models.Model):
         return dirty_fields
 
     def save(self, *args, **kwargs):
+            # Keep the materialized pricing in step with price/discount edits
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                apply_pricing(self)
+            elif PRICING_INPUTS.intersection(update_fields):
+                apply_pricing(self)
+                kwargs['update_fields'] = set(update_fields) | set(PRICING_FIELDS)
+
             # Track approval changes
             if self.pk:  # Only for existing products
                 old = Product.objects.get(pk=self.pk)
@@ -262,6 +278,25 @@ class Product(models.Model):
                     return
             super().save(*args, **kwargs)
     
+class ProductSearchDocument(models.Model):
+    """
+    Denormalized, pre-analyzed search text for one product (see products/search.py).
+    The vendor full-text index (FTS5 / tsvector) is built over this table.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    name = models.TextField(blank=True, default='')
+    brand = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for product #{self.product_id}"
+
 class ProductEditRequest(models.Model):
     PENDING = 'pending'
     APPROVED = 'approved'
@@ -0,0 +1,243 @@
+# products/pagination.py
+"""
+Keyset ("cursor") pagination.
+
+Page-number pagination needs OFFSET n (the database walks and discards n rows)
+plus a COUNT(*) on every request. In cursor mode the client passes an opaque
+cursor holding the sort-key values of the last row it saw, and the next page
+is a plain range scan: WHERE (sort_key, id) > (last_sort_key, last_id).
+
+Cursor mode is opt-in: any paginator using CursorModeMixin switches to it when
+the request has a ?cursor= parameter (empty for the first page). The total
+count is skipped unless ?count=exact or ?count=estimate is requested.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if value is None:
+        return ['n', None]
+    if isinstance(value, datetime.datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['dec', str(value)]
+    if isinstance(value, float):
+        return ['f', repr(value)]
+    if isinstance(value, int):
+        return ['i', value]
+    return ['s', str(value)]
+
+
+def _decode_value(tag, raw):
+    if tag == 'n':
+        return None
+    if tag == 'dt':
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+    if tag == 'dec':
+        return Decimal(raw)
+    if tag == 'f':
+        return float(raw)
+    if tag == 'i':
+        return int(raw)
+    if tag == 's':
+        return str(raw)
+    raise ValueError(tag)
+
+
+class KeysetPagination:
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = 20
+
+    def __init__(self, page_size=None):
+        if page_size:
+            self.page_size = page_size
+
+    @classmethod
+    def is_requested(cls, request):
+        return cls.cursor_query_param in request.query_params
+
+    # ------------------ Ordering ------------------
+
+    def get_keys(self, queryset):
+        """
+        Return [(field, descending, nullable)] from the queryset ordering,
+        with the primary key appended as a tie-breaker.
+        """
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        keys = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise NotFound("Cursor pagination is not supported for this ordering.")
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            if name in ('pk', 'id'):
+                keys.append(('pk', descending, False))
+                break
+            if '__' in name:
+                raise NotFound("Cursor pagination is not supported for this ordering.")
+            try:
+                nullable = queryset.model._meta.get_field(name).null
+            except FieldDoesNotExist:
+                nullable = True  # annotation, e.g. search_rank
+            if name not in [k[0] for k in keys]:
+                keys.append((name, descending, nullable))
+        if not keys or keys[-1][0] != 'pk':
+            descending = keys[0][1] if keys else True
+            keys.append(('pk', descending, False))
+        return keys
+
+    def _order_by(self, keys, reverse):
+        # NULLs sort as the smallest value on every backend
+        expressions = []
+        for name, descending, nullable in keys:
+            descending = descending != reverse
+            expression = F(name)
+            if descending:
+                expressions.append(expression.desc(nulls_last=True) if nullable else expression.desc())
+            else:
+                expressions.append(expression.asc(nulls_first=True) if nullable else expression.asc())
+        return expressions
+
+    def _after(self, keys, values, reverse):
+        """Q matching rows strictly after `values` in (possibly reversed) key order."""
+        condition = Q(pk__in=[])
+        equal_so_far = Q()
+        for (name, descending, nullable), value in zip(keys, values):
+            descending = descending != reverse
+            if value is None:
+                # NULL is the smallest value: nothing sorts below it
+                after = Q(pk__in=[]) if descending else Q(**{f'{name}__isnull': False})
+                equal = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+                if nullable and descending:
+                    after |= Q(**{f'{name}__isnull': True})
+                equal = Q(**{name: value})
+            condition |= equal_so_far & after
+            equal_so_far &= equal
+        return condition
+
+    # ------------------ Cursor encoding ------------------
+
+    def encode_cursor(self, obj, reverse):
+        values = [_encode_value(getattr(obj, name)) for name, _, _ in self.keys]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param, '')
+        if not raw:
+            return None, False
+        try:
+            padded = raw + '=' * (-len(raw) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values = [_decode_value(tag, value) for tag, value in payload['v']]
+            reverse = bool(payload.get('r'))
+        except (ValueError, TypeError, KeyError):
+            raise NotFound("Invalid cursor.")
+        if len(values) != len(self.keys):
+            raise NotFound("Invalid cursor.")
+        return values, reverse
+
+    # ------------------ Counting ------------------
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, '').lower()
+        if mode == 'exact':
+            return queryset.count(), False
+        if mode == 'estimate':
+            if connections[queryset.db].vendor == 'postgresql':
+                plan = json.loads(queryset.order_by().explain(format='json'))
+                return int(plan[0]['Plan']['Plan Rows']), True
+            # No planner estimate available; fall back to the exact count
+            return queryset.count(), False
+        return None, False
+
+    # ------------------ Paginator API ------------------
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keys = self.get_keys(queryset)
+        values, reverse = self.decode_cursor(request)
+        self.count, self.count_is_estimate = self.get_count(queryset, request)
+
+        if values is not None:
+            queryset = queryset.filter(self._after(self.keys, values, reverse))
+        queryset = queryset.order_by(*self._order_by(self.keys, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.page = rows
+        return rows
+
+    def get_next_cursor(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_cursor(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_pagination_data(self):
+        next_cursor = self.get_next_cursor()
+        previous_cursor = self.get_previous_cursor()
+        return {
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'next': self._link(next_cursor),
+            'previous': self._link(previous_cursor),
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+        }
+
+    def get_paginated_response(self, data):
+        return Response({**self.get_pagination_data(), 'results': data})
+
+
+class CursorModeMixin:
+    """
+    Add opt-in keyset mode to a PageNumberPagination subclass: with ?cursor=
+    present, paging is delegated to KeysetPagination; otherwise unchanged.
+    """
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.is_requested(request):
+            self.keyset = KeysetPagination(page_size=self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
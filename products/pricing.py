@@ -0,0 +1,152 @@
+# products/pricing.py
+"""
+Materialized product pricing.
+
+Product.effective_price / active_discount_pct / discount_source hold the price
+buyers pay right now, so listings can filter and sort on an indexed column
+instead of evaluating discounts per row. Discounts only change at known
+instants (standalone discount start/end, sale start/end), so each product also
+stores price_recompute_at = its next such boundary. The scheduler
+(apply_discount_boundaries) recomputes products whose boundary has passed;
+saves of products, sales and sale events recompute immediately.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+# Fields written by refresh_product_pricing()
+PRICING_FIELDS = ['effective_price', 'active_discount_pct', 'discount_source', 'price_recompute_at']
+# Product fields that feed the computation
+PRICING_INPUTS = {
+    'price', 'has_standalone_discount', 'standalone_discount_percentage',
+    'standalone_discount_start', 'standalone_discount_end',
+}
+
+
+def _sale_window(sale):
+    """Sales follow their event's dates (as has_active_discount always did)."""
+    event = sale.sale_event
+    if event is not None:
+        return event.start_date, event.end_date
+    return sale.start_date, sale.end_date
+
+
+def resolve_pricing(product, sales, now):
+    """
+    Work out the discount in effect at `now`. The standalone discount wins
+    over sales; among active sales the most recently started one applies.
+    Returns the values for PRICING_FIELDS.
+    """
+    boundaries = []
+    pct, source = None, 'none'
+
+    if product.has_standalone_discount and product.standalone_discount_percentage:
+        start, end = product.standalone_discount_start, product.standalone_discount_end
+        if (start is None or start <= now) and (end is None or now <= end):
+            pct, source = product.standalone_discount_percentage, 'standalone'
+        if start and start > now:
+            boundaries.append(start)
+        if end and end >= now:
+            boundaries.append(end)
+
+    active_sale = None
+    for sale in sales:
+        start, end = _sale_window(sale)
+        if start <= now <= end:
+            boundaries.append(end)
+            if active_sale is None or sale.start_date > active_sale.start_date:
+                active_sale = sale
+        elif start > now:
+            boundaries.append(start)
+
+    if pct is None and active_sale is not None:
+        pct, source = active_sale.discount_percentage, 'sale'
+
+    price = Decimal(product.price)
+    if pct is not None:
+        price = (price * (100 - Decimal(pct)) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    return {
+        'effective_price': price,
+        'active_discount_pct': pct,
+        'discount_source': source,
+        'price_recompute_at': min(boundaries) if boundaries else None,
+    }
+
+
+def apply_pricing(product, now=None):
+    """Set the materialized pricing fields on one (possibly unsaved) product."""
+    now = now or timezone.now()
+    sales = list(product.sales.select_related('sale_event')) if product.pk else []
+    for field, value in resolve_pricing(product, sales, now).items():
+        setattr(product, field, value)
+
+
+def refresh_product_pricing(products, now=None):
+    """Recompute and bulk-save pricing for many products with one sales query."""
+    from .models import Product, ProductSale
+
+    products = list(products)
+    if not products:
+        return 0
+    now = now or timezone.now()
+
+    sales_by_product = {}
+    for sale in ProductSale.objects.filter(product__in=products).select_related('sale_event'):
+        sales_by_product.setdefault(sale.product_id, []).append(sale)
+
+    for product in products:
+        pricing = resolve_pricing(product, sales_by_product.get(product.pk, []), now)
+        for field, value in pricing.items():
+            setattr(product, field, value)
+
+    Product.objects.bulk_update(products, PRICING_FIELDS, batch_size=500)
+    return len(products)
+
+
+def apply_discount_boundaries(now=None, batch_size=500):
+    """
+    Scheduler tick: flip sale is_active flags, clear expired standalone
+    discounts and recompute every product whose next boundary has passed.
+    Replaces the old expire_sales task and deactivate_expired_discounts command.
+    """
+    from .models import Product, ProductSale, SaleEvent
+
+    now = now or timezone.now()
+    stats = {}
+    with transaction.atomic():
+        stats['events_deactivated'] = SaleEvent.objects.filter(
+            is_active=True, end_date__lt=now).update(is_active=False)
+        stats['events_activated'] = SaleEvent.objects.filter(
+            is_active=False, start_date__lte=now, end_date__gte=now).update(is_active=True)
+        stats['sales_deactivated'] = ProductSale.objects.filter(
+            is_active=True, end_date__lt=now).update(is_active=False)
+        stats['sales_activated'] = ProductSale.objects.filter(
+            is_active=False, start_date__lte=now, end_date__gte=now).update(is_active=True)
+        # Expired standalone discounts are due for recompute too (their end is
+        # their price_recompute_at), so the refresh below picks them up.
+        stats['standalone_cleared'] = Product.objects.filter(
+            has_standalone_discount=True, standalone_discount_end__lt=now
+        ).update(has_standalone_discount=False, standalone_discount_start=None, standalone_discount_end=None)
+
+    refreshed = 0
+    due = Product.objects.filter(price_recompute_at__lte=now).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(due.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            refreshed += refresh_product_pricing(batch, now)
+        last_pk = batch[-1].pk
+    stats['products_repriced'] = refreshed
+    return stats
+
+
+def next_discount_boundary():
+    """Earliest pending price_recompute_at, or None."""
+    from .models import Product
+
+    return Product.objects.aggregate(next_at=Min('price_recompute_at'))['next_at']
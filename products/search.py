@@ -0,0 +1,222 @@
+# products/search.py
+"""
+Product search index.
+
+Every product has a ProductSearchDocument row holding its names, brand and
+descriptions already normalized (Arabic + English) and stemmed. The database
+keeps a full-text index over that table:
+
+  * SQLite     -> FTS5 virtual table kept in sync by triggers
+  * PostgreSQL -> generated, weighted tsvector column with a GIN index
+
+Both are created by migration 0023. The backends below only know how to turn
+a normalized query into "which products match" and "how well" SQL, so the
+view can keep filtering/sorting a normal Product queryset.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_search_fts'
+DOCUMENT_TABLE = 'products_productsearchdocument'
+
+# ------------------ Normalization ------------------
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TATWEEL = 'ـ'
+ARABIC_LETTER_MAP = str.maketrans({
+    'ٱ': 'ا',  # alef wasla (does not decompose under NFKD)
+    'ى': 'ي',  # alef maqsura -> ya
+    'ة': 'ه',  # ta marbuta -> ha
+})
+# Longest first so "وال" wins over "ال"
+ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+ARABIC_SUFFIXES = ('ها', 'ان', 'ات', 'ون', 'ين', 'يه', 'ه', 'ي')
+
+
+def _is_arabic(token):
+    return any('؀' <= ch <= 'ۿ' for ch in token)
+
+
+def normalize_text(text):
+    """
+    Lowercase, strip diacritics/tashkeel/tatweel and unify alef/ya variants.
+    NFKD splits hamza/madda carriers (أ إ آ ؤ ئ) into base letter + mark,
+    so dropping combining marks also folds those variants.
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch) and ch != TATWEEL)
+    return text.translate(ARABIC_LETTER_MAP)
+
+
+def stem_arabic(token):
+    """Light stemmer: drop one article/conjunction prefix and one suffix."""
+    for prefix in ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            token = token[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            token = token[:-len(suffix)]
+            break
+    return token
+
+
+def stem_english(token):
+    """Tiny suffix stripper; documents and queries go through the same rules."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        token = token[:-3] + 'y'
+    elif token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        token = token[:-1]
+    for suffix in ('ing', 'ed'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith('e') and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def analyze(text):
+    """Normalize, tokenize and stem text into index terms."""
+    terms = []
+    for token in TOKEN_RE.findall(normalize_text(text)):
+        terms.append(stem_arabic(token) if _is_arabic(token) else stem_english(token))
+    return terms
+
+
+def build_document(name_ar='', name_en='', description_ar='', description_en='', brand_name=''):
+    """Return the analyzed column values stored on ProductSearchDocument."""
+    return {
+        'name': ' '.join(analyze(f'{name_ar or ""} {name_en or ""}')),
+        'brand': ' '.join(analyze(brand_name or '')),
+        'body': ' '.join(analyze(f'{description_ar or ""} {description_en or ""}')),
+    }
+
+# ------------------ Backends ------------------
+
+class SearchBackend:
+    """
+    Translate analyzed query terms into SQL against the search index.
+    match_sql() selects matching product ids, rank_sql() scores a product
+    (higher is better) and is correlated on "products_product"."id".
+    """
+
+    def match_sql(self, terms):
+        raise NotImplementedError
+
+    def rank_sql(self, terms):
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    # bm25 column weights: name, brand, body
+    WEIGHTS = '10.0, 5.0, 1.0'
+
+    def _query(self, terms):
+        return ' '.join(f'"{t}"*' for t in terms)
+
+    def match_sql(self, terms):
+        return (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [self._query(terms)])
+
+    def rank_sql(self, terms):
+        # bm25() is "lower is better", negate it so all backends sort DESC
+        return (f'SELECT -bm25({FTS_TABLE}, {self.WEIGHTS}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "products_product"."id"',
+                [self._query(terms)])
+
+
+class PostgresSearchBackend(SearchBackend):
+    def _query(self, terms):
+        return ' & '.join(f'{t}:*' for t in terms)
+
+    def match_sql(self, terms):
+        return (f"SELECT product_id FROM {DOCUMENT_TABLE} "
+                f"WHERE search_vector @@ to_tsquery('simple', %s)",
+                [self._query(terms)])
+
+    def rank_sql(self, terms):
+        return (f"SELECT ts_rank(search_vector, to_tsquery('simple', %s)) FROM {DOCUMENT_TABLE} "
+                f'WHERE product_id = "products_product"."id"',
+                [self._query(terms)])
+
+
+class BasicSearchBackend(SearchBackend):
+    """Fallback for databases without a full-text index: LIKE over the documents."""
+
+    def _where(self, terms):
+        clause = ' AND '.join(f"(name || ' ' || brand || ' ' || body) LIKE %s" for _ in terms)
+        return clause, [f'%{t}%' for t in terms]
+
+    def match_sql(self, terms):
+        where, params = self._where(terms)
+        return f'SELECT product_id FROM {DOCUMENT_TABLE} WHERE {where}', params
+
+    def rank_sql(self, terms):
+        return 'SELECT 0.0', []
+
+
+def fts5_table_exists():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_search_backend():
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if vendor == 'sqlite' and fts5_table_exists():
+        return SQLiteFTSBackend()
+    return BasicSearchBackend()
+
+# ------------------ Public API ------------------
+
+def search_products(queryset, query):
+    """
+    Restrict a Product queryset to index matches for `query` and annotate
+    `search_rank` (higher = more relevant). Other filters can be chained.
+    """
+    terms = analyze(query)
+    if not terms:
+        return queryset.none()
+
+    backend = get_search_backend()
+    match_sql, match_params = backend.match_sql(terms)
+    rank_sql, rank_params = backend.rank_sql(terms)
+    return (queryset
+            .filter(pk__in=RawSQL(match_sql, match_params))
+            .annotate(search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField())))
+
+
+def index_products(products):
+    """Upsert search documents for the given products (brand must be loadable)."""
+    from .models import ProductSearchDocument
+
+    documents = [
+        ProductSearchDocument(
+            product_id=product.pk,
+            **build_document(
+                product.name_ar, product.name_en,
+                product.description_ar, product.description_en,
+                product.brand.name if product.brand_id else '',
+            ),
+        )
+        for product in products
+    ]
+    if documents:
+        ProductSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['name', 'brand', 'body', 'updated_at'],
+        )
+    return len(documents)
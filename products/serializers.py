@@ -1,7 +1,9 @@
 # serializers.py
+from django.db import models
 from rest_framework import serializers
 from .models import Category,Wishlist,WishlistItem,SaleEvent,ProductSale
 from .models import Product, ProductImage,Cart,CartItem,Brand
+from .category_tree import find_category, get_category_tree
 from .constants import BRAND_MIN_POINTS
 from rest_framework import serializers
 from django.utils import timezone
@@ -121,6 +123,15 @@ class ProductBrandAssignSerializer(serializers.ModelSerializer):
 
         return data
 
+class ProductLanguageListSerializer(serializers.ListSerializer):
+    """Batch-loads related rows for the whole page before rendering each product."""
+
+    def to_representation(self, data):
+        from .utils import load_listing_data
+        products = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_listing_data(products)
+        return super().to_representation(products)
+
 class ProductLanguageSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     parent_category_name = serializers.SerializerMethodField()
@@ -144,6 +155,7 @@ class ProductLanguageSerializer(serializers.ModelSerializer):
             'has_active_discount', 'discount_percentage',"seller_id",
             'brand_id', 'brand_name', 'brand_slug','rating', 'ratings_count', 
         ]
+        list_serializer_class = ProductLanguageListSerializer
 
     def get_category_name(self, obj):
         lang = self.context.get('lang', 'ar')
@@ -193,15 +205,10 @@ class ProductLanguageSerializer(serializers.ModelSerializer):
         return obj.current_price
 
     def get_has_active_discount(self, obj):
-        now = timezone.now()
-        return (obj.has_standalone_discount and 
-                (not obj.standalone_discount_start or obj.standalone_discount_start <= now) and
-                (not obj.standalone_discount_end or now <= obj.standalone_discount_end))
+        return obj.has_active_discount
 
     def get_discount_percentage(self, obj):
-        if self.get_has_active_discount(obj):
-            return obj.standalone_discount_percentage
-        return None
+        return obj.active_discount_percentage
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -234,7 +241,11 @@ class ProductLanguageSerializer(serializers.ModelSerializer):
         return obj.brand.name if obj.brand else None
     
     def get_ratings_count(self, obj):
-        return obj.reviews.count()
+        # Annotated by Product.objects.for_listing() / load_listing_data()
+        if hasattr(obj, 'ratings_count'):
+            return obj.ratings_count
+        stats = getattr(obj, 'rating_stats', None)
+        return stats.rating_count if stats else 0
     
 class CategorySerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
@@ -245,10 +256,21 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name_ar', 'name_en', 'parent', 'children', 'logo', 'created_at']  # Added logo
     
     def get_children(self, obj):
-        if obj.is_parent:
-            children = obj.children.all()
-            return CategorySerializer(children, many=True).data
-        return []
+        if not obj.is_parent:
+            return []
+        # Children come from the cached tree instead of one query per parent
+        node = find_category(get_category_tree(), obj.id)
+        if node is None:
+            return []
+        request = self.context.get('request')
+        return [
+            {
+                **child,
+                'logo': request.build_absolute_uri(child['logo']) if child['logo'] and request else None,
+                'children': [],
+            }
+            for child in node['children']
+        ]
     
     def get_logo(self, obj):  # Added this method
         request = self.context.get('request')
@@ -290,17 +312,15 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.current_price
     
     def get_has_active_discount(self, obj):
-        now = timezone.now()
-        return (obj.has_standalone_discount and 
-                (not obj.standalone_discount_start or obj.standalone_discount_start <= now) and
-                (not obj.standalone_discount_end or now <= obj.standalone_discount_end))
+        return obj.has_active_discount
 
     def get_category_name(self, obj):
         lang = self.context.get('lang', 'ar')
         return obj.category.name_ar if lang == 'ar' else obj.category.name_en
    
     def get_ratings_count(self, obj):
-        return obj.reviews.count()
+        stats = getattr(obj, 'rating_stats', None)
+        return stats.rating_count if stats else 0
 
 class ProductEditRequestSerializer(serializers.ModelSerializer):
     new_images = serializers.ListField(
@@ -430,10 +450,7 @@ class WishlistItemSerializer(serializers.ModelSerializer):
         return obj.product.active_discount_percentage
 
     def get_current_price(self, obj):
-        if obj.product.has_active_discount:
-            discount = obj.product.active_discount_percentage or 0
-            return obj.product.price * (100 - discount) / 100
-        return obj.product.price
+        return obj.product.current_price
 
 class WishlistSerializer(serializers.ModelSerializer):
     items = WishlistItemSerializer(many=True)
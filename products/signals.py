@@ -0,0 +1,62 @@
+# products/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .category_tree import invalidate_category_tree
+from .models import Brand, Category, Product, ProductSale, SaleEvent
+from .pricing import refresh_product_pricing
+from .search import index_products
+
+# Fields that feed the search document (see products.search.build_document)
+SEARCH_FIELDS = {'name_ar', 'name_en', 'description_ar', 'description_en', 'brand'}
+
+
+@receiver(post_save, sender=Product)
+def sync_product_search_document(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the search document in sync with the product. Edit-request approval
+    applies the changes through product.save(), so it is covered here too.
+    """
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    index_products([instance])
+
+
+@receiver(post_save, sender=Brand)
+def sync_brand_search_documents(sender, instance, created, update_fields=None, **kwargs):
+    """A brand rename changes the indexed text of all its products."""
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    products = list(Product.objects.filter(brand=instance).only(
+        'id', 'name_ar', 'name_en', 'description_ar', 'description_en', 'brand_id'
+    ))
+    for product in products:
+        product.brand = instance
+    index_products(products)
+
+
+@receiver(post_save, sender=ProductSale)
+@receiver(post_delete, sender=ProductSale)
+def reprice_product_for_sale(sender, instance, **kwargs):
+    """Adding, editing or removing a sale changes the product's effective price."""
+    refresh_product_pricing(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_save, sender=SaleEvent)
+def reprice_sale_event_products(sender, instance, created, **kwargs):
+    """Event dates drive every product sale in it (see products.pricing._sale_window)."""
+    if created:
+        return
+    refresh_product_pricing(Product.objects.filter(sales__sale_event=instance).distinct())
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree_cache(sender, **kwargs):
+    """
+    Create/Update/DeleteCategoryView (and the admin) all go through save()/
+    delete(). Bump after commit so no reader can cache the pre-commit tree
+    under the new generation.
+    """
+    transaction.on_commit(invalidate_category_tree)
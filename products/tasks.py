@@ -1,21 +1,12 @@
 from celery import shared_task
-from django.utils import timezone
-from products.models import SaleEvent, ProductSale
+from products.pricing import apply_discount_boundaries
 
 @shared_task
-def expire_sales():
-    now = timezone.now()
-    
-    # Update sale events
-    SaleEvent.objects.filter(
-        end_date__lt=now,
-        is_active=True
-    ).update(is_active=False)
-    
-    # Update product sales
-    ProductSale.objects.filter(
-        end_date__lt=now,
-        is_active=True
-    ).update(is_active=False)
-    
-    return f"Checked sales at {now}"
\ No newline at end of file
+def apply_discount_schedule():
+    """
+    Flip sale flags and reprice products whose discount started or ended.
+    Replaces the old expire_sales task; run it every minute (or use the
+    run_discount_scheduler command, which sleeps until the next boundary).
+    """
+    stats = apply_discount_boundaries()
+    return f"Applied discount boundaries: {stats}"
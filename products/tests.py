@@ -1,3 +1,333 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Role, User
+from orders.models import Order, OrderItem, OrderStatus
+from reviews.models import Review
+
+from .category_tree import get_category_tree_stats
+from .models import Brand, BrandStatus, Category, Product, ProductImage, ProductSale, SaleEvent
+from .pagination import KeysetPagination
+from .pricing import apply_discount_boundaries
+
+
+class ProductListingQueryCountTests(TestCase):
+    """Listing pages must cost a fixed number of queries regardless of page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', password='pass', username='seller',
+            first_name='S', last_name='S', role=Role.SELLER,
+        )
+        cls.buyer = User.objects.create_user(
+            email='buyer@example.com', password='pass', username='buyer',
+            first_name='B', last_name='B',
+        )
+        parent = Category.objects.create(name_ar='أب', name_en='Parent')
+        cls.category = Category.objects.create(name_ar='ابن', name_en='Child', parent=parent)
+        brand = Brand.objects.create(name='Acme', owner=cls.seller, status=BrandStatus.APPROVED)
+
+        order = Order.objects.create(buyer=cls.buyer, total_amount=Decimal('0'), status=OrderStatus.COMPLETED)
+        for i in range(30):
+            product = Product.objects.create(
+                seller=cls.seller, category=cls.category, brand=brand,
+                name_ar=f'منتج {i}', name_en=f'Product {i}', price=Decimal('10.00'),
+                is_approved=True, status='approved',
+            )
+            ProductImage.objects.create(product=product, image=f'products/{i}-a.jpg')
+            ProductImage.objects.create(product=product, image=f'products/{i}-b.jpg')
+            item = OrderItem.objects.create(
+                order=order, product=product, seller=cls.seller,
+                quantity=1, price_at_purchase=product.price,
+            )
+            Review.objects.create(buyer=cls.buyer, product=product, order=order, order_item=item, rating=4)
+
+    def _count_queries(self, url, page_size, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'page_size': page_size, **params}, secure=True,
+                                       HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries), response
+
+    def test_product_list_query_count_is_constant(self):
+        small, _ = self._count_queries('/api/product/', 5)
+        large, response = self._count_queries('/api/product/', 25)
+        self.assertEqual(small, large)
+
+        first = response.data['results'][0]
+        self.assertEqual(first['ratings_count'], 1)
+        self.assertEqual(first['brand_name'], 'Acme')
+        self.assertEqual(first['parent_category_name'], 'Parent')
+        self.assertEqual(len(first['images']), 2)
+
+    def test_category_products_query_count_is_constant(self):
+        url = f'/api/product/category/{self.category.id}/products/'
+        small, _ = self._count_queries(url, 5)
+        large, _ = self._count_queries(url, 25)
+        self.assertEqual(small, large)
+
+    def test_search_query_count_is_constant(self):
+        small, _ = self._count_queries('/api/product/search/', 5, q='Product')
+        large, _ = self._count_queries('/api/product/search/', 25, q='Product')
+        self.assertEqual(small, large)
+
+    def test_plain_list_is_batch_loaded(self):
+        from .serializers import ProductLanguageSerializer
+
+        products = list(Product.objects.order_by('id')[:20])
+        with CaptureQueriesContext(connection) as ctx:
+            data = ProductLanguageSerializer(products, many=True, context={'lang': 'ar'}).data
+        self.assertEqual(len(data), 20)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+
+
+class ProductSearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', password='pass', username='seller',
+            first_name='S', last_name='S', role=Role.SELLER,
+        )
+        parent = Category.objects.create(name_ar='أب', name_en='Parent')
+        cls.category = Category.objects.create(name_ar='ابن', name_en='Child', parent=parent)
+        cls.brand = Brand.objects.create(name='Acme', owner=cls.seller, status=BrandStatus.APPROVED)
+
+    def _product(self, **kwargs):
+        defaults = dict(seller=self.seller, category=self.category, price=Decimal('10.00'),
+                        is_approved=True, status='approved')
+        defaults.update(kwargs)
+        return Product.objects.create(**defaults)
+
+    def _search(self, q, **params):
+        response = self.client.get('/api/product/search/', {'q': q, **params}, secure=True,
+                                   HTTP_ACCEPT_LANGUAGE='en')
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_arabic_normalization(self):
+        from .search import analyze
+
+        self.assertEqual(analyze('أَحْمَد'), analyze('احمد'))
+        self.assertEqual(analyze('مكتبة'), analyze('مكتبه'))
+        self.assertEqual(analyze('مستشفى'), analyze('مستشفي'))
+        self.assertEqual(analyze('الهواتف'), analyze('هواتف'))
+
+    def test_name_match_ranks_above_description_match(self):
+        in_body = self._product(name_en='Case', description_en='fits any phone')
+        in_name = self._product(name_en='Phone X')
+        self.assertEqual(self._search('phones'), [in_name.id, in_body.id])
+
+    def test_filters_apply_to_ranked_results(self):
+        cheap = self._product(name_en='Phone cheap', price=Decimal('5.00'))
+        self._product(name_en='Phone expensive', price=Decimal('500.00'))
+        self.assertEqual(self._search('phone', max_price='50'), [cheap.id])
+
+    def test_arabic_query_matches_variant_spelling(self):
+        product = self._product(name_ar='مكتبة إلكترونية')
+        self.assertEqual(self._search('المكتبه الكترونيه'), [product.id])
+
+    def test_index_follows_product_and_brand_updates(self):
+        product = self._product(name_en='Gadget', brand=self.brand)
+        self.assertEqual(self._search('acme'), [product.id])
+
+        self.brand.name = 'Globex'
+        self.brand.save()
+        self.assertEqual(self._search('acme'), [])
+        self.assertEqual(self._search('globex'), [product.id])
+
+        product.name_en = 'Widget'
+        product.save()
+        self.assertEqual(self._search('gadget'), [])
+        self.assertEqual(self._search('widget'), [product.id])
+
+        product.delete()
+        self.assertEqual(self._search('widget'), [])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user(
+            email='seller@example.com', password='pass', username='seller',
+            first_name='S', last_name='S', role=Role.SELLER,
+        )
+        parent = Category.objects.create(name_ar='أب', name_en='Parent')
+        category = Category.objects.create(name_ar='ابن', name_en='Child', parent=parent)
+        for i in range(23):
+            Product.objects.create(
+                seller=seller, category=category, name_en=f'Product {i}',
+                price=Decimal(10 + i % 3), rating=None if i % 4 == 0 else Decimal(i % 5),
+                is_approved=True, status='approved',
+            )
+
+    def _walk(self, params, page_size=5):
+        ids, pages = [], []
+        url, query = '/api/product/', {'cursor': '', 'page_size': page_size, **params}
+        while True:
+            response = self.client.get(url, query, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data['count'])
+            pages.append(response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next_cursor']:
+                return ids, pages
+            query = {**query, 'cursor': response.data['next_cursor']}
+
+    def test_walks_every_row_once_in_sort_order(self):
+        for sort_by, direction in [('price', 'asc'), ('rating', 'desc'), ('rating', 'asc'), ('created_at', 'desc')]:
+            ids, _ = self._walk({'sort_by': sort_by, 'sort_direction': direction})
+            ordered = Product.objects.for_listing().order_by(
+                *KeysetPagination()._order_by(
+                    [(sort_by, direction == 'desc', sort_by == 'rating'), ('pk', direction == 'desc', False)],
+                    reverse=False,
+                )
+            )
+            self.assertEqual(ids, [p.id for p in ordered], (sort_by, direction))
+
+    def test_previous_cursor_returns_previous_page(self):
+        _, pages = self._walk({'sort_by': 'price', 'sort_direction': 'asc'})
+        response = self.client.get('/api/product/', {
+            'cursor': pages[2]['previous_cursor'], 'page_size': 5,
+            'sort_by': 'price', 'sort_direction': 'asc',
+        }, secure=True)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [row['id'] for row in pages[1]['results']],
+        )
+
+    def test_exact_count_on_request(self):
+        response = self.client.get('/api/product/', {'cursor': '', 'count': 'exact'}, secure=True)
+        self.assertEqual(response.data['count'], 23)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/product/', {'cursor': 'not-a-cursor'}, secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            email='seller@example.com', password='pass', username='seller',
+            first_name='S', last_name='S', role=Role.SELLER,
+        )
+        parent = Category.objects.create(name_ar='أب', name_en='Parent')
+        cls.category = Category.objects.create(name_ar='ابن', name_en='Child', parent=parent)
+
+    def _product(self, **kwargs):
+        defaults = dict(seller=self.seller, category=self.category, price=Decimal('100.00'),
+                        is_approved=True, status='approved')
+        defaults.update(kwargs)
+        return Product.objects.create(**defaults)
+
+    def _list(self, **params):
+        response = self.client.get('/api/product/', params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_sale_event_is_materialized_and_filterable(self):
+        now = timezone.now()
+        on_sale = self._product(price=Decimal('100.00'))
+        plain = self._product(price=Decimal('80.00'))
+        event = SaleEvent.objects.create(
+            name_en='Summer', start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            created_by=self.seller,
+        )
+        ProductSale.objects.create(
+            product=on_sale, sale_event=event, discount_percentage=Decimal('30'),
+            start_date=event.start_date, end_date=event.end_date,
+        )
+
+        on_sale.refresh_from_db()
+        self.assertEqual(on_sale.effective_price, Decimal('70.00'))
+        self.assertEqual(on_sale.discount_source, 'sale')
+        self.assertEqual(on_sale.price_recompute_at, event.end_date)
+
+        self.assertEqual(self._list(has_discount='true'), [on_sale.id])
+        self.assertEqual(self._list(sort_by='price', sort_direction='asc'), [on_sale.id, plain.id])
+        self.assertEqual(self._list(max_price='75'), [on_sale.id])
+
+    def test_scheduler_applies_boundaries(self):
+        now = timezone.now()
+        product = self._product(
+            has_standalone_discount=True, standalone_discount_percentage=Decimal('10'),
+            standalone_discount_start=now + timedelta(hours=1),
+            standalone_discount_end=now + timedelta(hours=2),
+        )
+        self.assertEqual(product.effective_price, Decimal('100.00'))
+
+        apply_discount_boundaries(now=now + timedelta(minutes=90))
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal('90.00'))
+        self.assertEqual(product.discount_source, 'standalone')
+
+        stats = apply_discount_boundaries(now=now + timedelta(hours=3))
+        product.refresh_from_db()
+        self.assertEqual(stats['standalone_cleared'], 1)
+        self.assertEqual(product.effective_price, Decimal('100.00'))
+        self.assertIsNone(product.price_recompute_at)
+
+
+class CategoryTreeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = Category.objects.create(name_ar='أب', name_en='Parent')
+        Category.objects.create(name_ar='ابن', name_en='Child', parent=self.parent)
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', password='pass', username='admin',
+            first_name='A', last_name='A',
+        )
+
+    def _tree(self, lang='en'):
+        response = self.client.get('/api/product/LocalizedCategoryList/', secure=True,
+                                   HTTP_ACCEPT_LANGUAGE=lang)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_repeat_reads_skip_the_database(self):
+        self._tree()
+        with self.assertNumQueries(0):
+            tree = self._tree('ar')
+            self.client.get('/api/product/categories/parents/', secure=True)
+            self.client.get(f'/api/product/categories/children/{self.parent.id}/', secure=True)
+        self.assertEqual(tree[0]['name'], 'أب')
+        self.assertEqual(tree[0]['children'][0]['name'], 'ابن')
+
+        stats = get_category_tree_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+    def test_create_update_delete_invalidate(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        generation = get_category_tree_stats()['generation']
+        self._tree()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/product/CreateCategory/', {
+                'name_ar': 'جديد', 'name_en': 'New', 'parent_id': self.parent.id,
+            }, secure=True)
+        self.assertEqual(response.status_code, 201)
+        new_id = response.data['category']['id']
+        self.assertEqual([c['name'] for c in self._tree()[0]['children']], ['Child', 'New'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/product/UpdateCategory/{new_id}/', {
+                'name_ar': 'جديد', 'name_en': 'Renamed', 'parent_id': self.parent.id,
+            }, secure=True, content_type='application/json')
+        self.assertEqual([c['name'] for c in self._tree()[0]['children']], ['Child', 'Renamed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/product/DeleteCategory/{new_id}/', secure=True)
+        self.assertEqual([c['name'] for c in self._tree()[0]['children']], ['Child'])
 
-# Create your tests here.
+        self.assertEqual(get_category_tree_stats()['generation'], generation + 3)
@@ -14,6 +14,7 @@ from .views import (
     ProductSearchView,
     ParentCategoryListView,
     ChildCategoryListView,
+    CategoryCacheStatsView,
     UpdateProductQuantityView,
     CartView,
     AddToCartView,
@@ -96,6 +97,7 @@ urlpatterns = [
     path('search/', ProductSearchView.as_view(), name='product-search'),
     path('categories/parents/', ParentCategoryListView.as_view(), name='parent-categories'),
     path('categories/children/<int:parent_id>/', ChildCategoryListView.as_view(), name='child-categories'),
+    path('categories/cache-stats/', CategoryCacheStatsView.as_view(), name='category-cache-stats'),
     path('update-quantity/<int:product_id>/', UpdateProductQuantityView.as_view(), name='update-product-quantity'),
     path('cart/', CartView.as_view(), name='cart'),
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
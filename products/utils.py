@@ -1,7 +1,30 @@
 # products/utils.py
 from django.db import transaction
-from .models import CartItem, Product
+from django.db.models import prefetch_related_objects
+from .models import CartItem, Product, LISTING_SELECT_RELATED, LISTING_PREFETCH_RELATED
 from notifications.models import Notification
+from notifications.outbox import notify_many
+
+
+def load_listing_data(products):
+    """
+    Preload the relations and ratings count ProductLanguageSerializer needs
+    for a list of products that did not come from Product.objects.for_listing().
+    Already-loaded relations are skipped, so this is a no-op for such pages.
+    """
+    if not products:
+        return
+    prefetch_related_objects(products, *LISTING_SELECT_RELATED, *LISTING_PREFETCH_RELATED)
+
+    missing = [p for p in products if not hasattr(p, 'ratings_count')]
+    if missing:
+        from reviews.models import ProductRatingStats
+        counts = dict(
+            ProductRatingStats.objects.filter(product_id__in=[p.pk for p in missing])
+            .values_list('product_id', 'rating_count')
+        )
+        for p in missing:
+            p.ratings_count = counts.get(p.pk, 0)
 
 @transaction.atomic
 def reconcile_carts_for_product(product: Product):
@@ -9,35 +32,59 @@ def reconcile_carts_for_product(product: Product):
     Clamp or remove this product in *all* carts when its stock changes.
     Sends a notification to affected users.
     """
-    # Lock all cart items for this product
+    reconcile_carts_for_products([product])
+
+
+@transaction.atomic
+def reconcile_carts_for_products(products):
+    """
+    Batched reconcile_carts_for_product: one locking query for all affected
+    cart items, then one delete, one bulk update and one bulk notification
+    insert. `products` must carry their new quantity.
+    """
+    by_id = {product.pk: product for product in products}
+    if not by_id:
+        return
+
+    # Lock all cart items for these products
     items = (CartItem.objects
              .select_for_update()
-             .filter(product=product)
-             .select_related('cart__user'))
+             .filter(product_id__in=by_id)
+             .select_related('cart')
+             .order_by('pk'))
 
+    removed, clamped, notifications = [], [], []
     for ci in items:
-        user = ci.cart.user
+        product = by_id[ci.product_id]
+        user_id = ci.cart.user_id
 
         # If product is out of stock, remove from cart
         if product.quantity <= 0:
-            ci.delete()
-            Notification.objects.create(
-                user=user,
+            removed.append(ci.pk)
+            notifications.append(Notification(
+                user_id=user_id,
                 notification_type='system_alert',
                 message_ar=f"للأسف، نفد مخزون المنتج ({product.name_ar}) وتمت إزالته من سلة التسوق.",
                 message_en=f"Unfortunately, {product.name_en} is out of stock and was removed from your cart.",
                 content_object=product
-            )
+            ))
             continue
 
         # If requested qty > available, clamp it
         if ci.quantity > product.quantity:
             ci.quantity = product.quantity
-            ci.save(update_fields=['quantity'])
-            Notification.objects.create(
-                user=user,
+            clamped.append(ci)
+            notifications.append(Notification(
+                user_id=user_id,
                 notification_type='system_alert',
                 message_ar=f"تم تعديل الكمية لمنتج ({product.name_ar}) في سلتك إلى {product.quantity} بسبب انخفاض المخزون.",
                 message_en=f"The quantity of {product.name_en} in your cart was reduced to {product.quantity} due to low stock.",
                 content_object=product
-            )
+            ))
+
+    if removed:
+        CartItem.objects.filter(pk__in=removed).delete()
+    if clamped:
+        CartItem.objects.bulk_update(clamped, ['quantity'])
+    if notifications:
+        notify_many(notifications)
@@ -7,6 +7,7 @@ from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from notifications.models import Notification
+from notifications.outbox import notify_many
 from rest_framework import generics, status
 from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
@@ -26,7 +27,10 @@ from .models import (
     Wishlist, Cart, CartItem, SaleEvent, ProductSale,Brand, BrandStatus,BrandBlock,ProductEditRequest
 )
 
+from .category_tree import find_category, get_category_tree, get_category_tree_stats
+from .pagination import CursorModeMixin, KeysetPagination
 from .permissions import IsSellerOrAdmin
+from .search import search_products
 from .serializers import (
     ProductSerializer, CartSerializer, CartItemSerializer,
     ProductLanguageSerializer, SaleEventSerializer,
@@ -290,7 +294,7 @@ class BrandProductsView(APIView):
             # Option B: pretend it doesn't exist
             raise Http404
 
-        qs = Product.objects.filter(brand=brand, is_approved=True).order_by('-created_at')
+        qs = Product.objects.filter(brand=brand, is_approved=True).for_listing().order_by('-created_at')
 
         paginator = StandardResultsSetPagination()
         page = paginator.paginate_queryset(qs, request)
@@ -491,23 +495,21 @@ class LocalizedCategoryListView(APIView):
         if language not in ['ar', 'en']:
             language = 'ar'
 
-        # Get all parent categories with their children
-        parent_categories = Category.objects.filter(parent__isnull=True).prefetch_related('children')
-        
+        # Parent categories with their children, from the shared tree cache
         results = []
-        for parent in parent_categories:
+        for parent in get_category_tree():
             parent_data = {
-                'id': parent.id,
-                'name': parent.name_ar if language == 'ar' else parent.name_en,
-                'logo': request.build_absolute_uri(parent.logo.url) if parent.logo else None,
+                'id': parent['id'],
+                'name': parent['name_ar'] if language == 'ar' else parent['name_en'],
+                'logo': request.build_absolute_uri(parent['logo']) if parent['logo'] else None,
                 'children': [],
             }
             
-            for child in parent.children.all():
+            for child in parent['children']:
                 parent_data['children'].append({
-                    'id': child.id,
-                    'name': child.name_ar if language == 'ar' else child.name_en,
-                    'logo': request.build_absolute_uri(child.logo.url) if child.logo else None,
+                    'id': child['id'],
+                    'name': child['name_ar'] if language == 'ar' else child['name_en'],
+                    'logo': request.build_absolute_uri(child['logo']) if child['logo'] else None,
                 })
             
             results.append(parent_data)
@@ -522,14 +524,12 @@ class ParentCategoryListView(APIView):
         if lang not in ['ar', 'en']:
             lang = 'ar'
         
-        parent_categories = Category.objects.filter(parent__isnull=True)
         results = []
-        
-        for cat in parent_categories:
+        for cat in get_category_tree():
             results.append({
-                'id': cat.id,
-                'name': cat.name_ar if lang == 'ar' else cat.name_en,
-                'has_children': cat.children.exists()
+                'id': cat['id'],
+                'name': cat['name_ar'] if lang == 'ar' else cat['name_en'],
+                'has_children': bool(cat['children'])
             })
         
         return Response(results)
@@ -542,18 +542,25 @@ class ChildCategoryListView(APIView):
         if lang not in ['ar', 'en']:
             lang = 'ar'
         
-        parent = get_object_or_404(Category, id=parent_id)
-        children = parent.children.all()
+        parent = find_category(get_category_tree(), parent_id)
+        if parent is None:
+            raise Http404
         
         results = []
-        for child in children:
+        for child in parent['children']:
             results.append({
-                'id': child.id,
-                'name': child.name_ar if lang == 'ar' else child.name_en
+                'id': child['id'],
+                'name': child['name_ar'] if lang == 'ar' else child['name_en']
             })
         
         return Response(results)
 
+class CategoryCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request):
+        return Response(get_category_tree_stats())
+
 class ProductCreateView(APIView):
     permission_classes = [IsAuthenticated, IsSeller]
 
@@ -755,6 +762,7 @@ class SellerProductsByStatusView(APIView):
         - page_size: items per page (default: 20)
         - sort_by: created_at (default) or updated_at
         - sort_order: asc or desc (default: desc)
+        - cursor: opt-in keyset pagination (empty for the first page)
         """
         # Get query parameters
         status_filter = request.query_params.get('status', '').lower()
@@ -770,7 +778,7 @@ class SellerProductsByStatusView(APIView):
             lang = 'ar'
         
         # Base queryset - only products belonging to the seller
-        products = Product.objects.filter(seller=request.user)
+        products = Product.objects.filter(seller=request.user).for_listing()
         
         # Apply status filter if provided and valid
         valid_statuses = ['pending', 'approved', 'rejected']
@@ -820,6 +828,30 @@ class SellerProductsByStatusView(APIView):
         except (ValueError, TypeError):
             page_size = 20
         
+        # Keyset mode (?cursor=): no OFFSET scan and no per-status counts;
+        # the filtered total is only computed with ?count=exact|estimate
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_size=page_size)
+            page = keyset.paginate_queryset(products, request)
+            serializer = ProductLanguageSerializer(page, many=True, context={
+                'lang': lang,
+                'request': request,
+                'show_discount_details': True
+            })
+            return Response({
+                'status_filter': status_filter if status_filter else 'all',
+                'search_query': search_query if search_query else None,
+                'sorting': {
+                    'by': sort_by,
+                    'order': sort_order
+                },
+                'pagination': {
+                    'page_size': page_size,
+                    **keyset.get_pagination_data(),
+                },
+                'products': serializer.data
+            })
+        
         paginator = PageNumberPagination()
         paginator.page_size = page_size
         paginated_products = paginator.paginate_queryset(products, request)
@@ -1008,7 +1040,8 @@ class SellerProductDeleteView(APIView):
             status=status.HTTP_204_NO_CONTENT
         )    
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(CursorModeMixin, PageNumberPagination):
+    """Page-number pagination; ?cursor= switches to keyset mode (see products.pagination)."""
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -1017,6 +1050,8 @@ class StandardResultsSetPagination(PageNumberPagination):
         """
         Add page number validation and total pages count
         """
+        if KeysetPagination.is_requested(request):
+            return super().paginate_queryset(queryset, request, view)
         self.request = request  # Store the request object for link generation
         page_size = self.get_page_size(request)
         paginator = self.django_paginator_class(queryset, page_size)
@@ -1042,6 +1077,8 @@ class StandardResultsSetPagination(PageNumberPagination):
         """
         Include total pages in response with proper request context for links
         """
+        if self.keyset is not None:
+            return super().get_paginated_response(data)
         return Response({
             'count': self.page.paginator.count,
             'total_pages': self.total_pages,
@@ -1089,10 +1126,11 @@ class ProductListView(APIView):
         
         # Build sort parameter
         sort_prefix = '' if sort_direction == 'asc' else '-'
-        sort_param = f"{sort_prefix}{sort_by}"
+        # Sort by the price buyers pay, not the list price
+        sort_param = f"{sort_prefix}{'effective_price' if sort_by == 'price' else sort_by}"
         
         # Start with base queryset
-        products = Product.objects.filter(is_approved=True)
+        products = Product.objects.filter(is_approved=True).for_listing()
         
         # Apply category filters
         if category_id:
@@ -1103,13 +1141,13 @@ class ProductListView(APIView):
         # Apply price filters
         if min_price:
             try:
-                products = products.filter(price__gte=float(min_price))
+                products = products.filter(effective_price__gte=float(min_price))
             except (ValueError, TypeError):
                 pass
                 
         if max_price:
             try:
-                products = products.filter(price__lte=float(max_price))
+                products = products.filter(effective_price__lte=float(max_price))
             except (ValueError, TypeError):
                 pass
         
@@ -1145,19 +1183,8 @@ class ProductListView(APIView):
 
         # Apply discount filter
         if has_discount and has_discount.lower() in ['true', '1', 'yes']:
-            now = timezone.now()
-            products = products.filter(
-                Q(has_standalone_discount=True) &
-                Q(standalone_discount_percentage__isnull=False) &
-                (
-                    Q(standalone_discount_start__isnull=True) | 
-                    Q(standalone_discount_start__lte=now)
-                ) &
-                (
-                    Q(standalone_discount_end__isnull=True) | 
-                    Q(standalone_discount_end__gte=now)
-                )
-            )
+            # Standalone discounts and sale events, materialized by products.pricing
+            products = products.filter(active_discount_pct__isnull=False)
         
         if brand_id:
             try:
@@ -1225,10 +1252,11 @@ class AdminProductListView(APIView):
         
         # Build sort parameter
         sort_prefix = '' if sort_direction == 'asc' else '-'
-        sort_param = f"{sort_prefix}{sort_by}"
+        # Sort by the price buyers pay, not the list price
+        sort_param = f"{sort_prefix}{'effective_price' if sort_by == 'price' else sort_by}"
         
         # Start with base queryset
-        products = Product.objects.filter(is_approved=True)
+        products = Product.objects.filter(is_approved=True).for_listing()
         
         # Apply category filters
         if category_id:
@@ -1243,13 +1271,13 @@ class AdminProductListView(APIView):
         # Apply price filters
         if min_price:
             try:
-                products = products.filter(price__gte=float(min_price))
+                products = products.filter(effective_price__gte=float(min_price))
             except (ValueError, TypeError):
                 pass
                 
         if max_price:
             try:
-                products = products.filter(price__lte=float(max_price))
+                products = products.filter(effective_price__lte=float(max_price))
             except (ValueError, TypeError):
                 pass
         
@@ -1285,19 +1313,8 @@ class AdminProductListView(APIView):
 
         # Apply discount filter
         if has_discount and has_discount.lower() in ['true', '1', 'yes']:
-            now = timezone.now()
-            products = products.filter(
-                Q(has_standalone_discount=True) &
-                Q(standalone_discount_percentage__isnull=False) &
-                (
-                    Q(standalone_discount_start__isnull=True) | 
-                    Q(standalone_discount_start__lte=now)
-                ) &
-                (
-                    Q(standalone_discount_end__isnull=True) | 
-                    Q(standalone_discount_end__gte=now)
-                )
-            )
+            # Standalone discounts and sale events, materialized by products.pricing
+            products = products.filter(active_discount_pct__isnull=False)
         
         if brand_id:
             try:
@@ -1508,14 +1525,16 @@ class ProductEditRequestView(APIView):
                     Q(role='admin') | Q(role='super_admin') | Q(is_staff=True)
                 )
                 
-                for admin in admin_users:
-                    Notification.objects.create(
+                notify_many(
+                    Notification(
                         user=admin,
                         notification_type='product_edit_request',
                         message_ar=f"طلب تعديل جديد للمنتج: {product.name_ar} من قبل البائع: {request.user.username}",
                         message_en=f"New edit request for product: {product.name_en} by seller: {request.user.username}",
                         content_object=edit_request
                     )
+                    for admin in admin_users
+                )
             except Exception:
                 pass
             
@@ -1853,7 +1872,7 @@ class AdminProductsByStatusView(APIView):
             lang = 'ar'
         
         # Base queryset - all products for admin
-        products = Product.objects.all()
+        products = Product.objects.for_listing()
         
         # Apply status filter if provided and valid
         valid_statuses = ['pending', 'approved', 'rejected']
@@ -1988,13 +2007,13 @@ class CategoryProductsView(APIView):
             products = Product.objects.filter(
                 category__in=category.children.all(),
                 is_approved=True
-            ).order_by('-created_at')
+            ).for_listing().order_by('-created_at')
         else:
             # If it's a child category, get its products directly
             products = Product.objects.filter(
                 category=category,
                 is_approved=True
-            ).order_by('-created_at')
+            ).for_listing().order_by('-created_at')
      
         products = exclude_blocked_brands(products, request)
 
@@ -2071,13 +2090,13 @@ class ProductSearchView(APIView):
         brand_name = request.query_params.get('brand_name')
         
         # Get sorting parameters
-        sort_by = request.query_params.get('sort_by', '-created_at')  # Default: newest first
+        sort_by = request.query_params.get('sort_by', 'relevance')  # Default: best match first
         sort_direction = request.query_params.get('sort_direction', 'desc')  # Default: descending
         
         # Validate sort options
-        valid_sort_fields = ['price', 'created_at', 'rating']
+        valid_sort_fields = ['relevance', 'price', 'created_at', 'rating']
         if sort_by not in valid_sort_fields:
-            sort_by = 'created_at'
+            sort_by = 'relevance'
         
         # Validate sort direction
         sort_direction = sort_direction.lower()
@@ -2086,17 +2105,13 @@ class ProductSearchView(APIView):
         
         # Build sort parameter
         sort_prefix = '' if sort_direction == 'asc' else '-'
-        sort_param = f"{sort_prefix}{sort_by}"
+        sort_field = {'relevance': 'search_rank', 'price': 'effective_price'}.get(sort_by, sort_by)
+        sort_param = f"{sort_prefix}{sort_field}"
         
-        # Base queryset with search
-        products = Product.objects.filter(
-            (Q(name_ar__icontains=query) | 
-             Q(description_ar__icontains=query) |
-             Q(name_en__icontains=query) | 
-             Q(description_en__icontains=query) |
-             Q(brand__name__icontains=query)) & 
-            Q(is_approved=True)
-            )
+        # Base queryset: ranked matches from the search index
+        products = search_products(
+            Product.objects.filter(is_approved=True).for_listing(), query
+        )
         
         # Apply category filters
         if category_id:
@@ -2107,13 +2122,13 @@ class ProductSearchView(APIView):
         # Apply price filters
         if min_price:
             try:
-                products = products.filter(price__gte=float(min_price))
+                products = products.filter(effective_price__gte=float(min_price))
             except (ValueError, TypeError):
                 pass
                 
         if max_price:
             try:
-                products = products.filter(price__lte=float(max_price))
+                products = products.filter(effective_price__lte=float(max_price))
             except (ValueError, TypeError):
                 pass
         
@@ -2149,19 +2164,8 @@ class ProductSearchView(APIView):
 
         # Apply discount filter
         if has_discount and has_discount.lower() in ['true', '1', 'yes']:
-            now = timezone.now()
-            products = products.filter(
-                Q(has_standalone_discount=True) &
-                Q(standalone_discount_percentage__isnull=False) &
-                (
-                    Q(standalone_discount_start__isnull=True) | 
-                    Q(standalone_discount_start__lte=now)
-                ) &
-                (
-                    Q(standalone_discount_end__isnull=True) | 
-                    Q(standalone_discount_end__gte=now)
-                )
-            )
+            # Standalone discounts and sale events, materialized by products.pricing
+            products = products.filter(active_discount_pct__isnull=False)
         
         # Apply brand filters
         if brand_id:
@@ -2176,8 +2180,8 @@ class ProductSearchView(APIView):
         if brand_name:
             products = products.filter(brand__name__icontains=brand_name)
         
-        # Apply sorting
-        products = products.order_by(sort_param)
+        # Apply sorting (newest first among equally relevant results)
+        products = products.order_by(sort_param, '-created_at')
         products = exclude_blocked_brands(products, request)
 
         # Pagination
@@ -14,6 +14,9 @@ from .serializers import (
 )
 from orders.models import OrderItem
 from wallet.models import Wallet, Transaction
+from analytics.rollups import record_refund
+from analytics.export import ExportMixin, export_response
+from wallet.idempotency import idempotent
 from django.utils import timezone
 from notifications.models import Notification
 from decimal import Decimal
@@ -23,14 +26,28 @@ from django.core.paginator import Paginator, EmptyPage
 
 SELLER_APPROVAL_STATUSES = ['open_box', 'used', 'missing_parts']
 
+RETURN_EXPORT_COLUMNS = ['id', 'order_id', 'order_item_id', 'buyer_id', 'reason', 'status',
+                         'condition', 'quantity', 'refund_amount', 'requested_at', 'processed_at']
+
+
+def export_returns(fmt, queryset):
+    rows = queryset.order_by('-requested_at', '-id').values_list(*RETURN_EXPORT_COLUMNS)
+    return export_response(fmt, 'returns', RETURN_EXPORT_COLUMNS, rows)
+
 
 # For listing user's return requests
-class ReturnRequestListView(generics.ListAPIView):
+class ReturnRequestListView(ExportMixin, generics.ListAPIView):
     serializer_class = ReturnRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
     def get_queryset(self):
         return ReturnRequest.objects.filter(buyer=self.request.user).order_by('-requested_at')
 
+    def list(self, request, *args, **kwargs):
+        fmt = self.export_format()
+        if fmt:
+            return export_returns(fmt, ReturnRequest.objects.filter(buyer=request.user))
+        return super().list(request, *args, **kwargs)
+
 # For submitting a new return request
 class ReturnRequestCreateView(generics.CreateAPIView):
     serializer_class = ReturnRequestCreateSerializer
@@ -209,6 +226,7 @@ class ReturnRequestAdminUpdateView(APIView):
 
             # 4) Refund the buyer wallet
             process_refund_and_restock(return_request)
+            record_refund(return_request)
 
             # 5) Apply penalties to seller based on bad conditions
             try:
@@ -306,6 +324,7 @@ class ReturnRequestRejectView(APIView):
 class RefundWholeOrderView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent('refund_whole_order')
     def post(self, request, order_id):
         user = request.user
         try:
@@ -384,15 +403,19 @@ def process_refund_and_restock(return_request):
         transaction_type=Transaction.TransactionType.REFUND,
         description=f"Refund for ReturnRequest #{return_request.id}",
         reference=f"RETURN_{return_request.id}",
-        return_request=return_request
+        return_request=return_request,
+        balance_delta=refund_amount,
     )
 
 # Optionally, list all return requests for admin
-class ReturnRequestAdminListView(generics.ListAPIView):
+class ReturnRequestAdminListView(ExportMixin, generics.ListAPIView):
     serializer_class = ReturnRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
+        fmt = self.export_format()
+        if fmt:
+            return export_returns(fmt, ReturnRequest.objects.all())
         queryset = self.get_queryset()
         grouped = defaultdict(list)
 
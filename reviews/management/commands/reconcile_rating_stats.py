@@ -0,0 +1,15 @@
+# reviews/management/commands/reconcile_rating_stats.py
+from django.core.management.base import BaseCommand
+
+from reviews.stats import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds product and seller rating stats and Product.rating from the review table'
+
+    def handle(self, *args, **options):
+        report = rebuild_rating_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed {report['products_fixed']} product and {report['sellers_fixed']} seller stats rows, "
+            f"{report['ratings_fixed']} product ratings; removed {report['rows_removed']} orphaned rows"
+        ))
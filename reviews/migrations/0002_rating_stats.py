@@ -0,0 +1,77 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    Product = apps.get_model('products', 'Product')
+    ProductRatingStats = apps.get_model('reviews', 'ProductRatingStats')
+    SellerRatingStats = apps.get_model('reviews', 'SellerRatingStats')
+    fields = ['rating_sum', 'rating_count'] + [f'star_{s}' for s in range(1, 6)]
+
+    rows = (Review.objects.values('product_id', 'product__seller_id').order_by()
+            .annotate(rating_sum=Sum('rating'), rating_count=Count('id'),
+                      **{f'star_{s}': Count('id', filter=Q(rating=s)) for s in range(1, 6)}))
+    products, sellers = [], {}
+    for row in rows:
+        values = {field: row[field] for field in fields}
+        products.append(ProductRatingStats(product_id=row['product_id'], **values))
+        totals = sellers.setdefault(row['product__seller_id'], dict.fromkeys(fields, 0))
+        for field in fields:
+            totals[field] += values[field]
+    ProductRatingStats.objects.bulk_create(products, batch_size=500)
+    SellerRatingStats.objects.bulk_create(
+        [SellerRatingStats(seller_id=seller_id, **values) for seller_id, values in sellers.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_alter_profile_latitude_alter_profile_longitude'),
+        ('products', '0025_product_effective_price'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingStats',
+            fields=[
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='products.product')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SellerRatingStats',
+            fields=[
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
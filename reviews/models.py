@@ -30,3 +30,49 @@ class Review(models.Model):
         # Optional: enforce review only after delivery/completion
         if self.order.status not in [OrderStatus.DELIVERED, OrderStatus.COMPLETED]:
             raise ValueError("You can only review after the order is delivered.")
+
+
+STARS = range(1, 6)
+
+
+class RatingStats(models.Model):
+    """
+    Running rating aggregates: sum, count and a 1–5 star histogram. Kept up to
+    date from review deltas by reviews.stats, rebuilt by the
+    reconcile_rating_stats command.
+    """
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def buckets(self):
+        return {star: getattr(self, f'star_{star}') for star in STARS}
+
+
+class ProductRatingStats(RatingStats):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats')
+
+    def __str__(self):
+        return f"{self.product_id}: {self.rating_count} ratings"
+
+
+class SellerRatingStats(RatingStats):
+    """Roll-up of ProductRatingStats over a seller's products."""
+    seller = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='rating_stats')
+
+    def __str__(self):
+        return f"seller {self.seller_id}: {self.rating_count} ratings"
@@ -1,17 +1,25 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
-from django.db.models import Avg
+
 from .models import Review
+from .stats import apply_rating_change
+
+
+@receiver(post_init, sender=Review)
+def remember_rating(sender, instance, **kwargs):
+    # The persisted rating, so an update can be applied as a delta (read from
+    # __dict__ so a deferred field is not loaded)
+    instance._saved_rating = instance.__dict__.get('rating') if instance.pk else None
 
-def _recalc_product_rating(product):
-    agg = product.reviews.aggregate(avg=Avg('rating'))
-    product.rating = agg['avg'] or None  # keep None if no reviews
-    product.save(update_fields=['rating'])
 
 @receiver(post_save, sender=Review)
-def on_review_save(sender, instance, **kwargs):
-    _recalc_product_rating(instance.product)
+def on_review_save(sender, instance, created, **kwargs):
+    old_rating = None if created else instance._saved_rating
+    if old_rating != instance.rating:
+        apply_rating_change(instance.product_id, instance.product.seller_id, old_rating, instance.rating)
+    instance._saved_rating = instance.rating
+
 
 @receiver(post_delete, sender=Review)
 def on_review_delete(sender, instance, **kwargs):
-    _recalc_product_rating(instance.product)
+    apply_rating_change(instance.product_id, instance.product.seller_id, old_rating=instance._saved_rating)
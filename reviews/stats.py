@@ -0,0 +1,128 @@
+# reviews/stats.py
+"""
+Incremental rating aggregates.
+
+Every review create/update/delete is applied as a delta to the product's
+and the seller's RatingStats row (a couple of single-row UPDATEs with F()
+expressions, independent of how many reviews exist), and Product.rating is
+refreshed from the product row. rebuild_rating_stats() recomputes all of it
+from the Review table for reconciliation.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from products.models import Product
+
+from .models import STARS, ProductRatingStats, Review, SellerRatingStats
+
+STAT_FIELDS = ['rating_sum', 'rating_count', *(f'star_{star}' for star in STARS)]
+
+
+def _deltas(old_rating, new_rating):
+    deltas = dict.fromkeys(STAT_FIELDS, 0)
+    if old_rating:
+        deltas['rating_sum'] -= old_rating
+        deltas['rating_count'] -= 1
+        deltas[f'star_{old_rating}'] -= 1
+    if new_rating:
+        deltas['rating_sum'] += new_rating
+        deltas['rating_count'] += 1
+        deltas[f'star_{new_rating}'] += 1
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def _average(rating_sum, rating_count):
+    if not rating_count:
+        return None
+    return (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+@transaction.atomic
+def apply_rating_change(product_id, seller_id, old_rating=None, new_rating=None):
+    """
+    Move one review from old_rating to new_rating (None for create/delete).
+    Stats rows are only inserted for a new review; updates and deletes touch
+    existing rows, so a cascade from a deleted product or seller never
+    inserts a dangling row.
+    """
+    deltas = _deltas(old_rating, new_rating)
+    if not deltas:
+        return
+    if old_rating is None:
+        ProductRatingStats.objects.bulk_create([ProductRatingStats(product_id=product_id)], ignore_conflicts=True)
+        SellerRatingStats.objects.bulk_create([SellerRatingStats(seller_id=seller_id)], ignore_conflicts=True)
+
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    ProductRatingStats.objects.filter(pk=product_id).update(**changes)
+    SellerRatingStats.objects.filter(pk=seller_id).update(**changes)
+
+    row = ProductRatingStats.objects.filter(pk=product_id).values_list('rating_sum', 'rating_count').first()
+    if row is not None:
+        Product.objects.filter(pk=product_id).update(rating=_average(*row))
+
+
+def seller_stats(seller):
+    """The seller's roll-up, or an empty (unsaved) one if nothing was rated yet."""
+    seller_id = getattr(seller, 'pk', seller)
+    return SellerRatingStats.objects.filter(pk=seller_id).first() or SellerRatingStats(seller_id=seller_id)
+
+
+def global_stats():
+    """Platform-wide totals summed over the seller roll-ups."""
+    totals = SellerRatingStats.objects.aggregate(**{field: Sum(field) for field in STAT_FIELDS})
+    return SellerRatingStats(**{field: value or 0 for field, value in totals.items()})
+
+
+@transaction.atomic
+def rebuild_rating_stats():
+    """
+    Recompute product and seller stats and Product.rating from the Review
+    table. Returns how many rows were created, corrected or removed.
+    """
+    expected = {
+        row.pop('product_id'): row
+        for row in (Review.objects.values('product_id').order_by()
+                    .annotate(rating_sum=Sum('rating'), rating_count=Count('id'),
+                              **{f'star_{s}': Count('id', filter=Q(rating=s)) for s in STARS}))
+    }
+    report = {'products_fixed': 0, 'sellers_fixed': 0, 'ratings_fixed': 0, 'rows_removed': 0}
+
+    current = {row.pop('product_id'): row for row in ProductRatingStats.objects.values('product_id', *STAT_FIELDS)}
+    report['rows_removed'] += ProductRatingStats.objects.exclude(product_id__in=expected).delete()[0]
+    stale = [
+        ProductRatingStats(product_id=product_id, **values)
+        for product_id, values in expected.items() if current.get(product_id) != values
+    ]
+    ProductRatingStats.objects.bulk_create(
+        stale, batch_size=500, update_conflicts=True, unique_fields=['product'], update_fields=STAT_FIELDS,
+    )
+    report['products_fixed'] = len(stale)
+
+    sellers = {}
+    for seller_id, product_id in Product.objects.filter(pk__in=expected).values_list('seller_id', 'pk'):
+        totals = sellers.setdefault(seller_id, dict.fromkeys(STAT_FIELDS, 0))
+        for field in STAT_FIELDS:
+            totals[field] += expected[product_id][field]
+    current = {row.pop('seller_id'): row for row in SellerRatingStats.objects.values('seller_id', *STAT_FIELDS)}
+    report['rows_removed'] += SellerRatingStats.objects.exclude(seller_id__in=sellers).delete()[0]
+    stale = [
+        SellerRatingStats(seller_id=seller_id, **values)
+        for seller_id, values in sellers.items() if current.get(seller_id) != values
+    ]
+    SellerRatingStats.objects.bulk_create(
+        stale, batch_size=500, update_conflicts=True, unique_fields=['seller'], update_fields=STAT_FIELDS,
+    )
+    report['sellers_fixed'] = len(stale)
+
+    wrong = []
+    for product in Product.objects.filter(Q(pk__in=expected) | Q(rating__isnull=False)).only('pk', 'rating'):
+        values = expected.get(product.pk)
+        rating = _average(values['rating_sum'], values['rating_count']) if values else None
+        if product.rating != rating:
+            product.rating = rating
+            wrong.append(product)
+    Product.objects.bulk_update(wrong, ['rating'], batch_size=500)
+    report['ratings_fixed'] = len(wrong)
+    return report
@@ -1,3 +1,110 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Role
+from accounts.testing import make_user
+from orders.models import Order, OrderItem, OrderStatus
+from products.models import Category, Product
+
+from .models import ProductRatingStats, Review, SellerRatingStats
+from .stats import global_stats
+
+
+class RatingStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = make_user('seller', role=Role.SELLER)
+        category = Category.objects.create(name_ar='فئة', name_en='Category')
+        cls.products = [
+            Product.objects.create(seller=cls.seller, category=category, name_en=f'P{i}',
+                                   price=Decimal('10.00'), quantity=10, is_approved=True, status='approved')
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _review(self, product, rating):
+        buyer = make_user(f'buyer{Review.objects.count()}')
+        order = Order.objects.create(buyer=buyer, total_amount=product.price, status=OrderStatus.DELIVERED)
+        item = OrderItem.objects.create(order=order, product=product, seller=self.seller,
+                                        quantity=1, price_at_purchase=product.price)
+        return Review.objects.create(buyer=buyer, product=product, order=order, order_item=item, rating=rating)
+
+    def _stats(self, product):
+        return ProductRatingStats.objects.get(product=product)
+
+    def test_create_update_delete_apply_deltas(self):
+        product = self.products[0]
+        first = self._review(product, 5)
+        second = self._review(product, 2)
+
+        stats = self._stats(product)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (7, 2))
+        self.assertEqual(stats.buckets, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+        product.refresh_from_db()
+        self.assertEqual(product.rating, Decimal('3.50'))
+
+        second = Review.objects.get(pk=second.pk)
+        second.rating = 4
+        second.save()
+        second.save()  # unchanged rating must not be counted twice
+        self.assertEqual(self._stats(product).buckets, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+
+        first.delete()
+        stats = self._stats(product)
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.star_5), (4, 1, 0))
+        product.refresh_from_db()
+        self.assertEqual(product.rating, Decimal('4.00'))
+
+        second.delete()
+        product.refresh_from_db()
+        self.assertIsNone(product.rating)
+
+    def test_update_cost_does_not_grow_with_review_count(self):
+        product = self.products[0]
+        for _ in range(5):
+            self._review(product, 3)
+        review = Review.objects.first()
+        review.rating = 1
+        # review + product rows, two stats updates, Product.rating refresh
+        with self.assertNumQueries(8):
+            review.save()
+
+    def test_seller_and_global_rollups(self):
+        self._review(self.products[0], 5)
+        self._review(self.products[1], 3)
+        self._review(self.products[1], 1)
+
+        seller = SellerRatingStats.objects.get(seller=self.seller)
+        self.assertEqual((seller.rating_sum, seller.rating_count), (9, 3))
+        self.assertEqual(global_stats().average, 3)
+
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        with self.assertNumQueries(1):
+            response = client.get('/api/analytics/seller/ratings/', secure=True)
+        self.assertEqual(response.data, {'avg': 3.0, 'buckets': {1: 1, 2: 0, 3: 1, 4: 0, 5: 1}})
+
+        counts = dict(Product.objects.for_listing().values_list('pk', 'ratings_count'))
+        self.assertEqual(counts, {self.products[0].pk: 1, self.products[1].pk: 2})
+
+    def test_reconcile_repairs_drift(self):
+        product = self.products[0]
+        self._review(product, 4)
+        self._review(product, 2)
+        ProductRatingStats.objects.filter(product=product).update(rating_sum=100, star_1=3)
+        SellerRatingStats.objects.all().delete()
+        Product.objects.filter(pk=product.pk).update(rating=Decimal('1.00'))
+
+        call_command('reconcile_rating_stats', stdout=open('/dev/null', 'w'))
 
-# Create your tests here.
+        stats = self._stats(product)
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.star_1), (6, 2, 0))
+        self.assertEqual(SellerRatingStats.objects.get(seller=self.seller).rating_count, 2)
+        product.refresh_from_db()
+        self.assertEqual(product.rating, Decimal('3.00'))
@@ -0,0 +1,161 @@
+# wallet/idempotency.py
+"""
+Idempotency-Key support for money-moving POST endpoints.
+
+A client that may retry (checkout, bids, buy-now, transfers, refunds) sends
+an `Idempotency-Key` header. The first request with a key claims it by
+inserting an IdempotencyRecord (unique per user and key) with a short
+processing lease. The view then runs in a transaction, and its response is
+stored in that same transaction. Either the view's writes and the stored
+response commit together, or neither does. A retry with the same key and
+request:
+
+  * gets the stored response replayed (`Idempotent-Replayed: true`)
+    without the view, its locks or the wallets being touched again,
+  * gets 409 while the first request still holds its lease, or
+  * takes the key over once the lease has expired (the first request
+    died or timed out, so nothing of it was committed). If the first
+    request does finish later, it finds it no longer holds the key and
+    rolls back.
+
+Reusing a key for a different request (another endpoint or body) is
+refused with 422. Server errors (5xx) and responses that ask the client to
+retry (409, 429, or a Retry-After header) are not stored, and the key is
+released. Records expire after IDEMPOTENCY_KEY_TTL seconds and are deleted
+by `manage.py purge_idempotency_keys`. Requests without the header are not
+affected.
+"""
+import hashlib
+import json
+import math
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+TTL_SECONDS = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+LEASE_SECONDS = getattr(settings, 'IDEMPOTENCY_KEY_LEASE', 30)
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 64
+RETRY_STATUSES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def _fingerprint(scope, request, kwargs):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    raw = json.dumps([scope, sorted(kwargs.items()), data], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _claim(request, key, scope, fingerprint):
+    """
+    (record, created). An expired record for the key is replaced, and an
+    unfinished one whose lease ran out is taken over.
+    """
+    now = timezone.now()
+    lease = now + timezone.timedelta(seconds=LEASE_SECONDS)
+    record = None
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    user=request.user, key=key, scope=scope, fingerprint=fingerprint, locked_until=lease,
+                    expires_at=now + timezone.timedelta(seconds=TTL_SECONDS),
+                ), True
+        except IntegrityError:
+            record = IdempotencyRecord.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at <= now:
+                IdempotencyRecord.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+                continue
+            if (record.status_code is None and record.fingerprint == fingerprint and record.locked_until <= now
+                    and IdempotencyRecord.objects
+                    .filter(pk=record.pk, status_code__isnull=True, locked_until=record.locked_until)
+                    .update(locked_until=lease)):
+                record.locked_until = lease
+                return record, True
+            return record, False
+    return record, False
+
+
+def _retry_later(record, now):
+    response = _error('A request with this Idempotency-Key is still being processed.', status.HTTP_409_CONFLICT)
+    remaining = (record.locked_until - now).total_seconds() if record else 0
+    response['Retry-After'] = str(max(1, math.ceil(remaining)))
+    return response
+
+
+def _error(message, status_code):
+    return Response({'error': message}, status=status_code)
+
+
+def _existing(record, fingerprint):
+    """Response for a key another request holds or has completed."""
+    if record is not None and record.fingerprint != fingerprint:
+        return _error(f'{HEADER} was already used for a different request.', status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record is None or record.status_code is None:
+        return _retry_later(record, timezone.now())
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _retryable(response):
+    return response.status_code >= 500 or response.status_code in RETRY_STATUSES or response.has_header('Retry-After')
+
+
+def idempotent(scope):
+    """Decorator for an APIView.post; `scope` names the endpoint in the stored fingerprint."""
+    def decorator(post):
+        @wraps(post)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return post(view, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return _error(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.',
+                              status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = _fingerprint(scope, request, kwargs)
+            record, created = _claim(request, key, scope, fingerprint)
+            if not created:
+                return _existing(record, fingerprint)
+
+            held = IdempotencyRecord.objects.filter(
+                pk=record.pk, status_code__isnull=True, locked_until=record.locked_until)
+            release, lost = True, False
+            try:
+                with transaction.atomic():
+                    response = post(view, request, *args, **kwargs)
+                    if not _retryable(response):
+                        # stored as the client saw it (DRF's JSON rendering of Decimals, dates...)
+                        body = json.loads(JSONRenderer().render(response.data) or 'null')
+                        if held.update(status_code=response.status_code, response_body=body):
+                            release = False
+                        else:
+                            # the lease ran out and a retry took the key over:
+                            # undo this request's writes and leave the key to it
+                            transaction.set_rollback(True)
+                            release, lost = False, True
+            finally:
+                if release:
+                    held.delete()
+            if lost:
+                return _existing(IdempotencyRecord.objects.filter(pk=record.pk).first(), fingerprint)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired(now=None):
+    """Delete expired records; returns how many."""
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,115 @@
+# wallet/ledger.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from .models import Transaction, Wallet
+from .shards import credit_shards, roll_up
+
+
+class LedgerWriter:
+    """
+    Collects wallet movements and writes them in bulk.
+
+    post() only records a Transaction row plus balance/held deltas per user.
+    flush() locks every touched wallet in primary-key order (so concurrent
+    writers cannot deadlock), applies all deltas with a single UPDATE built
+    from F() expressions, and bulk_creates the transactions.
+    Must be flushed inside transaction.atomic().
+
+    Wallets with shard_count > 0 that only receive credits are not locked at
+    all: their credits go to WalletShard rows (see wallet/shards.py).
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])
+        self.entries = []
+
+    def post(self, user_id, amount, transaction_type, description='', reference='',
+             balance_delta=Decimal('0.00'), held_delta=Decimal('0.00'), **extra):
+        delta = self.deltas[user_id]
+        delta[0] += balance_delta
+        delta[1] += held_delta
+        self.entries.append((user_id, balance_delta, held_delta, dict(
+            amount=amount,
+            transaction_type=transaction_type,
+            description=description,
+            reference=reference,
+            is_successful=True,
+            balance_delta=balance_delta,
+            held_delta=held_delta,
+            **extra,
+        )))
+
+    def _sharded_credits(self):
+        """{user_id: (wallet_id, shard_count)} for sharded wallets touched only by credits."""
+        debited = {user_id for user_id, balance, held, _ in self.entries if balance < 0 or held}
+        candidates = set(self.deltas) - debited
+        if not candidates:
+            return {}
+        return {
+            user_id: (wallet_id, shard_count)
+            for user_id, wallet_id, shard_count in (Wallet.objects
+                                                    .filter(user_id__in=candidates, shard_count__gt=0)
+                                                    .values_list('user_id', 'pk', 'shard_count'))
+        }
+
+    def lock_wallets(self, user_ids):
+        """Lock the wallets in pk order; returns {user_id: wallet_id}."""
+        user_ids = sorted(user_ids)
+        rows = list(
+            Wallet.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .order_by('pk')
+            .values_list('user_id', 'pk', 'shard_count')
+        )
+        missing = set(user_ids) - {user_id for user_id, _, _ in rows}
+        if missing:
+            raise Wallet.DoesNotExist(f"No wallet for user(s) {sorted(missing)}")
+        # A sharded wallet being debited gets its shards folded in first, so
+        # the main balance reflects everything it holds
+        for _, wallet_id, shard_count in rows:
+            if shard_count:
+                roll_up(wallet_id)
+        return {user_id: wallet_id for user_id, wallet_id, _ in rows}
+
+    def flush(self):
+        if not self.entries and not self.deltas:
+            return []
+        sharded = self._sharded_credits()
+        wallet_ids = self.lock_wallets(set(self.deltas) - set(sharded))
+
+        balance_whens, held_whens = [], []
+        for user_id, wallet_id in wallet_ids.items():
+            balance, held = self.deltas[user_id]
+            if balance:
+                balance_whens.append(When(pk=wallet_id, then=Value(balance)))
+            if held:
+                held_whens.append(When(pk=wallet_id, then=Value(held)))
+
+        changes = {}
+        zero = Value(Decimal('0.00'))
+        if balance_whens:
+            changes['balance'] = F('balance') + Case(*balance_whens, default=zero, output_field=DecimalField())
+        if held_whens:
+            changes['held_balance'] = F('held_balance') + Case(*held_whens, default=zero, output_field=DecimalField())
+        if changes:
+            Wallet.objects.filter(pk__in=wallet_ids.values()).update(updated_at=timezone.now(), **changes)
+
+        for user_id, (wallet_id, shard_count) in sorted(sharded.items()):
+            wallet_ids[user_id] = wallet_id
+            credit_shards(wallet_id, shard_count, [
+                (fields['reference'], balance)
+                for entry_user, balance, _, fields in self.entries
+                if entry_user == user_id and balance
+            ])
+
+        transactions = Transaction.objects.bulk_create([
+            Transaction(wallet_id=wallet_ids[user_id], **fields)
+            for user_id, _, _, fields in self.entries
+        ])
+        self.deltas.clear()
+        self.entries = []
+        return transactions
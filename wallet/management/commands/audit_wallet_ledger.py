@@ -0,0 +1,51 @@
+# wallet/management/commands/audit_wallet_ledger.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.audit import RANGE_SIZE, audit
+
+class Command(BaseCommand):
+    help = 'Checks every wallet balance against its transaction ledger and reports drift (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Wallet-id ranges audited in parallel')
+        parser.add_argument('--range-size', type=int, default=RANGE_SIZE, help='Wallets per range')
+        parser.add_argument('--from-id', type=int, help='First wallet id to audit')
+        parser.add_argument('--to-id', type=int, help='Last wallet id to audit')
+        parser.add_argument('--checkpoint', action='store_true',
+                            help='Checkpoint wallets without drift so the next run only scans newer transactions')
+        parser.add_argument('--output', help="Write the JSON report to this path ('-' for stdout)")
+        parser.add_argument('--fail-on-drift', action='store_true')
+
+    def handle(self, *args, **options):
+        report = audit(
+            workers=options['workers'], range_size=options['range_size'], checkpoint=options['checkpoint'],
+            first_id=options['from_id'], last_id=options['to_id'],
+        )
+
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            if options['output']:
+                with open(options['output'], 'w') as f:
+                    json.dump(report, f, indent=2)
+            for row in report['drift']:
+                self.stdout.write(self.style.ERROR(
+                    f"Wallet #{row['wallet_id']} (user {row['user_id']}): balance {row['actual_balance']} "
+                    f"vs ledger {row['expected_balance']}, held {row['actual_held_balance']} "
+                    f"vs ledger {row['expected_held_balance']}"
+                ))
+            self.stdout.write(
+                f"Audited {report['wallets']} wallets in {report['ranges']} ranges, "
+                f"{report['transactions_scanned']} transactions in {report['seconds']}s "
+                f"({report['transactions_per_second']}/s); {report['checkpoints_written']} checkpoints written"
+            )
+
+        if report['drifted_wallets']:
+            message = f"{report['drifted_wallets']} wallet(s) drifted from the ledger"
+            if options['fail_on_drift']:
+                raise CommandError(message)
+            self.stderr.write(message)
+        elif options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS('No drift'))
@@ -0,0 +1,17 @@
+# wallet/management/commands/checkpoint_wallet_balances.py
+from django.core.management.base import BaseCommand
+
+from wallet.statements import CHECKPOINT_EVERY, write_checkpoints
+
+class Command(BaseCommand):
+    help = 'Snapshots wallet balances into ledger checkpoints for historical balance lookups (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=CHECKPOINT_EVERY,
+                            help='Checkpoint wallets with at least this many transactions since their last one')
+
+    def handle(self, *args, **options):
+        result = write_checkpoints(every=options['every'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {result['wallets']} wallets, wrote {result['written']} checkpoints"
+        ))
@@ -0,0 +1,11 @@
+# wallet/management/commands/purge_idempotency_keys.py
+from django.core.management.base import BaseCommand
+
+from wallet.idempotency import purge_expired
+
+class Command(BaseCommand):
+    help = 'Deletes expired Idempotency-Key records (run periodically)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys"))
@@ -0,0 +1,18 @@
+# wallet/management/commands/roll_up_wallet_shards.py
+from django.core.management.base import BaseCommand
+
+from wallet.shards import enable_platform_sharding, roll_up_all
+
+class Command(BaseCommand):
+    help = 'Folds sharded wallet credits into the main wallet balances (run periodically)'
+
+    def handle(self, *args, **options):
+        wallet = enable_platform_sharding()
+        if wallet is not None:
+            self.stdout.write(f'Platform wallet #{wallet.pk} now uses {wallet.shard_count} shards')
+
+        moved = roll_up_all()
+        for wallet_id, amount in moved.items():
+            self.stdout.write(f'Wallet #{wallet_id}: rolled up {amount}')
+
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {len(moved)} wallets'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.2 on 2026-10-16 23:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0005_transaction_return_request'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WalletShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='wallet.wallet')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'shard'), name='unique_wallet_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.2 on 2026-10-17 00:00
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_checkpoints(apps, schema_editor):
+    """
+    Existing transactions carry no deltas, so each wallet opens its ledger
+    with its current balances, positioned after its last transaction.
+    """
+    Wallet = apps.get_model('wallet', 'Wallet')
+    Transaction = apps.get_model('wallet', 'Transaction')
+    WalletShard = apps.get_model('wallet', 'WalletShard')
+    BalanceCheckpoint = apps.get_model('wallet', 'BalanceCheckpoint')
+
+    shard_totals = dict(WalletShard.objects.values('wallet_id').annotate(total=Sum('balance'))
+                        .values_list('wallet_id', 'total'))
+    checkpoints = []
+    for wallet in Wallet.objects.only('pk', 'balance', 'held_balance', 'created_at').iterator():
+        last = (Transaction.objects.filter(wallet_id=wallet.pk)
+                .order_by('-created_at', '-id').values_list('created_at', 'id').first())
+        position_at, position_id = last or (wallet.created_at, 0)
+        checkpoints.append(BalanceCheckpoint(
+            wallet_id=wallet.pk, position_at=position_at, position_id=position_id,
+            balance=wallet.balance + (shard_totals.get(wallet.pk) or Decimal('0.00')),
+            held_balance=wallet.held_balance,
+        ))
+    BalanceCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('returns', '0004_alter_returnrequest_status'),
+        ('wallet', '0006_wallet_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position_at', models.DateTimeField()),
+                ('position_id', models.BigIntegerField(default=0)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('held_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='balance_delta',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='held_delta',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'created_at', 'id'], name='txn_wallet_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='balancecheckpoint',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='wallet.wallet'),
+        ),
+        migrations.AddIndex(
+            model_name='balancecheckpoint',
+            index=models.Index(fields=['wallet', 'position_at', 'position_id'], name='checkpoint_wallet_pos_idx'),
+        ),
+        migrations.RunPython(open_checkpoints, migrations.RunPython.noop),
+    ]
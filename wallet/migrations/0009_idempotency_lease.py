@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-17 00:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0008_idempotency_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='locked_until',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
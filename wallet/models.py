@@ -4,10 +4,28 @@ from django.db import models
 # wallet/models.py
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from django.conf import settings
+from django.utils import timezone
 from returns.models import ReturnRequest
 
+
+class WalletQuerySet(models.QuerySet):
+    def with_shard_balance(self):
+        """Annotate shard_balance (sum of un-rolled-up shard credits) in the same SELECT."""
+        shards = (WalletShard.objects
+                  .filter(wallet=models.OuterRef('pk'))
+                  .values('wallet')
+                  .annotate(total=models.Sum('balance'))
+                  .values('total'))
+        return self.annotate(shard_balance=Coalesce(
+            models.Subquery(shards, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+
 class Wallet(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -24,10 +42,31 @@ class Wallet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # >0: credits from the ledger writer land on this many WalletShard rows
+    # instead of this (hot) row; see wallet/shards.py
+    shard_count = models.PositiveSmallIntegerField(default=0)
+
+    objects = WalletQuerySet.as_manager()
+
+    @property
+    def total_balance(self):
+        """
+        Main balance plus shard credits not yet rolled up. Uses the
+        with_shard_balance() annotation when present, otherwise reads both in
+        one statement; the instance is left untouched.
+        """
+        if hasattr(self, 'shard_balance'):
+            return self.balance + self.shard_balance
+        if not self.shard_count:
+            return self.balance
+        return (Wallet.objects.with_shard_balance()
+                .annotate(total_balance=models.F('balance') + models.F('shard_balance'))
+                .values_list('total_balance', flat=True)
+                .get(pk=self.pk))
 
     @property
     def available_balance(self):
-        return self.balance - self.held_balance
+        return self.total_balance - self.held_balance
 
     def __str__(self):
         return f"{self.user.email}'s Wallet (${self.balance})"
@@ -39,6 +78,21 @@ class Wallet(models.Model):
         self.held_balance += amount
         self.save()
     
+class WalletShard(models.Model):
+    """One sub-balance of a sharded wallet; folded into Wallet.balance by roll-up."""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'shard'], name='unique_wallet_shard'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of wallet #{self.wallet_id} (${self.balance})"
+
 class Transaction(models.Model):
     class TransactionType(models.TextChoices):
         DEPOSIT = 'deposit', 'Deposit'
@@ -85,13 +139,68 @@ class Transaction(models.Model):
         on_delete=models.SET_NULL,
         related_name='transactions'
     )
+    # Signed effect of this entry on the wallet. Summed over a wallet's
+    # ledger (from its latest checkpoint) they give its balances.
+    balance_delta = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    held_delta = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['reference']),
             models.Index(fields=['created_at']),
+            # per-wallet history, keyset pagination and checkpoint tail scans
+            models.Index(fields=['wallet', 'created_at', 'id'], name='txn_wallet_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} of ${self.amount} ({self.reference})"
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    A wallet's balances as of one ledger position: every transaction up to
+    and including (position_at, position_id) in (created_at, id) order.
+    See wallet/statements.py.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='checkpoints')
+    position_at = models.DateTimeField()
+    position_id = models.BigIntegerField(default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    held_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'position_at', 'position_id'], name='checkpoint_wallet_pos_idx'),
+        ]
+
+    def __str__(self):
+        return f"Wallet #{self.wallet_id} at {self.position_at:%Y-%m-%d %H:%M} (${self.balance})"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The outcome of one money-moving request sent with an Idempotency-Key;
+    retries replay it (see wallet/idempotency.py). status_code is null while
+    the first request is still running; it holds the key until locked_until,
+    after which a retry may take it over.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=64)
+    scope = models.CharField(max_length=50)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
         ]
 
     def __str__(self):
-        return f"{self.transaction_type} of ${self.amount} ({self.reference})"
\ No newline at end of file
+        return f"{self.scope} {self.key} ({self.status_code or 'in progress'})"
@@ -9,7 +9,8 @@ User = get_user_model()
 
 class WalletSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
-    balance = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    # includes shard credits not yet rolled up (sharded wallets)
+    balance = serializers.DecimalField(source='total_balance', max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Wallet
@@ -25,9 +26,9 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'wallet', 'amount', 'transaction_type',
             'recipient', 'description', 'created_at',
-            'is_successful', 'reference'
+            'is_successful', 'reference', 'balance_delta', 'held_delta'
         ]
-        read_only_fields = ['is_successful', 'reference']
+        read_only_fields = ['is_successful', 'reference', 'balance_delta', 'held_delta']
 
 class TransferSerializer(serializers.Serializer):
     recipient_email = serializers.EmailField()
@@ -37,12 +38,9 @@ class TransferSerializer(serializers.Serializer):
         min_value=Decimal('0.01')
     )
     description = serializers.CharField(max_length=255, required=False)
-
-    def validate_amount(self, value):
-        wallet = self.context['request'].user.wallet
-        if value > wallet.balance:
-            raise serializers.ValidationError("Insufficient funds")
-        return value
+    # retries with the same key return the original transfer (see wallet/transfers.py);
+    # funds are checked there, under the wallet locks, so a retry is not refused
+    idempotency_key = serializers.CharField(max_length=64, required=False)
 
     def validate_recipient_email(self, value):
         if value == self.context['request'].user.email:
@@ -55,4 +53,21 @@ class BalanceAdjustmentSerializer(serializers.Serializer):
         decimal_places=2,
         min_value=Decimal('0.01')
     )
-    reason = serializers.CharField(max_length=255, required=False)
\ No newline at end of file
+    reason = serializers.CharField(max_length=255, required=False)
+
+class StatementSerializer(serializers.Serializer):
+    wallet_id = serializers.IntegerField()
+    to = serializers.DateTimeField()
+    opening_balance = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    opening_held_balance = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    credits = serializers.DecimalField(max_digits=12, decimal_places=2)
+    debits = serializers.DecimalField(max_digits=12, decimal_places=2)
+    transaction_count = serializers.IntegerField()
+    closing_balance = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    closing_held_balance = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+
+    def get_fields(self):
+        # 'from' is a keyword, so it cannot be declared as a class attribute
+        fields = super().get_fields()
+        fields['from'] = serializers.DateTimeField()
+        return fields
@@ -0,0 +1,107 @@
+# wallet/shards.py
+"""
+Sharded wallet balances.
+
+A wallet with shard_count > 0 (the platform fee wallet, or any very busy
+seller) does not take ledger credits on its own row. Each credit is added
+to one of its WalletShard rows, picked by hashing the transaction reference,
+so concurrent settlements contend on N rows instead of one. roll_up() moves
+shard balances into Wallet.balance; Wallet.total_balance / available_balance
+read both in a single statement, so a roll-up in progress is never seen
+half-done.
+"""
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Wallet, WalletShard
+
+
+def shard_for(key, shard_count):
+    return zlib.crc32(str(key).encode()) % shard_count
+
+
+def credit_shards(wallet_id, shard_count, credits):
+    """
+    Add [(key, amount)] to the wallet's shards. Shards are updated in index
+    order so two writers never wait on each other's rows in opposite order.
+    """
+    per_shard = defaultdict(Decimal)
+    for key, amount in credits:
+        per_shard[shard_for(key, shard_count)] += amount
+
+    now = timezone.now()
+    for shard in sorted(per_shard):
+        updated = WalletShard.objects.filter(wallet_id=wallet_id, shard=shard).update(
+            balance=F('balance') + per_shard[shard], updated_at=now,
+        )
+        if not updated:
+            ensure_shards(wallet_id, shard_count)
+            WalletShard.objects.filter(wallet_id=wallet_id, shard=shard).update(
+                balance=F('balance') + per_shard[shard], updated_at=now,
+            )
+
+
+def ensure_shards(wallet_id, shard_count):
+    WalletShard.objects.bulk_create(
+        [WalletShard(wallet_id=wallet_id, shard=i) for i in range(shard_count)],
+        ignore_conflicts=True,
+    )
+
+
+def enable_sharding(wallet, shard_count):
+    """Turn sharding on (or resize it) for a wallet."""
+    with transaction.atomic():
+        roll_up(wallet.pk)
+        Wallet.objects.filter(pk=wallet.pk).update(shard_count=shard_count)
+        WalletShard.objects.filter(wallet=wallet, shard__gte=shard_count).delete()
+        if shard_count:
+            ensure_shards(wallet.pk, shard_count)
+    wallet.shard_count = shard_count
+
+
+def enable_platform_sharding():
+    """Shard the platform fee wallet (PLATFORM_WALLET_USER_ID) if configured."""
+    user_id = getattr(settings, 'PLATFORM_WALLET_USER_ID', None)
+    shard_count = getattr(settings, 'PLATFORM_WALLET_SHARDS', 0)
+    wallet = Wallet.objects.filter(user_id=user_id).first() if user_id else None
+    if wallet is None or wallet.shard_count == shard_count:
+        return None
+    enable_sharding(wallet, shard_count)
+    return wallet
+
+
+@transaction.atomic
+def roll_up(wallet_id):
+    """
+    Fold one wallet's shards into its main balance. Locks the wallet row,
+    then the shards in index order. Returns the amount moved.
+    """
+    list(Wallet.objects.select_for_update().filter(pk=wallet_id).values_list('pk', flat=True))
+    shards = list(WalletShard.objects.select_for_update()
+                  .filter(wallet_id=wallet_id)
+                  .exclude(balance=0)
+                  .order_by('shard'))
+    total = sum((shard.balance for shard in shards), Decimal('0.00'))
+    if not total:
+        return Decimal('0.00')
+
+    WalletShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(
+        balance=Decimal('0.00'), updated_at=timezone.now(),
+    )
+    Wallet.objects.filter(pk=wallet_id).update(
+        balance=F('balance') + total, updated_at=timezone.now(),
+    )
+    return total
+
+
+def roll_up_all():
+    """Roll up every wallet with pending shard credits; returns {wallet_id: amount}."""
+    pending = (WalletShard.objects.exclude(balance=0)
+               .values_list('wallet_id', flat=True).distinct().order_by('wallet_id'))
+    return {wallet_id: roll_up(wallet_id) for wallet_id in pending}
@@ -3,10 +3,17 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import Wallet
+from .statements import open_wallet
 
 User = get_user_model()
 
 @receiver(post_save, sender=User)
 def create_user_wallet(sender, instance, created, **kwargs):
     if created:
-        Wallet.objects.create(user=instance)
\ No newline at end of file
+        Wallet.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Wallet)
+def open_wallet_ledger(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        open_wallet(instance)
@@ -0,0 +1,128 @@
+# wallet/statements.py
+"""
+Historical balances and statements from the transaction ledger.
+
+Every Transaction records its signed effect on the wallet (balance_delta,
+held_delta). BalanceCheckpoint rows snapshot a wallet's balances at a
+ledger position, ordered by (created_at, id). A balance at any moment is
+the latest checkpoint at or before that moment plus the deltas after it.
+Both reads go through the (wallet, created_at, id) indexes, so the cost is
+one index probe plus a tail of at most about CHECKPOINT_EVERY rows, instead
+of a sum over the whole history.
+
+Every wallet starts with an opening checkpoint. For wallets that existed
+before deltas were recorded, the migration took it from their balances at
+the time. New wallets get one on creation (wallet.signals). Earlier moments
+have no known balance.
+
+write_checkpoints() (the checkpoint_wallet_balances command) adds a
+checkpoint for each wallet that gathered CHECKPOINT_EVERY transactions
+since its last one. It only covers transactions older than SETTLE_LAG, so
+a transaction still committing with an earlier created_at is not skipped.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, Transaction
+
+CHECKPOINT_EVERY = getattr(settings, 'WALLET_CHECKPOINT_EVERY', 500)
+SETTLE_LAG = timezone.timedelta(seconds=getattr(settings, 'WALLET_CHECKPOINT_SETTLE_SECONDS', 300))
+
+ZERO = Decimal('0.00')
+
+
+def after(position_at, position_id):
+    """Transactions strictly after a (created_at, id) ledger position."""
+    return Q(created_at__gt=position_at) | Q(created_at=position_at, id__gt=position_id)
+
+
+def _tail(wallet_id, checkpoint, until=None):
+    rows = Transaction.objects.filter(after(checkpoint.position_at, checkpoint.position_id), wallet_id=wallet_id)
+    if until is not None:
+        rows = rows.filter(created_at__lte=until)
+    return rows.order_by()
+
+
+def latest_checkpoint(wallet_id, at=None):
+    checkpoints = BalanceCheckpoint.objects.filter(wallet_id=wallet_id)
+    if at is not None:
+        checkpoints = checkpoints.filter(position_at__lte=at)
+    return checkpoints.order_by('-position_at', '-position_id').first()
+
+
+def balance_at(wallet_id, at):
+    """(balance, held_balance) after every transaction up to `at`; None before the opening checkpoint."""
+    checkpoint = latest_checkpoint(wallet_id, at)
+    if checkpoint is None:
+        return None
+    tail = _tail(wallet_id, checkpoint, at).aggregate(balance=Sum('balance_delta'), held=Sum('held_delta'))
+    return checkpoint.balance + (tail['balance'] or ZERO), checkpoint.held_balance + (tail['held'] or ZERO)
+
+
+def statement(wallet_id, start, end):
+    """Opening and closing balances for (start, end] plus the period's credits and debits."""
+    opening = balance_at(wallet_id, start)
+    closing = balance_at(wallet_id, end)
+    movements = (Transaction.objects
+                 .filter(wallet_id=wallet_id, created_at__gt=start, created_at__lte=end)
+                 .order_by()
+                 .aggregate(credits=Sum('balance_delta', filter=Q(balance_delta__gt=0)),
+                            debits=Sum('balance_delta', filter=Q(balance_delta__lt=0)),
+                            count=Count('id')))
+    return {
+        'wallet_id': wallet_id,
+        'from': start,
+        'to': end,
+        'opening_balance': opening[0] if opening else None,
+        'opening_held_balance': opening[1] if opening else None,
+        'credits': movements['credits'] or ZERO,
+        'debits': -(movements['debits'] or ZERO),
+        'transaction_count': movements['count'],
+        'closing_balance': closing[0] if closing else None,
+        'closing_held_balance': closing[1] if closing else None,
+    }
+
+
+def open_wallet(wallet):
+    """Opening checkpoint for a new wallet."""
+    return BalanceCheckpoint.objects.create(
+        wallet=wallet, position_at=wallet.created_at, position_id=0,
+        balance=wallet.balance, held_balance=wallet.held_balance,
+    )
+
+
+def write_checkpoints(every=CHECKPOINT_EVERY, now=None):
+    """
+    Checkpoint every wallet with at least `every` settled transactions past
+    its latest checkpoint. Returns {'wallets': scanned, 'written': count}.
+    """
+    settled = (now or timezone.now()) - SETTLE_LAG
+    latest = BalanceCheckpoint.objects.filter(wallet=OuterRef('wallet_id')).order_by('-position_at', '-position_id')
+    checkpoints = (BalanceCheckpoint.objects
+                   .filter(pk=Subquery(latest.values('pk')[:1]))
+                   .order_by('wallet_id'))
+
+    written, scanned = [], 0
+    for checkpoint in checkpoints.iterator(chunk_size=2000):
+        scanned += 1
+        tail = _tail(checkpoint.wallet_id, checkpoint, settled)
+        sums = tail.aggregate(
+            balance=Coalesce(Sum('balance_delta'), ZERO, output_field=DecimalField()),
+            held=Coalesce(Sum('held_delta'), ZERO, output_field=DecimalField()),
+            count=Count('id'),
+        )
+        if sums['count'] < every:
+            continue
+        position_at, position_id = tail.order_by('-created_at', '-id').values_list('created_at', 'id').first()
+        written.append(BalanceCheckpoint(
+            wallet_id=checkpoint.wallet_id, position_at=position_at, position_id=position_id,
+            balance=checkpoint.balance + sums['balance'],
+            held_balance=checkpoint.held_balance + sums['held'],
+            transaction_count=checkpoint.transaction_count + sums['count'],
+        ))
+    BalanceCheckpoint.objects.bulk_create(written, batch_size=1000)
+    return {'wallets': scanned, 'written': len(written)}
@@ -0,0 +1,31 @@
+# wallet/tasks.py
+from celery import shared_task
+from .shards import enable_platform_sharding, roll_up_all
+from .audit import audit
+from .statements import write_checkpoints
+from .idempotency import purge_expired
+
+@shared_task
+def roll_up_wallet_shards():
+    # Keep the platform wallet sharded as configured, then fold shard credits
+    enable_platform_sharding()
+    moved = roll_up_all()
+    return f"Rolled up {len(moved)} wallets"
+
+
+@shared_task
+def checkpoint_wallet_balances():
+    result = write_checkpoints()
+    return f"Wrote {result['written']} balance checkpoints"
+
+
+@shared_task
+def audit_wallet_ledger():
+    # Nightly: report drift and checkpoint clean wallets for the next run
+    report = audit(checkpoint=True)
+    return {**report, 'drift': report['drift'][:100]}
+
+
+@shared_task
+def purge_idempotency_keys():
+    return f"Purged {purge_expired()} expired idempotency keys"
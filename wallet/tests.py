@@ -1,3 +1,412 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from accounts.testing import make_user
+
+from . import audit, statements
+from .idempotency import idempotent
+from .ledger import LedgerWriter
+from .models import BalanceCheckpoint, IdempotencyRecord, Transaction, Wallet, WalletShard
+from .serializers import WalletSerializer
+from .transfers import TransferError, transfer
+from .shards import enable_sharding, roll_up_all
+
+
+class ShardedWalletTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.platform = make_user('platform')
+        cls.seller = make_user('seller')
+
+    def setUp(self):
+        self.wallet = Wallet.objects.get(user=self.platform)
+        enable_sharding(self.wallet, 4)
+
+    def _post_fees(self, count, amount='1.50'):
+        ledger = LedgerWriter()
+        for i in range(count):
+            ledger.post(self.platform.pk, amount=Decimal(amount), transaction_type='fee',
+                        reference=f'ORDER_FEE_{i}', balance_delta=Decimal(amount))
+            ledger.post(self.seller.pk, amount=Decimal('10.00'), transaction_type='payment',
+                        reference=f'ORDER_PAY_NET_{i}', balance_delta=Decimal('10.00'))
+        ledger.flush()
+
+    def test_credits_skip_the_main_wallet_row(self):
+        self._post_fees(20)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0.00'))
+        self.assertGreater(WalletShard.objects.filter(wallet=self.wallet).exclude(balance=0).count(), 1)
+        self.assertEqual(self.wallet.total_balance, Decimal('30.00'))
+        self.assertEqual(WalletSerializer(Wallet.objects.get(pk=self.wallet.pk)).data['balance'], '30.00')
+        self.assertEqual(Transaction.objects.filter(wallet=self.wallet).count(), 20)
+        self.assertEqual(Wallet.objects.get(user=self.seller).balance, Decimal('200.00'))
+
+    def test_total_balance_does_not_modify_the_instance(self):
+        self._post_fees(2)
+        wallet = Wallet.objects.get(pk=self.wallet.pk)
+
+        self.assertEqual(wallet.total_balance, Decimal('3.00'))
+        self.assertEqual(wallet.balance, Decimal('0.00'))
+        self.assertFalse(hasattr(wallet, 'shard_balance'))
+        self._post_fees(2)
+        self.assertEqual(wallet.total_balance, Decimal('6.00'))
+
+        annotated = Wallet.objects.with_shard_balance().get(pk=self.wallet.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(annotated.total_balance, Decimal('6.00'))
+
+    def test_roll_up_folds_shards_into_balance(self):
+        self._post_fees(10)
+        self.assertEqual(roll_up_all(), {self.wallet.pk: Decimal('15.00')})
+
+        wallet = Wallet.objects.get(pk=self.wallet.pk)
+        self.assertEqual(wallet.balance, Decimal('15.00'))
+        self.assertEqual(wallet.total_balance, Decimal('15.00'))
+        self.assertFalse(WalletShard.objects.exclude(balance=0).exists())
+        self.assertEqual(roll_up_all(), {})
+
+    def test_debits_go_through_the_locked_row(self):
+        self._post_fees(2)
+        ledger = LedgerWriter()
+        ledger.post(self.platform.pk, amount=Decimal('1.00'), transaction_type='withdrawal',
+                    reference='WD', balance_delta=Decimal('-1.00'))
+        ledger.flush()
+
+        wallet = Wallet.objects.get(pk=self.wallet.pk)
+        self.assertEqual(wallet.balance, Decimal('2.00'))
+        self.assertEqual(wallet.total_balance, Decimal('2.00'))
+
+
+class LedgerStatementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('holder')
+        cls.wallet = Wallet.objects.get(user=cls.user)
+        cls.start = timezone.now() - timezone.timedelta(days=10)
+        BalanceCheckpoint.objects.filter(wallet=cls.wallet).update(position_at=cls.start)
+
+    def _post(self, day, amount, transaction_type='deposit', held=Decimal('0.00')):
+        ledger = LedgerWriter()
+        ledger.post(self.user.pk, amount=abs(amount), transaction_type=transaction_type,
+                    reference=f'T{day}', balance_delta=amount, held_delta=held)
+        with transaction.atomic():
+            [entry] = ledger.flush()
+        Transaction.objects.filter(pk=entry.pk).update(created_at=self.start + timezone.timedelta(days=day))
+
+    def _day(self, day):
+        return self.start + timezone.timedelta(days=day, hours=1)
+
+    def test_balance_at_replays_deltas_from_the_latest_checkpoint(self):
+        self._post(1, Decimal('100.00'))
+        self._post(2, Decimal('-30.00'), 'escrow_hold', held=Decimal('30.00'))
+        self._post(3, Decimal('5.00'))
+
+        self.assertIsNone(statements.balance_at(self.wallet.pk, self.start - timezone.timedelta(days=1)))
+        self.assertEqual(statements.balance_at(self.wallet.pk, self._day(1)), (Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual(statements.balance_at(self.wallet.pk, self._day(2)), (Decimal('70.00'), Decimal('30.00')))
+
+        self.assertEqual(statements.write_checkpoints(every=2), {'wallets': 1, 'written': 1})
+        self.assertEqual(statements.write_checkpoints(every=2), {'wallets': 1, 'written': 0})
+        checkpoint = statements.latest_checkpoint(self.wallet.pk)
+        self.assertEqual((checkpoint.balance, checkpoint.held_balance, checkpoint.transaction_count),
+                         (Decimal('75.00'), Decimal('30.00'), 3))
+
+        # before the new checkpoint the opening one is replayed, after it only the tail
+        self.assertEqual(statements.balance_at(self.wallet.pk, self._day(2)), (Decimal('70.00'), Decimal('30.00')))
+        self._post(5, Decimal('-10.00'), 'withdrawal')
+        with self.assertNumQueries(2):
+            self.assertEqual(statements.balance_at(self.wallet.pk, self._day(6)), (Decimal('65.00'), Decimal('30.00')))
+
+        self.wallet.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.wallet.held_balance), (Decimal('65.00'), Decimal('30.00')))
+
+    def test_statement_endpoint(self):
+        self._post(1, Decimal('100.00'))
+        self._post(2, Decimal('-40.00'), 'withdrawal')
+        self._post(4, Decimal('15.00'))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/wallet/statement/', {
+            'from': self._day(1).isoformat(), 'to': self._day(3).isoformat(),
+        }, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {k: response.data[k] for k in ('opening_balance', 'credits', 'debits', 'closing_balance', 'transaction_count')},
+            {'opening_balance': '100.00', 'credits': '0.00', 'debits': '40.00', 'closing_balance': '60.00',
+             'transaction_count': 1},
+        )
+        self.assertEqual(client.get('/api/wallet/statement/', {'from': 'nope'}, secure=True).status_code, 400)
+
+    def test_history_is_keyset_paginated(self):
+        for day in range(7):
+            self._post(day, Decimal('1.00'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        seen, url, params = [], '/api/wallet/transactions/', {'limit': 3}
+        while url:
+            with self.assertNumQueries(2):
+                response = client.get(url, params, secure=True)
+            seen += [row['reference'] for row in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(seen, [f'T{day}' for day in reversed(range(7))])
+
+
+def _post_movements(users):
+    ledger = LedgerWriter()
+    for i, user in enumerate(users):
+        ledger.post(user.pk, amount=Decimal('50.00'), transaction_type='deposit',
+                    reference=f'DEP{i}', balance_delta=Decimal('50.00'))
+        ledger.post(user.pk, amount=Decimal('20.00'), transaction_type='escrow_hold', reference=f'HOLD{i}',
+                    balance_delta=Decimal('-20.00'), held_delta=Decimal('20.00'))
+    with transaction.atomic():
+        ledger.flush()
+
+
+class LedgerAuditTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'audited{i}') for i in range(4)]
+        _post_movements(cls.users)
+        cls.wallets = [Wallet.objects.get(user=user) for user in cls.users]
+        cls.later = timezone.now() + timezone.timedelta(days=1)
+
+    def test_clean_ledger(self):
+        report = audit.audit()
+        self.assertEqual(report['drifted_wallets'], 0)
+        self.assertEqual(report['transactions_scanned'], Transaction.objects.count())
+        self.assertEqual(audit.audit(range_size=2, workers=1)['wallets'], Wallet.objects.count())
+
+    def test_reports_drift(self):
+        Wallet.objects.filter(pk=self.wallets[1].pk).update(balance=F('balance') + Decimal('5.00'))
+        Wallet.objects.filter(pk=self.wallets[2].pk).update(held_balance=Decimal('0.00'))
+
+        report = audit.audit(range_size=3)
+        self.assertEqual([(row['wallet_id'], row['balance_drift'], row['held_drift']) for row in report['drift']], [
+            (self.wallets[1].pk, '5.00', '0.00'),
+            (self.wallets[2].pk, '0.00', '-20.00'),
+        ])
+        self.assertEqual(report['total_balance_drift'], '5.00')
+
+        out = StringIO()
+        call_command('audit_wallet_ledger', '--output', '-', '--from-id', str(self.wallets[1].pk),
+                     '--to-id', str(self.wallets[1].pk), stdout=out, stderr=StringIO())
+        self.assertEqual(json.loads(out.getvalue())['drifted_wallets'], 1)
+
+    def test_checkpointed_runs_only_scan_new_transactions(self):
+        Wallet.objects.filter(pk=self.wallets[0].pk).update(balance=F('balance') + Decimal('1.00'))
+        report = audit.audit(checkpoint=True, now=self.later)
+        self.assertEqual(report['checkpoints_written'], 3)
+
+        report = audit.audit(now=self.later)
+        self.assertEqual(report['transactions_scanned'], 2)      # the drifted wallet's
+        self.assertEqual([row['wallet_id'] for row in report['drift']], [self.wallets[0].pk])
+
+        _post_movements(self.users[3:])
+        report = audit.audit(now=self.later)
+        self.assertEqual((report['transactions_scanned'], report['drifted_wallets']), (4, 1))
+
+
+class LedgerAuditParallelTests(TransactionTestCase):
+    def test_ranges_audited_in_parallel(self):
+        users = [make_user(f'parallel{i}') for i in range(6)]
+        _post_movements(users)
+        Wallet.objects.filter(user=users[4]).update(balance=Decimal('0.00'))
+
+        report = audit.audit(workers=3, range_size=2)
+        self.assertEqual((report['ranges'], report['wallets'], report['transactions_scanned']), (3, 6, 12))
+        self.assertEqual([row['user_id'] for row in report['drift']], [users[4].pk])
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = make_user('alice'), make_user('bob')
+        ledger = LedgerWriter()
+        ledger.post(cls.alice.pk, amount=Decimal('100.00'), transaction_type='deposit',
+                    reference='SEED', balance_delta=Decimal('100.00'))
+        with transaction.atomic():
+            ledger.flush()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def _send(self, amount, key=None):
+        data = {'recipient_email': 'bob@example.com', 'amount': amount}
+        if key:
+            data['idempotency_key'] = key
+        return self.client.post('/api/wallet/transfer/', data, format='json', secure=True)
+
+    def _balances(self):
+        return tuple(Wallet.objects.get(user=user).balance for user in (self.alice, self.bob))
+
+    def test_retry_with_the_same_key_posts_once(self):
+        first = self._send('30.00', key='retry-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((first.data['new_balance'], first.data['replayed']), (Decimal('70.00'), False))
+
+        again = self._send('30.00', key='retry-1')
+        self.assertEqual((again.data['reference'], again.data['replayed']), (first.data['reference'], True))
+        self.assertEqual(self._balances(), (Decimal('70.00'), Decimal('30.00')))
+        self.assertEqual(Transaction.objects.filter(reference=first.data['reference']).count(), 2)
+
+        self.assertEqual(self._send('31.00', key='retry-1').status_code, 400)
+        self.assertEqual(self._send('30.00').data['replayed'], False)
+        self.assertEqual(self._balances(), (Decimal('40.00'), Decimal('60.00')))
+
+        # a retry still replays once the original drained the wallet
+        self._send('40.00', key='drain')
+        self.assertEqual(self._send('40.00', key='drain').data['replayed'], True)
+        self.assertEqual(audit.audit()['drifted_wallets'], 0)
+
+    def test_overdraft_is_refused_under_the_lock(self):
+        with self.assertRaisesMessage(TransferError, 'Insufficient funds'):
+            transfer(self.alice, self.bob, Decimal('100.01'))
+        with self.assertRaises(TransferError):
+            transfer(self.alice, self.alice, Decimal('1.00'))
+        self.assertEqual(self._balances(), (Decimal('100.00'), Decimal('0.00')))
+
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = make_user('alice'), make_user('bob')
+        ledger = LedgerWriter()
+        ledger.post(cls.alice.pk, amount=Decimal('100.00'), transaction_type='deposit',
+                    reference='SEED', balance_delta=Decimal('100.00'))
+        with transaction.atomic():
+            ledger.flush()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def _send(self, amount, key):
+        return self.client.post('/api/wallet/transfer/', {'recipient_email': 'bob@example.com', 'amount': amount},
+                                format='json', secure=True, HTTP_IDEMPOTENCY_KEY=key)
+
+    def _alice_balance(self):
+        return Wallet.objects.get(user=self.alice).balance
+
+    def test_retry_replays_the_stored_response(self):
+        first = self._send('25.00', 'pay-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        again = self._send('25.00', 'pay-1')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(again.data['reference'], first.data['reference'])
+        self.assertEqual(self._alice_balance(), Decimal('75.00'))
+
+        # the key is per user
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.post('/api/wallet/transfer/', {'recipient_email': 'alice@example.com', 'amount': '5.00'},
+                                          format='json', secure=True, HTTP_IDEMPOTENCY_KEY='pay-1').status_code, 200)
+        self.assertEqual(IdempotencyRecord.objects.filter(key='pay-1').count(), 2)
+
+    def test_client_errors_are_replayed_too(self):
+        self.assertEqual(self._send('500.00', 'too-much').status_code, 400)
+        replay = self._send('500.00', 'too-much')
+        self.assertEqual((replay.status_code, replay['Idempotent-Replayed']), (400, 'true'))
+
+    def test_key_reused_for_a_different_request_is_refused(self):
+        self._send('10.00', 'pay-2')
+        self.assertEqual(self._send('11.00', 'pay-2').status_code, 422)
+        self.assertEqual(self._alice_balance(), Decimal('90.00'))
+
+    def test_key_still_in_progress_conflicts(self):
+        response = self._send('10.00', 'pay-3')
+        IdempotencyRecord.objects.filter(key='pay-3').update(
+            status_code=None, response_body=None, locked_until=timezone.now() + timezone.timedelta(seconds=10))
+        conflict = self._send('10.00', 'pay-3')
+        self.assertEqual(conflict.status_code, 409)
+        self.assertIn(conflict['Retry-After'], ('9', '10'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_abandoned_key_is_taken_over_after_its_lease(self):
+        # a worker died after claiming the key; its lease has run out
+        self._send('10.00', 'pay-5')
+        IdempotencyRecord.objects.filter(key='pay-5').update(
+            status_code=None, response_body=None, locked_until=timezone.now() - timezone.timedelta(seconds=1))
+
+        retry = self._send('10.00', 'pay-5')
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(IdempotencyRecord.objects.get(key='pay-5').status_code, 200)
+        self.assertEqual(self._alice_balance(), Decimal('90.00'))
+
+    def _call(self, handler, key):
+        class View(APIView):
+            @idempotent('test')
+            def post(self, request):
+                return handler(request)
+
+        request = APIRequestFactory().post('/', {'amount': '5.00'}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.alice)
+        return View.as_view()(request)
+
+    def test_request_that_lost_its_lease_rolls_back(self):
+        def slow_deposit(request):
+            ledger = LedgerWriter()
+            ledger.post(self.alice.pk, amount=Decimal('5.00'), transaction_type='deposit',
+                        reference='LEASE', balance_delta=Decimal('5.00'))
+            ledger.flush()
+            # meanwhile the lease ran out and a retry took the key over
+            IdempotencyRecord.objects.filter(key='slow').update(
+                locked_until=timezone.now() + timezone.timedelta(seconds=30))
+            return Response({'deposited': '5.00'})
+
+        response = self._call(slow_deposit, 'slow')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self._alice_balance(), Decimal('100.00'))
+        self.assertFalse(Transaction.objects.filter(reference='LEASE').exists())
+        self.assertIsNone(IdempotencyRecord.objects.get(key='slow').status_code)
+
+    def test_responses_asking_for_a_retry_are_not_stored(self):
+        for key, response in [
+            ('busy', Response({'error': 'please try again'}, status=400, headers={'Retry-After': '1'})),
+            ('throttled', Response({'error': 'slow down'}, status=429)),
+            ('broken', Response({'error': 'boom'}, status=500)),
+        ]:
+            self.assertEqual(self._call(lambda request: response, key).status_code, response.status_code)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+        def fails(request):
+            raise RuntimeError('worker crashed')
+
+        with self.assertRaises(RuntimeError):
+            self._call(fails, 'crash')
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_expired_keys_are_reclaimed_and_purged(self):
+        self._send('10.00', 'pay-4')
+        IdempotencyRecord.objects.filter(key='pay-4').update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        # the record is reclaimed; the transfer engine still recognises the key
+        again = self._send('10.00', 'pay-4')
+        self.assertNotIn('Idempotent-Replayed', again)
+        self.assertTrue(again.data['replayed'])
+        self.assertEqual(self._alice_balance(), Decimal('90.00'))
+
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Purged 1', out.getvalue())
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_oversized_key_is_rejected(self):
+        self.assertEqual(self._send('10.00', 'k' * 65).status_code, 400)
+        self.assertFalse(IdempotencyRecord.objects.exists())
@@ -0,0 +1,84 @@
+# wallet/transfers.py
+"""
+Wallet-to-wallet transfers.
+
+Both wallets are locked up front in primary-key order (LedgerWriter.lock_wallets).
+Two opposite transfers between the same pair of wallets therefore queue
+behind each other instead of deadlocking. With the locks held, the sender's
+balance is checked and both sides are posted through LedgerWriter as one
+F()-expression UPDATE, so there are no lost updates.
+
+Every transfer carries an idempotency key (client-supplied, or random when
+the client sends none). The sender's ledger entry is referenced
+`TRF-<sender id>-<key>`. A retry with the same key finds that entry while
+holding the same locks and gets the original transfer back instead of
+posting it again.
+"""
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+
+from .ledger import LedgerWriter
+from .models import Transaction, Wallet
+
+MAX_KEY_LENGTH = 64
+
+
+class TransferError(Exception):
+    pass
+
+
+@dataclass
+class TransferResult:
+    reference: str
+    amount: Decimal
+    sender_balance: Decimal
+    replayed: bool = False
+
+
+def transfer_reference(sender_id, key):
+    return f"TRF-{sender_id}-{key}"
+
+
+@transaction.atomic
+def transfer(sender, recipient, amount, description='', idempotency_key=None):
+    if sender.pk == recipient.pk:
+        raise TransferError("Cannot transfer to yourself")
+    if amount <= 0:
+        raise TransferError("Amount must be positive")
+    key = idempotency_key or uuid.uuid4().hex
+    if len(key) > MAX_KEY_LENGTH:
+        raise TransferError(f"Idempotency key is longer than {MAX_KEY_LENGTH} characters")
+    reference = transfer_reference(sender.pk, key)
+
+    ledger = LedgerWriter()
+    wallet_ids = ledger.lock_wallets([sender.pk, recipient.pk])
+    sender_wallet_id = wallet_ids[sender.pk]
+
+    posted = (Transaction.objects
+              .filter(wallet_id=sender_wallet_id, reference=reference,
+                      transaction_type=Transaction.TransactionType.TRANSFER)
+              .values_list('amount', 'recipient_id')
+              .first())
+    if posted is not None:
+        if posted != (amount, wallet_ids[recipient.pk]):
+            raise TransferError("Idempotency key was already used for a different transfer")
+        return TransferResult(reference, amount, _balance(sender_wallet_id), replayed=True)
+
+    if not Wallet.objects.filter(pk=sender_wallet_id, balance__gte=amount).exists():
+        raise TransferError("Insufficient funds")
+
+    ledger.post(sender.pk, amount=amount, transaction_type=Transaction.TransactionType.TRANSFER,
+                description=description, reference=reference, balance_delta=-amount,
+                recipient_id=wallet_ids[recipient.pk])
+    ledger.post(recipient.pk, amount=amount, transaction_type=Transaction.TransactionType.TRANSFER,
+                description=f"Received from {sender.email}: {description}", reference=reference,
+                balance_delta=amount)
+    ledger.flush()
+    return TransferResult(reference, amount, _balance(sender_wallet_id))
+
+
+def _balance(wallet_id):
+    return Wallet.objects.values_list('balance', flat=True).get(pk=wallet_id)
@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     WalletAPIView,
     TransactionHistoryAPIView,
+    WalletStatementAPIView,
     TransferAPIView,
     AdjustBalanceView
 )
@@ -10,6 +11,7 @@ from .views import (
 urlpatterns = [
     path('', WalletAPIView.as_view(), name='wallet-detail'),
     path('transactions/', TransactionHistoryAPIView.as_view(), name='wallet-transactions'),
+    path('statement/', WalletStatementAPIView.as_view(), name='wallet-statement'),
     path('transfer/', TransferAPIView.as_view(), name='wallet-transfer'),
     path('admin/adjust-balance/<int:user_id>/', AdjustBalanceView.as_view(), name='adjust-balance'),
 ]
\ No newline at end of file
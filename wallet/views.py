@@ -6,13 +6,20 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from decimal import Decimal
 from .models import Wallet, Transaction
-from .serializers import WalletSerializer, TransactionSerializer, TransferSerializer,BalanceAdjustmentSerializer
+from .serializers import WalletSerializer, TransactionSerializer, TransferSerializer,BalanceAdjustmentSerializer, StatementSerializer
+from .statements import statement
+from .transfers import TransferError, transfer
+from .idempotency import idempotent
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAdminUser
+from analytics.export import ExportMixin, export_response
 import time 
 
 User = get_user_model()
@@ -25,62 +32,84 @@ class WalletAPIView(APIView):
         serializer = WalletSerializer(wallet)
         return Response(serializer.data)
 
-class TransactionHistoryAPIView(APIView):
+class TransactionCursorPagination(CursorPagination):
+    # keyset pagination over the (wallet, created_at, id) index
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+
+class TransactionHistoryAPIView(ExportMixin, APIView):
     permission_classes = [IsAuthenticated]
+    export_columns = ['id', 'created_at', 'transaction_type', 'amount', 'recipient',
+                      'description', 'reference', 'is_successful']
 
     def get(self, request):
         wallet = get_object_or_404(Wallet, user=request.user)
-        transactions = wallet.transactions.all().select_related('recipient')
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        fmt = self.export_format()
+        if fmt:
+            rows = wallet.transactions.order_by('-created_at', '-id').values_list(
+                'id', 'created_at', 'transaction_type', 'amount', 'recipient__user__email',
+                'description', 'reference', 'is_successful')
+            return export_response(fmt, 'transactions', self.export_columns, rows)
+        paginator = TransactionCursorPagination()
+        page = paginator.paginate_queryset(
+            wallet.transactions.select_related('wallet__user', 'recipient__user'), request, view=self)
+        return paginator.get_paginated_response(TransactionSerializer(page, many=True).data)
+
+
+def _parse_moment(value, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        moment = timezone.datetime.combine(
+            day, timezone.datetime.max.time() if end_of_day else timezone.datetime.min.time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class WalletStatementAPIView(APIView):
+    """Opening/closing balances and totals for ?from=&to= (dates or ISO datetimes; default last 30 days)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        wallet = get_object_or_404(Wallet, user=request.user)
+        end = timezone.now()
+        if request.query_params.get('to'):
+            end = _parse_moment(request.query_params['to'], end_of_day=True)
+        start = end - timezone.timedelta(days=30) if end else None
+        if request.query_params.get('from'):
+            start = _parse_moment(request.query_params['from'])
+        if start is None or end is None or start > end:
+            return Response({'error': 'Invalid from/to'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(StatementSerializer(statement(wallet.pk, start, end)).data)
 
 class TransferAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent('transfer')
     def post(self, request):
         serializer = TransferSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            sender_wallet = request.user.wallet
             recipient = get_object_or_404(User, email=serializer.validated_data['recipient_email'])
-            recipient_wallet = recipient.wallet
-            amount = serializer.validated_data['amount']
-            description = serializer.validated_data.get('description', '')
-
-            # Generate a unique reference
-            reference = f"TRF-{request.user.id}-{recipient.id}-{int(time.time())}"
-
-            with transaction.atomic():
-                # Deduct from sender
-                sender_wallet.balance -= amount
-                sender_wallet.save()
-
-                # Add to recipient
-                recipient_wallet.balance += amount
-                recipient_wallet.save()
-
-                # Record transactions
-                Transaction.objects.create(
-                    wallet=sender_wallet,
-                    amount=amount,
-                    transaction_type=Transaction.TransactionType.TRANSFER,
-                    recipient=recipient_wallet,
-                    description=description,
-                    reference=reference
-                )
-
-                Transaction.objects.create(
-                    wallet=recipient_wallet,
-                    amount=amount,
-                    transaction_type=Transaction.TransactionType.TRANSFER,
-                    description=f"Received from {request.user.email}: {description}",
-                    reference=reference
+            try:
+                result = transfer(
+                    request.user, recipient, serializer.validated_data['amount'],
+                    description=serializer.validated_data.get('description', ''),
+                    idempotency_key=(serializer.validated_data.get('idempotency_key')
+                                     or request.headers.get('Idempotency-Key')),
                 )
+            except TransferError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response(
                 {
                     'message': 'Transfer successful',
-                    'reference': reference,
-                    'new_balance': sender_wallet.balance
+                    'reference': result.reference,
+                    'new_balance': result.sender_balance,
+                    'replayed': result.replayed,
                 },
                 status=status.HTTP_200_OK
             )
@@ -112,7 +141,8 @@ class AdjustBalanceView(APIView):
                 transaction_type=Transaction.TransactionType.DEPOSIT,
                 description=f"Admin adjustment: {reason}",
                 reference=f"ADJ-{user.id}-{int(time.time())}",
-                is_successful=True
+                is_successful=True,
+                balance_delta=amount,
             )
         
         return Response({